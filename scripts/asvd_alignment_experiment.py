@@ -20,7 +20,10 @@ import torch.nn as nn
 import numpy as np
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from tqdm import tqdm
-from datasets import load_dataset
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.calib_sampler import CalibSampler
+from src.ppl_engine import perplexity
 
 
 # ============================================================================
@@ -99,29 +102,10 @@ class SVDLinear(nn.Module):
 
 
 def get_calib_data(dataset_name, tokenizer, model_id, n_samples, seed=42):
-    """Get calibration data."""
-    if dataset_name == "wikitext2":
-        data = load_dataset("wikitext", "wikitext-2-raw-v1", split="train")
-        text = "\n\n".join(data["text"])
-    elif dataset_name == "c4":
-        data = load_dataset("allenai/c4", data_files="en/c4-train.00000-of-01024.json.gz", split="train")
-        text = "\n\n".join(data["text"][:1000])
-    else:
-        data = load_dataset("wikitext", "wikitext-2-raw-v1", split="train")
-        text = "\n\n".join(data["text"])
-
-    enc = tokenizer(text, return_tensors="pt")
-    seq_len = 2048
-    dataset = []
-    np.random.seed(seed)
-
-    for _ in range(n_samples):
-        i = np.random.randint(0, enc.input_ids.shape[1] - seq_len - 1)
-        j = i + seq_len
-        inp = enc.input_ids[:, i:j]
-        dataset.append({"input_ids": inp})
-
-    return dataset
+    """Get calibration data: seeded 2048-token windows of the cached train split."""
+    corpus = "c4" if dataset_name == "c4" else "wikitext2"
+    sampler = CalibSampler.from_dataset(corpus, tokenizer, split="train", seed=seed)
+    return sampler.loader(n_samples, 2048)
 
 
 @torch.no_grad()
@@ -290,15 +274,7 @@ def calib_sensitivity_stable_rank(model, calib_loader, args, use_cache=True):
 def evaluate_perplexity(model, input_ids, n_samples=32):
     """Evaluate perplexity on calibration data."""
     model.eval()
-    device = next(model.parameters()).device
-
-    nlls = []
-    for i in range(min(n_samples, input_ids.shape[0])):
-        inp = input_ids[i:i+1].to(device)
-        out = model(inp, labels=inp)
-        nlls.append(out.loss.item())
-
-    return np.exp(np.mean(nlls))
+    return perplexity(model, input_ids, seq_len=input_ids.shape[-1], limit=n_samples)["ppl"]
 
 
 # ============================================================================
@@ -28,6 +28,14 @@ import torch.nn as nn
 from tqdm import tqdm
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.calib_sampler import CalibSampler
+from src.importance import SCORE_TYPES, ImportanceScores
+from src.ppl_engine import perplexity
+from src.rank_allocation import allocate_aligned_ranks
+from src.token_cache import TokenCache
+from src.lowrank import LOW_RANK_METHODS, low_rank_factorize, sqrt_split
+
 # No ASVD imports needed - we use simplified SVD approach
 
 
@@ -80,41 +88,23 @@ def find_layers(module, layers=[nn.Conv2d, nn.Linear], name=''):
 
 
 # ---------------------------------------------------------------------------
-# Sensitivity estimation using stable rank (no external dependencies)
+# Sensitivity estimation from importance scores (stable rank by default)
 # ---------------------------------------------------------------------------
-@torch.no_grad()
-def compute_layer_sensitivity(model):
+def compute_layer_sensitivity(model, scores, metric="stable_rank", calib_loader=None, device="cpu"):
     """
-    Compute per-layer sensitivity using stable rank metric.
-    Stable rank = ||W||_F^2 / ||W||_2^2 (ratio of Frobenius to spectral norm squared)
-    Higher stable rank = more important layer (more spread singular values)
+    Compute per-layer sensitivity from the shared importance scores (src/importance.py).
+    Default metric: stable rank = ||W||_F / ||W||_2 (square root of the ratio of
+    Frobenius to spectral norm squared), with the spectral norm from power iteration.
+    Higher score = more important layer; data-dependent metrics (fisher, gradient,
+    activation) need calib_loader.
 
     Returns: dict {layer_name: {param_ratio: sensitivity_score}}
     """
-    sensitivity_dict = {}
     param_ratio_candidates = [0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
-
-    for name, module in tqdm(model.named_modules(), desc="Computing stable rank sensitivity"):
-        if isinstance(module, nn.Linear):
-            w = module.weight.data.float()
-
-            # Stable rank = ||W||_F^2 / ||W||_2^2
-            w_fro = torch.norm(w, p="fro") ** 2
-            try:
-                singular_values = torch.linalg.svdvals(w)
-                spectral_norm = singular_values[0]  # Largest singular value
-            except Exception:
-                spectral_norm = torch.norm(w, p=2)
-            w_spec = spectral_norm ** 2
-
-            stable_rank = (w_fro / (w_spec + 1e-8)) ** 0.5
-
-            sensitivity_dict[name] = {}
-            for param_ratio in param_ratio_candidates:
-                # Higher stable rank + lower ratio = more sensitive
-                sensitivity_dict[name][param_ratio] = stable_rank.item() * (1 - param_ratio)
-
-    return sensitivity_dict
+    names = [name for name, module in model.named_modules() if isinstance(module, nn.Linear)]
+    scores.ensure(model, calib_loader, device, [metric])
+    # Higher score + lower ratio = more sensitive
+    return scores.sensitivity_dict(metric, param_ratio_candidates, names)
 
 
 def extract_ideal_ranks(model, sensitivity_dict, target_ratio):
@@ -295,87 +285,25 @@ def strategy_gac_dp(base_ranks, fisher, target_budget, align=8, search_radius=3)
     - Sensitive layers (high f_i) get rounded UP
     - Insensitive layers get rounded DOWN
     """
-    projections = []
-    for layer in range(NUM_LAYERS):
-        for proj in ALL_PROJS:
-            key = (layer, proj)
-            if key not in base_ranks:
-                continue
-            ideal = base_ranks[key]
-            f_i = fisher.get(key, 1.0)
-            m, n = PROJ_SHAPES[proj]
-            max_rank = min(m, n)
-            unit_cost = m + n
-
-            # Generate candidate aligned ranks
-            ideal_aligned = round(ideal / align) * align
-            candidates = []
-            for offset in range(-search_radius, search_radius + 1):
-                c = ideal_aligned + offset * align
-                if align <= c <= max_rank:
-                    candidates.append(c)
-            if not candidates:
-                candidates = [max(align, min(max_rank, ideal_aligned))]
-
-            projections.append({
-                "key": key, "ideal": ideal, "fisher": f_i,
-                "candidates": candidates, "unit_cost": unit_cost,
-            })
-
-    # DP with budget in units of (align * min_unit_cost)
-    min_uc = min(p["unit_cost"] for p in projections)
-    budget_unit = align * min_uc
-    B = target_budget // budget_unit + 2
-
-    if B > 500000:
-        print(f"  DP too large (B={B}), using greedy")
-        return strategy_round_to_n(base_ranks, fisher, target_budget, align)
-
-    n_proj = len(projections)
-    NEG_INF = float("-inf")
-    dp = [NEG_INF] * (B + 1)
-    dp[0] = 0.0
-    choice = [[None] * (B + 1) for _ in range(n_proj)]
-
-    for i, p in enumerate(projections):
-        new_dp = [NEG_INF] * (B + 1)
-        for c in p["candidates"]:
-            val = p["fisher"] * (c - p["ideal"])
-            c_units = (c * p["unit_cost"]) // budget_unit
-            if c_units > B:
-                continue
-            for b in range(int(c_units), B + 1):
-                prev = b - int(c_units)
-                if dp[prev] > NEG_INF and dp[prev] + val > new_dp[b]:
-                    new_dp[b] = dp[prev] + val
-                    choice[i][b] = c
-        dp = new_dp
-
-    # Find best solution within budget
-    max_b = target_budget // budget_unit
-    best_b = None
-    for b in range(min(max_b, B), max(0, max_b - 10), -1):
-        if dp[b] > NEG_INF:
-            best_b = b
-            break
-    if best_b is None:
-        for b in range(min(max_b, B), -1, -1):
-            if dp[b] > NEG_INF:
-                best_b = b
-                break
-    if best_b is None:
+    ideal_ranks = {
+        (layer, proj): base_ranks[(layer, proj)]
+        for layer in range(NUM_LAYERS) for proj in ALL_PROJS
+        if (layer, proj) in base_ranks
+    }
+    ranks = allocate_aligned_ranks(
+        ideal_ranks,
+        fisher,
+        unit_costs={k: sum(PROJ_SHAPES[k[1]]) for k in ideal_ranks},
+        max_ranks={k: min(PROJ_SHAPES[k[1]]) for k in ideal_ranks},
+        budget=target_budget,
+        align=align,
+        search_radius=search_radius,
+        max_units=500000,
+    )
+    if ranks is None:
+        print("  GAC DP infeasible or too large, using greedy alignment")
         return strategy_round_to_n(base_ranks, fisher, target_budget, align)
 
-    # Backtrack to get ranks
-    ranks = {}
-    b = best_b
-    for i in range(n_proj - 1, -1, -1):
-        c = choice[i][b]
-        if c is None:
-            c = projections[i]["candidates"][len(projections[i]["candidates"]) // 2]
-        ranks[projections[i]["key"]] = c
-        b -= int((c * projections[i]["unit_cost"]) // budget_unit)
-
     # Post-processing: enforce exact budget constraint
     actual = param_cost(ranks)
     if actual > target_budget:
@@ -433,13 +361,15 @@ class SimpleSVDLinear(nn.Module):
 
 
 @torch.no_grad()
-def svd_compress_with_ranks(model, ranks_dict, dev):
+def svd_compress_with_ranks(model, ranks_dict, dev, svd_method="exact"):
     """
     Apply truncated SVD compression with specified per-projection ranks.
     Uses simple SVD factorization (no complex calibration needed).
+    Returns {(layer_idx, proj_name): relative Frobenius error}.
     """
     layers = model.model.layers
-    print("  Applying truncated SVD compression...")
+    rel_errors = {}
+    print(f"  Applying truncated SVD compression ({svd_method})...")
 
     for i in tqdm(range(len(layers))):
         layer = layers[i].to(dev)
@@ -454,20 +384,11 @@ def svd_compress_with_ranks(model, ranks_dict, dev):
             target_rank = ranks_dict[key]
             raw_linear = subset[name]
 
-            # Truncated SVD
-            W = raw_linear.weight.data.float()
-            U, S, Vt = torch.linalg.svd(W, full_matrices=False)
-
-            # Truncate to target rank
-            rank = min(target_rank, S.shape[0])
-            U_trunc = U[:, :rank]
-            S_trunc = S[:rank]
-            Vt_trunc = Vt[:rank, :]
-
-            # Fuse singular values into U and V (sqrt split)
-            sqrtS = torch.sqrt(S_trunc)
-            U_final = (U_trunc * sqrtS.unsqueeze(0)).half()  # (out, rank)
-            V_final = (sqrtS.unsqueeze(1) * Vt_trunc).half()  # (rank, in)
+            # Rank-r factorization, singular values fused into U and V (sqrt split)
+            fact = low_rank_factorize(raw_linear.weight.data, target_rank, method=svd_method)
+            rel_errors[key] = fact["rel_error"].item()
+            U_final, V_final = sqrt_split(fact["U"], fact["S"], fact["Vt"], dtype=torch.float16)
+            # U_final: (out, rank), V_final: (rank, in)
 
             bias = raw_linear.bias.data.clone() if raw_linear.bias is not None else None
 
@@ -485,6 +406,8 @@ def svd_compress_with_ranks(model, ranks_dict, dev):
         layers[i] = layer.cpu()
         torch.cuda.empty_cache()
 
+    return rel_errors
+
 
 # ---------------------------------------------------------------------------
 # PPL Evaluation
@@ -492,38 +415,17 @@ def svd_compress_with_ranks(model, ranks_dict, dev):
 @torch.no_grad()
 def eval_ppl(model, tokenizer, dev, seq_len=2048, batch_size=4):
     """Evaluate WikiText-2 PPL."""
-    from datasets import load_dataset
-
     model.to(dev)
     model.eval()
 
-    dataset = load_dataset("wikitext", "wikitext-2-raw-v1", split="test")
-    text = "\n\n".join(dataset["text"])
-    encodings = tokenizer(text, return_tensors="pt")
-
-    max_length = seq_len
-    stride = seq_len // 2
-    seq_len_total = encodings.input_ids.size(1)
-
-    nlls = []
-    prev_end_loc = 0
-    for begin_loc in range(0, seq_len_total, stride):
-        end_loc = min(begin_loc + max_length, seq_len_total)
-        trg_len = end_loc - prev_end_loc
-        input_ids = encodings.input_ids[:, begin_loc:end_loc].to(dev)
-        target_ids = input_ids.clone()
-        target_ids[:, :-trg_len] = -100
-
-        with torch.no_grad():
-            outputs = model(input_ids, labels=target_ids)
-            neg_log_likelihood = outputs.loss
-
-        nlls.append(neg_log_likelihood)
-        prev_end_loc = end_loc
-        if end_loc == seq_len_total:
-            break
+    input_ids = TokenCache().get("wikitext2", "test", tokenizer).ids
 
-    ppl = torch.exp(torch.stack(nlls).mean()).item()
+    # Stride-half sliding window; the overlap is reused from the KV cache
+    result = perplexity(
+        model, input_ids, seq_len=seq_len, stride=seq_len // 2,
+        max_batch_tokens=batch_size * seq_len,
+    )
+    ppl = result["ppl"]
     model.cpu()
     torch.cuda.empty_cache()
     return ppl
@@ -745,6 +647,9 @@ def main():
     parser.add_argument("--calib_dataset", type=str, default="wikitext2")
     parser.add_argument("--scaling_method", type=str, default="abs_mean")
     parser.add_argument("--sensitivity_metric", type=str, default="ppl")
+    parser.add_argument("--importance_metric", type=str, default="stable_rank", choices=SCORE_TYPES,
+                        help="Importance score behind the per-layer sensitivity (src/importance.py)")
+    parser.add_argument("--calib_seqlen", type=int, default=2048)
     parser.add_argument("--alpha", type=float, default=0.5)
     parser.add_argument("--sigma_fuse", type=str, default="UV")
     parser.add_argument("--seed", type=int, default=233)
@@ -757,6 +662,8 @@ def main():
     parser.add_argument("--accuracy-tasks", type=str, default="piqa,hellaswag")
     parser.add_argument("--accuracy-limit", type=int, default=200)
     parser.add_argument("--eval-latency", action="store_true")
+    parser.add_argument("--svd-method", type=str, default="exact", choices=LOW_RANK_METHODS,
+                        help="Rank-r factorization: exact thin SVD, randomized (Halko) or Lanczos")
 
     args = parser.parse_args()
 
@@ -784,7 +691,13 @@ def main():
     model.eval()
 
     t0 = time.time()
-    sensitivity = compute_layer_sensitivity(model)
+    scores = ImportanceScores(Path("cache") / "importance", args.model_id, args.calib_dataset,
+                              args.n_calib_samples, args.calib_seqlen, seed=args.seed)
+    calib_loader = None
+    if args.importance_metric not in ("magnitude", "stable_rank"):
+        calib_loader = CalibSampler.from_dataset(args.calib_dataset, tokenizer, seed=args.seed).loader(
+            args.n_calib_samples, args.calib_seqlen)
+    sensitivity = compute_layer_sensitivity(model, scores, args.importance_metric, calib_loader, model.device)
     print(f"  Sensitivity computed in {time.time()-t0:.0f}s")
     print(f"  Sensitivity data for {len(sensitivity)} layers")
 
@@ -880,8 +793,10 @@ def main():
         model.eval()
 
         # Compress with truncated SVD using specified ranks
-        svd_compress_with_ranks(model, ranks, dev)
+        rel_errors = svd_compress_with_ranks(model, ranks, dev, svd_method=args.svd_method)
         print(f"  Compression done in {time.time()-t0:.0f}s")
+        print(f"  Rel. error: mean {np.mean(list(rel_errors.values())):.4f}, "
+              f"max {max(rel_errors.values()):.4f}")
 
         # PPL
         t1 = time.time()
@@ -897,6 +812,9 @@ def main():
             "pct_aligned": pct,
             "budget": param_cost(ranks),
             "n_unique_ranks": len(set(ranks.values())),
+            "svd_method": args.svd_method,
+            "rel_error_mean": float(np.mean(list(rel_errors.values()))),
+            "rel_error_max": float(max(rel_errors.values())),
         }
 
         if args.eval_accuracy:
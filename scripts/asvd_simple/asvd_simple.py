@@ -19,35 +19,28 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 ASVD4LLM_DIR = REPO_ROOT / "third_party" / "ASVD4LLM"
 if str(ASVD4LLM_DIR) not in sys.path:
     sys.path.insert(0, str(ASVD4LLM_DIR))
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
 
 from datautils import get_calib_data
 from act_aware_utils import calib_input_distribution
-from sensitivity_simple import calib_sensitivity_ppl, calib_sensitivity_stable_rank
+from sensitivity_simple import calib_sensitivity_importance, calib_sensitivity_ppl, calib_sensitivity_stable_rank
 from binary_search_simple import binary_search_truncation_rank
 from evaluate_utils_simple import evaluate_perplexity
+from src.token_cache import TokenCache
 
 
 def evaluate_ppl_datasets(model, tokenizer, datasets="wikitext2"):
     """Evaluate PPL on specified datasets."""
-    from datasets import load_dataset
-
     results = {}
+    cache = TokenCache(REPO_ROOT / "cache" / "tokens")
     for dataset_name in datasets.split(","):
-        if dataset_name == "wikitext2":
-            data = load_dataset("wikitext", "wikitext-2-raw-v1", split="test")
-            text = "\n\n".join(data["text"])
-        elif dataset_name == "ptb":
-            data = load_dataset("ptb_text_only", "penn_treebank", split="test")
-            text = "\n\n".join(data["sentence"])
-        else:
+        if dataset_name not in ("wikitext2", "ptb"):
             continue
 
-        enc = tokenizer(text, return_tensors="pt")
-        seq_len = 2048
-        n_samples = enc.input_ids.shape[1] // seq_len
-
-        input_ids = enc.input_ids[:, :n_samples * seq_len].reshape(n_samples, seq_len)
-        ppl = evaluate_perplexity(model, input_ids, limit=n_samples)
+        # Non-overlapping 2048-token blocks, as views into the cached token ids
+        input_ids = cache.get(dataset_name, "test", tokenizer).blocks(2048)
+        ppl = evaluate_perplexity(model, input_ids, limit=input_ids.shape[0])
         results[dataset_name] = ppl
         print(f"  {dataset_name}: {ppl:.2f}")
 
@@ -128,8 +121,10 @@ def main(args):
     print("\n[Step 2] Computing sensitivity...")
     if args.sensitivity_metric == "ppl":
         sensitivity = calib_sensitivity_ppl(model, calib_loader, args, args.use_cache)
-    else:
+    elif args.sensitivity_metric == "stable_rank":
         sensitivity = calib_sensitivity_stable_rank(model, calib_loader, args, args.use_cache)
+    else:
+        sensitivity = calib_sensitivity_importance(model, calib_loader, args, args.sensitivity_metric, args.use_cache)
 
     # Apply compression
     print("\n[Step 3] Applying SVD compression...")
@@ -167,7 +162,7 @@ if __name__ == "__main__":
     parser.add_argument("--n_calib_samples", type=int, default=32)
     parser.add_argument("--calib_dataset", type=str, default="wikitext2")
     parser.add_argument("--scaling_method", type=str, default="abs_mean")
-    parser.add_argument("--sensitivity_metric", type=str, default="ppl", choices=["ppl", "stable_rank"])
+    parser.add_argument("--sensitivity_metric", type=str, default="ppl", choices=["ppl", "stable_rank", "fisher", "gradient", "activation", "magnitude"])
     parser.add_argument("--use_cache", action="store_true", default=True)
     parser.add_argument("--sigma_fuse", type=str, default="UV")
     parser.add_argument("--rank_align", type=int, default=1)
@@ -2,9 +2,16 @@
 Simplified evaluate_utils without lm_eval dependency.
 Only includes evaluate_perplexity function.
 """
+import sys
+from pathlib import Path
+
 import torch
-import torch.nn as nn
-from tqdm import tqdm
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from src.ppl_engine import perplexity
 
 
 @torch.no_grad()
@@ -20,25 +27,4 @@ def evaluate_perplexity(model, dataset, limit):
     Returns:
         PPL value (float)
     """
-    nsamples, seqlen = dataset.size()
-
-    nlls = []
-
-    for i in range(nsamples):
-        if i == limit:
-            break
-        input_ids = dataset[i : i + 1, :-1].to(model.device)
-        labels = dataset[i : i + 1, 1:].contiguous()
-        logits = model(input_ids=input_ids)[0]
-        shift_logits = logits[:, :, :]
-        shift_labels = labels.to(model.device)
-        loss_fct = nn.CrossEntropyLoss()
-        loss = loss_fct(
-            shift_logits.view(-1, shift_logits.size(-1)),
-            shift_labels.view(-1),
-        )
-        neg_log_likelihood = loss.float() * seqlen
-        nlls.append(neg_log_likelihood)
-
-    ppl = torch.exp(torch.stack(nlls).sum() / (len(nlls) * seqlen))
-    return ppl.item()
+    return perplexity(model, dataset, seq_len=dataset.shape[-1], limit=limit)["ppl"]
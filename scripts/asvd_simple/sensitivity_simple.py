@@ -18,7 +18,11 @@ ASVD4LLM_DIR = REPO_ROOT / "third_party" / "ASVD4LLM"
 if str(ASVD4LLM_DIR) not in sys.path:
     sys.path.insert(0, str(ASVD4LLM_DIR))
 
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
 from modules.svd_linear import SVDLinear
+from src.importance import ImportanceScores
 
 
 @torch.no_grad()
@@ -85,54 +89,41 @@ def calib_sensitivity_ppl(model, calib_loader, args, use_cache=True):
     return sensitivity_dict
 
 
-@torch.no_grad()
+def _importance_scores(model, calib_loader, args, types, use_cache=True):
+    """Shared importance-score file of this calibration setup (src/importance.py), with `types` computed."""
+    seqlen = calib_loader[0]["input_ids"].shape[-1]
+    scores = ImportanceScores(
+        REPO_ROOT / "cache" / "importance", model.config._name_or_path,
+        args.calib_dataset, args.n_calib_samples, seqlen, seed=args.seed,
+    )
+    return scores.ensure(model, calib_loader, model.device, types, refresh=not use_cache)
+
+
 def calib_sensitivity_stable_rank(model, calib_loader, args, use_cache=True):
     """
     Compute stable rank sensitivity for each layer (fast but less accurate).
+    The spectral norms come from power iteration (src/importance.py) instead of a full SVD.
     """
-    model_id = model.config._name_or_path
-    cache_file = f"cache/{model_id.replace('/','_')}_sensitivity_stable_rank_{args.scaling_method}_{args.alpha}_{args.n_calib_samples}_{args.calib_dataset}.pt"
-
-    if os.path.exists(cache_file) and use_cache:
-        sensitivity_dict = torch.load(cache_file, map_location="cpu")
-        return sensitivity_dict
-
     model.eval()
-
-    full_name_dict = {module: name for name, module in model.named_modules()}
-    linear_info = {}
-    modules = [model]
-    while len(modules) > 0:
-        submodule = modules.pop()
-        for name, raw_linear in submodule.named_children():
-            if isinstance(raw_linear, nn.Linear):
-                full_name = full_name_dict[raw_linear]
-                linear_info[raw_linear] = {
-                    "father": submodule,
-                    "name": name,
-                    "full_name": full_name,
-                }
-            else:
-                modules.append(raw_linear)
-
-    sensitivity_dict = {}
+    scores = _importance_scores(model, calib_loader, args, ["stable_rank"], use_cache)
     param_ratio_candidates = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
-    input_ids = torch.cat([_["input_ids"] for _ in calib_loader], 0)
-    print(f"input_ids.shape={input_ids.shape}")
-
-    for raw_linear, info in tqdm(linear_info.items(), desc="Computing stable rank sensitivity"):
-        sensitivity_dict[info["full_name"]] = {}
-
-        w = raw_linear.weight
-        w_fro = torch.norm(w, p="fro") ** 2
-        _, singular_values, _ = torch.svd(w.float(), compute_uv=False)
-        spectral_norm = torch.max(singular_values)
-        w_spec = spectral_norm ** 2
-        sr = (w_fro / w_spec) ** 0.5
+    names = [name for name, module in model.named_modules() if isinstance(module, nn.Linear)]
+    return {
+        name: {param_ratio: -scores.mean("stable_rank", name) * param_ratio ** 0.1 for param_ratio in param_ratio_candidates}
+        for name in names
+    }
 
-        for param_ratio in param_ratio_candidates:
-            sensitivity_dict[info["full_name"]][param_ratio] = -sr * param_ratio ** 0.1
 
-    os.makedirs("cache", exist_ok=True)
-    torch.save(sensitivity_dict, cache_file)
-    return sensitivity_dict
+def calib_sensitivity_importance(model, calib_loader, args, metric, use_cache=True):
+    """
+    Sensitivity from a Fisher, gradient, activation or magnitude importance score, computed
+    in one sweep over calib_loader and cached with the other scores of this calibration setup.
+    """
+    scores = _importance_scores(model, calib_loader, args, [metric], use_cache)
+    model.eval()
+    if args.compress_kv_cache:
+        param_ratio_candidates = [0.1 * i for i in range(1, 20)]
+    else:
+        param_ratio_candidates = [0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+    names = [name for name, module in model.named_modules() if isinstance(module, nn.Linear)]
+    return scores.sensitivity_dict(metric, param_ratio_candidates, names)
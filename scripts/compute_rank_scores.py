@@ -1,5 +1,5 @@
 """
-Compute 4 types of per-layer importance scores for rank allocation,
+Compute 5 types of per-layer importance scores for rank allocation,
 for all projection matrices (Q, K, V, O).
 
 Methods:
@@ -7,6 +7,10 @@ Methods:
   2. Magnitude: RoPE pair energy (Q, K) / weight Frobenius norm (V, O)
   3. Activation: Input activation norm to projection layers
   4. Gradient: ||grad||_1 on projection weights
+  5. Stable rank: ||W||_F / ||W||_2
+
+1, 3, 4, 5 and the V/O weight norms come from one sweep of src.importance and
+are cached in cache/importance/ (shared with the other rank allocators).
 
 Usage:
   python scripts/compute_rank_scores.py \
@@ -19,7 +23,7 @@ from __future__ import annotations
 
 import argparse
 import json
-import random
+import sys
 from pathlib import Path
 
 import numpy as np
@@ -31,6 +35,10 @@ from tqdm import tqdm
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from transformers.models.llama.modeling_llama import LlamaRotaryEmbedding
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.calib_sampler import CalibSampler
+from src.importance import ImportanceScores
+
 PROJECTIONS = ["q_proj", "k_proj", "v_proj", "o_proj"]
 
 
@@ -112,103 +120,37 @@ def capture_layer_input(model, input_ids, layer_id, device):
 
 # ── Calibration data ──────────────────────────────────────────────────────
 
-def get_calib_loader(tokenizer, nsamples: int = 32, seqlen: int = 1024, seed: int = 3):
-    random.seed(seed)
-    np.random.seed(seed)
-    dataset = load_dataset("wikitext", "wikitext-2-raw-v1", split="train")
-    text = "\n\n".join(dataset["text"])
-    enc = tokenizer(text, return_tensors="pt")
-    full_ids = enc.input_ids[0]
-    samples = []
-    for _ in range(nsamples):
-        start = random.randint(0, len(full_ids) - seqlen - 1)
-        ids = full_ids[start : start + seqlen].unsqueeze(0)
-        samples.append({"input_ids": ids})
-    return samples
-
-
-# ── Score: Fisher Information ─────────────────────────────────────────────
-
-def compute_fisher_scores(model, calib_loader, device) -> dict[str, list[float]]:
-    """E[grad^2] on each projection's weights. All 4 projections scored in one backward pass."""
-    num_layers = model.config.num_hidden_layers
-    accum = {p: [0.0] * num_layers for p in PROJECTIONS}
-    model.train()
-
-    for batch in tqdm(calib_loader, desc="Fisher"):
-        ids = batch["input_ids"][:, :-1].to(device)
-        labels = batch["input_ids"][:, 1:].to(device)
-        out = model(input_ids=ids, labels=labels)
-        out[0].backward()
-        for i in range(num_layers):
-            attn = model.model.layers[i].self_attn
-            for p in PROJECTIONS:
-                g = getattr(attn, p).weight.grad
-                if g is not None:
-                    accum[p][i] += g.detach().float().pow(2).sum().item()
-        model.zero_grad()
-
-    n = len(calib_loader)
-    model.eval()
-    return {p: [(a / n) ** 0.5 for a in accum[p]] for p in PROJECTIONS}
-
-
-# ── Score: Gradient L1 ────────────────────────────────────────────────────
+def get_calib_loader(tokenizer, nsamples: int = 32, seqlen: int = 1024, seed: int = 3, calib_file: str | None = None):
+    """Seeded windows of the WikiText-2 train split, or of a local corpus file (offline)."""
+    if calib_file:
+        sampler = CalibSampler.from_file(calib_file, tokenizer, seed=seed)
+    else:
+        sampler = CalibSampler.from_dataset("wikitext2", tokenizer, split="train", seed=seed)
+    return sampler.loader(nsamples, seqlen)
 
-def compute_gradient_scores(model, calib_loader, device) -> dict[str, list[float]]:
-    """||grad||_1 on each projection's weights. All 4 projections scored in one backward pass."""
-    num_layers = model.config.num_hidden_layers
-    accum = {p: [0.0] * num_layers for p in PROJECTIONS}
-    model.train()
 
-    for batch in tqdm(calib_loader, desc="Gradient"):
-        ids = batch["input_ids"][:, :-1].to(device)
-        labels = batch["input_ids"][:, 1:].to(device)
-        out = model(input_ids=ids, labels=labels)
-        out[0].backward()
-        for i in range(num_layers):
-            attn = model.model.layers[i].self_attn
-            for p in PROJECTIONS:
-                g = getattr(attn, p).weight.grad
-                if g is not None:
-                    accum[p][i] += g.detach().float().abs().sum().item()
-        model.zero_grad()
-
-    n = len(calib_loader)
-    model.eval()
-    return {p: [a / n for a in accum[p]] for p in PROJECTIONS}
+# ── Scores: Fisher, Gradient L1, Activation, weight norms (one sweep) ─────
 
+SWEEP_SCORES = ["fisher", "gradient", "activation", "magnitude", "stable_rank"]
 
-# ── Score: Activation Norm ────────────────────────────────────────────────
 
-@torch.no_grad()
-def compute_activation_scores(model, calib_loader, device) -> dict[str, list[float]]:
-    """Input activation norm to each projection (pre-hook).
-    Note: q/k/v share the same input (hidden_states), so their scores are identical.
-    o_proj receives attention output, so its scores differ.
+def compute_sweep_scores(model, calib_loader, device, scores: ImportanceScores) -> dict[str, dict[str, list[float]]]:
+    """Per-layer scores of every projection from the shared importance-score file.
+    Missing score types are computed in one forward/backward sweep over calib_loader:
+      fisher      sqrt(E[grad^2] summed over the weight)
+      gradient    E[||grad||_1]
+      activation  mean input L2 norm per token (q/k/v share their input, so their scores are identical)
+      magnitude   weight Frobenius norm (used for V and O)
+      stable_rank ||W||_F / ||W||_2
     """
-    num_layers = model.config.num_hidden_layers
-    accum = {p: [0.0] * num_layers for p in PROJECTIONS}
-    count = {p: [0] * num_layers for p in PROJECTIONS}
+    model.train()
+    scores.ensure(
+        model, tqdm(calib_loader, desc="Fisher/Gradient/Activation"), device, SWEEP_SCORES,
+        module_filter=lambda name: "self_attn" in name and name.rsplit(".", 1)[-1] in PROJECTIONS,
+    )
     model.eval()
-
-    hooks = []
-    for i in range(num_layers):
-        for p in PROJECTIONS:
-            def hook_fn(module, args, layer_id=i, proj=p):
-                hs = args[0].detach().float()
-                accum[proj][layer_id] += hs.norm(dim=-1).mean().item()
-                count[proj][layer_id] += 1
-            h = getattr(model.model.layers[i].self_attn, p).register_forward_pre_hook(hook_fn)
-            hooks.append(h)
-
-    for batch in tqdm(calib_loader, desc="Activation"):
-        model(input_ids=batch["input_ids"].to(device))
-
-    for h in hooks:
-        h.remove()
-
-    return {p: [accum[p][i] / max(count[p][i], 1) for i in range(num_layers)] for p in PROJECTIONS}
+    num_layers = model.config.num_hidden_layers
+    return {t: {p: scores.per_layer(t, p, num_layers) for p in PROJECTIONS} for t in SWEEP_SCORES}
 
 
 # ── Score: Magnitude (RoPE energy for Q/K, weight norm for V/O) ──────────
@@ -216,7 +158,7 @@ def compute_activation_scores(model, calib_loader, device) -> dict[str, list[flo
 @torch.no_grad()
 def compute_magnitude_scores(model, tokenizer, device, batches=8, batch_size=4, seq_len=1024) -> dict[str, list[float]]:
     """RoPE pair energy for Q and K projections (computed together per layer).
-    Weight Frobenius norm for V and O projections.
+    V and O use the weight Frobenius norm of compute_sweep_scores.
     """
     model.eval()
     model.config.use_cache = False
@@ -291,16 +233,7 @@ def compute_magnitude_scores(model, tokenizer, device, batches=8, batch_size=4,
             proj_info[pname]["accum"] /= max(total, 1)
             qk_scores[pname].append(proj_info[pname]["accum"].sum().item())
 
-    # V and O: weight Frobenius norm per layer
-    vo_scores = {"v_proj": [], "o_proj": []}
-    print("  Computing weight Frobenius norms for V, O projections...")
-    for layer_id in range(num_layers):
-        attn = model.model.layers[layer_id].self_attn
-        for pname in ["v_proj", "o_proj"]:
-            w = getattr(attn, pname).weight.detach().float()
-            vo_scores[pname].append(w.norm().item())
-
-    return {**qk_scores, **vo_scores}
+    return qk_scores
 
 
 # ── Main ──────────────────────────────────────────────────────────────────
@@ -313,6 +246,10 @@ def main():
     ap.add_argument("--nsamples", type=int, default=32)
     ap.add_argument("--seqlen", type=int, default=1024)
     ap.add_argument("--seed", type=int, default=3)
+    ap.add_argument("--calib-file", type=str, default=None,
+                    help="Local corpus (.txt, .jsonl[.gz] or token-id .npy) to sample calibration windows from")
+    ap.add_argument("--scores-cache", type=Path, default=Path("cache") / "importance",
+                    help="Directory of the per-(model, dataset, nsamples, seqlen) importance-score files")
     args = ap.parse_args()
 
     device = torch.device(args.device)
@@ -327,19 +264,17 @@ def main():
 
     print(f"Model: {model_short}, layers={num_layers}, heads={num_attention_heads}, kv_heads={num_kv_heads}, head_dim={head_dim}")
 
-    calib_loader = get_calib_loader(tokenizer, args.nsamples, args.seqlen, args.seed)
-
-    print("\n=== Fisher Information (all projections) ===")
-    fisher = compute_fisher_scores(model, calib_loader, device)
-
-    print("\n=== Gradient L1 (all projections) ===")
-    gradient = compute_gradient_scores(model, calib_loader, device)
+    calib_loader = get_calib_loader(tokenizer, args.nsamples, args.seqlen, args.seed, args.calib_file)
+    np.random.seed(args.seed)  # sample_batch draws of the magnitude scores
 
-    print("\n=== Activation Norm (all projections) ===")
-    activation = compute_activation_scores(model, calib_loader, device)
+    dataset = Path(args.calib_file).name.split(".")[0] if args.calib_file else "wikitext2"
+    scores = ImportanceScores(args.scores_cache, args.model, dataset, args.nsamples, args.seqlen, seed=args.seed)
+    print(f"\n=== Fisher / Gradient L1 / Activation / Stable rank (all projections): {scores.path} ===")
+    sweep = compute_sweep_scores(model, calib_loader, device, scores)
 
     print("\n=== Magnitude (Q/K: RoPE energy, V/O: weight norm) ===")
-    magnitude = compute_magnitude_scores(model, tokenizer, device, seq_len=args.seqlen)
+    magnitude = {**compute_magnitude_scores(model, tokenizer, device, seq_len=args.seqlen),
+                 "v_proj": sweep["magnitude"]["v_proj"], "o_proj": sweep["magnitude"]["o_proj"]}
 
     result = {
         "model": model_short,
@@ -350,17 +285,19 @@ def main():
         "head_dim": head_dim,
         "hidden_size": cfg.hidden_size,
         "calib": {
-            "dataset": "wikitext-2-raw-v1",
+            "dataset": args.calib_file or "wikitext-2-raw-v1",
             "nsamples": args.nsamples,
             "seqlen": args.seqlen,
             "seed": args.seed,
         },
         "scores": {
-            "fisher": fisher,
+            "fisher": sweep["fisher"],
             "magnitude": magnitude,
-            "activation": activation,
-            "gradient": gradient,
+            "activation": sweep["activation"],
+            "gradient": sweep["gradient"],
+            "stable_rank": sweep["stable_rank"],
         },
+        "scores_file": str(scores.path),
     }
 
     args.output.parent.mkdir(parents=True, exist_ok=True)
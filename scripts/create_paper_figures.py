@@ -16,6 +16,11 @@ from matplotlib.lines import Line2D
 from matplotlib.ticker import MultipleLocator
 from pathlib import Path
 from collections import Counter
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.results_store import ResultsStore
 
 try:
     from adjustText import adjust_text
@@ -59,6 +64,7 @@ plt.rcParams.update({
 })
 
 OUTPUT_DIR = Path('Latex/figures')
+RESULTS_STORE = Path('results/store')
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 
@@ -189,21 +195,30 @@ def fig2_sdpa_latency():
     # Load and merge both datasets
     all_measurements = {}  # head_dim -> latency (deduplicate by keeping first)
 
-    for path in [
-        Path('results/S1/20260119_224805_S1_sdpa_dense_sweep/raw.json'),
-        Path('results/S1/20260202_170342_S1_sdpa_extended/raw.json'),
+    store = ResultsStore(RESULTS_STORE)
+    for experiment, run_id in [
+        ('S1_sdpa_dense_sweep', '20260119_224805_S1_sdpa_dense_sweep'),
+        ('S1_sdpa_extended', '20260202_170342_S1_sdpa_extended'),
     ]:
-        if not path.exists():
-            print(f"  Warning: {path} not found, skipping")
-            continue
-        with open(path) as f:
-            data = json.load(f)
-        for r in data['measurements']:
-            s = r['shape']
-            if s['batch'] == 4 and s['seq_len'] == 2048 and 64 <= s['head_dim'] <= 256:
-                d = s['head_dim']
-                if d not in all_measurements:
-                    all_measurements[d] = r['timing']['mean']
+        if store.run_path(experiment, run_id).exists():
+            df = store.query(experiment=experiment, run_id=run_id,
+                             shape={'batch': 4, 'seq_len': 2048},
+                             columns=['shape.head_dim', 'timing.mean'])
+            points = zip(df['shape.head_dim'], df['timing.mean'])
+        else:
+            # Runs from before the results store
+            path = Path('results/S1') / run_id / 'raw.json'
+            if not path.exists():
+                print(f"  Warning: {run_id} not found in {RESULTS_STORE} or results/S1, skipping")
+                continue
+            with open(path) as f:
+                data = json.load(f)
+            points = [(r['shape']['head_dim'], r['timing']['mean']) for r in data['measurements']
+                      if 'error' not in r and r['shape']['batch'] == 4 and r['shape']['seq_len'] == 2048]
+        for d, latency in points:
+            d = int(d)
+            if 64 <= d <= 256 and d not in all_measurements:
+                all_measurements[d] = float(latency)
 
     dims = np.array(sorted(all_measurements.keys()))
     latencies = np.array([all_measurements[d] for d in dims])
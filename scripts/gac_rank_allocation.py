@@ -19,10 +19,23 @@ import argparse
 import json
 import math
 import csv
+import sys
 from pathlib import Path
 from typing import Dict, List, Tuple
 import numpy as np
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.rank_allocation import (
+    ProfileLatencyModel,
+    allocate_aligned_ranks,
+    allocate_latency_budgeted,
+    pareto_frontier,
+    predicted_latency,
+    sweep_aligned_ranks,
+)
+from src.importance import SCORE_TYPES, ImportanceScores
+from src.roofline import DeviceProfile, RooflineLatencyModel
+
 
 # ---------------------------------------------------------------------------
 # Constants for Llama-3-8B with PaLU (group_size=4)
@@ -32,16 +45,17 @@ NUM_GROUPS = 2          # 8 KV heads / group_size 4
 FULL_RANK = 512         # head_dim(128) * group_size(4)
 NUM_PROJECTIONS = 64    # 32 layers * 2 (k_proj, v_proj)
 PROJ_NAMES = ["k_proj", "v_proj"]
+HIDDEN_SIZE = 4096      # input features of k_proj / v_proj
 
 
-def load_fisher_scores(scores_path: str) -> Dict[str, List[float]]:
-    """Load fisher scores from rank_scores JSON."""
+def load_fisher_scores(scores_path: str, score_type: str = "fisher") -> Dict[str, List[float]]:
+    """Load per-layer k/v scores from rank_scores JSON or an importance-score file (.npz, src/importance.py)."""
+    if scores_path.endswith(".npz"):
+        scores = ImportanceScores.open(Path(scores_path))
+        return {proj: scores.per_layer(score_type, proj, NUM_LAYERS) for proj in PROJ_NAMES}
     with open(scores_path) as f:
         data = json.load(f)
-    return {
-        "k_proj": data["scores"]["fisher"]["k_proj"],
-        "v_proj": data["scores"]["fisher"]["v_proj"],
-    }
+    return {proj: data["scores"][score_type][proj] for proj in PROJ_NAMES}
 
 
 def load_palu_ranks(config_path: str) -> Dict[str, List[int]]:
@@ -188,96 +202,146 @@ def strategy_gac_dp(
     - Maximizes total Fisher-weighted value
     - All chosen ranks are multiples of `align`
     """
-    # Build projection list with candidates
-    projections = []
+    ideal_ranks, fisher_by_key = {}, {}
     for proj in PROJ_NAMES:
         for layer in range(NUM_LAYERS):
-            key = (layer, proj)
-            ideal = float_ranks[key]
-            f_i = fisher[proj][layer]
+            ideal_ranks[(layer, proj)] = float_ranks[(layer, proj)]
+            fisher_by_key[(layer, proj)] = fisher[proj][layer]
+
+    # Every projection costs NUM_GROUPS parameters per rank (one per group)
+    ranks = allocate_aligned_ranks(
+        ideal_ranks,
+        fisher_by_key,
+        unit_costs={k: NUM_GROUPS for k in ideal_ranks},
+        max_ranks={k: FULL_RANK for k in ideal_ranks},
+        budget=budget,
+        align=align,
+        search_radius=search_radius,
+    )
+    if ranks is None:
+        return strategy_round_to_n(float_ranks, fisher, budget, align)
+    return ranks
 
-            # Generate candidates: multiples of align near ideal
-            ideal_aligned = round(ideal / align) * align
-            candidates = []
-            for offset in range(-search_radius, search_radius + 1):
-                c = ideal_aligned + offset * align
-                if c < align:
-                    continue
-                if c > FULL_RANK:
-                    continue
-                candidates.append(c)
-
-            if not candidates:
-                candidates = [max(align, min(FULL_RANK, ideal_aligned))]
-
-            projections.append({
-                "key": key,
-                "ideal": ideal,
-                "fisher": f_i,
-                "candidates": candidates,
-            })
 
-    # DP: maximize total Fisher-weighted value under budget constraint
-    budget_unit = align * NUM_GROUPS  # smallest budget quantum
-    B = budget // budget_unit + 1
-
-    n = len(projections)
-    NEG_INF = float("-inf")
-
-    # dp[b] = max value using exactly b budget units for first i projections
-    dp = [NEG_INF] * (B + 1)
-    dp[0] = 0.0
-    choice = [[None] * (B + 1) for _ in range(n)]
-
-    for i, proj in enumerate(projections):
-        new_dp = [NEG_INF] * (B + 1)
-        for c in proj["candidates"]:
-            value_c = proj["fisher"] * (c - proj["ideal"])
-            c_units = (c * NUM_GROUPS) // budget_unit
-            for b in range(c_units, B + 1):
-                prev_b = b - c_units
-                if dp[prev_b] > NEG_INF and dp[prev_b] + value_c > new_dp[b]:
-                    new_dp[b] = dp[prev_b] + value_c
-                    choice[i][b] = c
-        dp = new_dp
-
-    # Find best feasible solution: prefer using full budget, but accept close
-    max_b = budget // budget_unit
-    best_b = None
-    best_value = NEG_INF
-
-    # First try exact budget match
-    for b in range(max_b, max(0, max_b - 3), -1):
-        if dp[b] > NEG_INF:
-            best_b = b
-            best_value = dp[b]
-            break
+def strategy_gac_dp_sweep(
+    fisher: Dict[str, List[float]],
+    budgets: List[int],
+    align: int = 8,
+    search_radius: int = 8,
+) -> Dict[int, Dict]:
+    """
+    ``strategy_gac_dp`` at every budget of a compression-ratio sweep, with one
+    shared DP (see ``sweep_aligned_ranks``) instead of one per budget.
+    Returns ``{budget: ranks}``.
+    """
+    float_ranks = {b: simulate_fisher_allocation(fisher, b) for b in budgets}
+    keys = list(float_ranks[budgets[0]])
+    fisher_by_key = {k: fisher[k[1]][k[0]] for k in keys}
+    swept = sweep_aligned_ranks(
+        float_ranks,
+        fisher_by_key,
+        unit_costs={k: NUM_GROUPS for k in keys},
+        max_ranks={k: FULL_RANK for k in keys},
+        align=align,
+        search_radius=search_radius,
+    )
+    return {
+        b: ranks if ranks is not None else strategy_round_to_n(float_ranks[b], fisher, b, align)
+        for b, ranks in swept.items()
+    }
 
-    # If no exact match, search wider
-    if best_b is None:
-        for b in range(max_b, -1, -1):
-            if dp[b] > NEG_INF:
-                best_b = b
-                best_value = dp[b]
-                break
 
-    if best_b is None:
-        return strategy_round_to_n(float_ranks, fisher, budget, align)
+def projection_latency_fn(latency_model: ProfileLatencyModel):
+    """Predicted latency (us) of a k/v projection at per-group rank r: NUM_GROUPS x (HIDDEN_SIZE -> r -> FULL_RANK)."""
+    def latency(key, ranks):
+        return NUM_GROUPS * latency_model.predict_projection(ranks, FULL_RANK, HIDDEN_SIZE)
+    return latency
 
-    # Backtrack
-    ranks = {}
-    b = best_b
-    for i in range(n - 1, -1, -1):
-        c = choice[i][b]
-        if c is None:
-            # Should not happen if DP is correct
-            c = projections[i]["candidates"][len(projections[i]["candidates"]) // 2]
-        ranks[projections[i]["key"]] = c
-        b -= (c * NUM_GROUPS) // budget_unit
 
+def strategy_gac_latency(
+    float_ranks: Dict,
+    fisher: Dict[str, List[float]],
+    budget: int,
+    latency_fn,
+    latency_budget: float = None,
+    latency_weight: float = 0.0,
+    align: int = 2,
+    search_radius: int = 16,
+) -> Dict:
+    """
+    Latency-aware GAC DP.
+
+    Same multi-choice knapsack as ``strategy_gac_dp``, but candidates are on a
+    finer grid (``align``) and the predicted latency of each candidate (from
+    the measured alignment profile) enters the objective, so the allocator
+    decides per projection whether an unaligned rank is worth its cost.
+    With ``latency_budget`` the Lagrange weight is searched so the total
+    predicted latency stays within it; otherwise ``latency_weight`` is used.
+    """
+    ideal_ranks = {(layer, proj): float_ranks[(layer, proj)] for proj in PROJ_NAMES for layer in range(NUM_LAYERS)}
+    fisher_by_key = {k: fisher[k[1]][k[0]] for k in ideal_ranks}
+    kwargs = dict(
+        unit_costs={k: NUM_GROUPS for k in ideal_ranks},
+        max_ranks={k: FULL_RANK for k in ideal_ranks},
+        budget=budget,
+        align=align,
+        search_radius=search_radius,
+    )
+    if latency_budget is not None:
+        ranks = allocate_latency_budgeted(
+            ideal_ranks, fisher_by_key, latency_fn=latency_fn, latency_budget=latency_budget, **kwargs
+        )
+    else:
+        ranks = allocate_aligned_ranks(
+            ideal_ranks, fisher_by_key, latency_fn=latency_fn, latency_weight=latency_weight, **kwargs
+        )
+    if ranks is None:
+        return strategy_gac_dp(float_ranks, fisher, budget)
     return ranks
 
 
+def fisher_weighted_value(ranks: Dict, float_ranks: Dict, fisher: Dict[str, List[float]]) -> float:
+    """Asymmetric Fisher-weighted value sum f_i (r_i - r*_i) (the DP objective / quality proxy)."""
+    return sum(fisher[proj][layer] * (r - float_ranks[(layer, proj)]) for (layer, proj), r in ranks.items())
+
+
+def pareto_sweep(
+    fisher: Dict[str, List[float]],
+    ref_float_ranks: Dict,
+    budgets: List[int],
+    latency_fn,
+    latency_weights: List[float],
+    align: int = 2,
+    search_radius: int = 16,
+) -> List[Dict]:
+    """
+    Solve the latency-aware DP for every (param budget, latency weight) pair
+    and return the Pareto frontier of (quality proxy, params, predicted
+    latency). The quality proxy is measured against ``ref_float_ranks`` so
+    configurations at different budgets are comparable.
+    """
+    points = []
+    for budget in budgets:
+        float_ranks = simulate_fisher_allocation(fisher, budget)
+        for weight in latency_weights:
+            ranks = strategy_gac_latency(
+                float_ranks, fisher, budget, latency_fn,
+                latency_weight=weight, align=align, search_radius=search_radius,
+            )
+            points.append({
+                "budget": budget,
+                "latency_weight": weight,
+                "params": _total_budget(ranks),
+                "fisher_value": fisher_weighted_value(ranks, ref_float_ranks, fisher),
+                "predicted_latency_us": predicted_latency(ranks, latency_fn),
+                "pct_aligned_mod8": 100.0 * sum(r % 8 == 0 for r in ranks.values()) / len(ranks),
+                "ranks": ranks,
+            })
+    return pareto_frontier(
+        points, maximize=["fisher_value"], minimize=["params", "predicted_latency_us"]
+    )
+
+
 def _greedy_fill(ranks: Dict, float_ranks: Dict, budget: int):
     """Greedily add +1 to ranks to fill budget gap."""
     total = _total_budget(ranks)
@@ -319,16 +383,18 @@ def load_profile_table(csv_path: str) -> Dict:
     return table
 
 
-def estimate_alignment_penalty(rank: int, profile_table: Dict) -> float:
+def estimate_alignment_penalty(
+    rank: int, profile_table: Dict, latency_model: ProfileLatencyModel = None
+) -> float:
     """
     Estimate alignment penalty ratio for a given rank dimension.
 
-    Uses the K-dimension profiling data pattern:
+    If exact value is in profile table, use it directly. Otherwise, with a
+    latency model, use its interpolated prediction against the aligned rank
+    below. Without profiling data, fall back to the K-dimension pattern:
     - mod 8 == 0: no penalty (1.0)
     - mod 2 == 0 but mod 8 != 0: ~20% penalty (CUTLASS align2)
     - odd: ~35% penalty (CUTLASS align1)
-
-    If exact value is in profile table, use it directly.
     """
     # Check if we have direct profiling data
     if rank in profile_table.get("K", {}):
@@ -347,6 +413,10 @@ def estimate_alignment_penalty(rank: int, profile_table: Dict) -> float:
             return profile_table["K"][rank]["time_us"] / aligned_ref
         return 1.0
 
+    if latency_model is not None:
+        ref = max(8, (rank // 8) * 8)
+        return float(latency_model.predict(rank) / latency_model.predict(ref))
+
     # Use empirical pattern from profiling data
     if rank % 8 == 0:
         return 1.0  # aligned, no penalty
@@ -362,6 +432,7 @@ def analyze_strategy(
     float_ranks: Dict,
     fisher: Dict[str, List[float]],
     profile_table: Dict,
+    latency_model: ProfileLatencyModel = None,
 ) -> Dict:
     """Compute statistics for a rank allocation strategy."""
     total_budget = _total_budget(ranks)
@@ -387,7 +458,7 @@ def analyze_strategy(
     # Estimated latency penalty (sum of per-projection penalties)
     total_penalty = 0.0
     for key, r in ranks.items():
-        penalty = estimate_alignment_penalty(r, profile_table)
+        penalty = estimate_alignment_penalty(r, profile_table, latency_model)
         total_penalty += penalty
 
     avg_penalty = total_penalty / len(ranks)
@@ -395,7 +466,7 @@ def analyze_strategy(
     # Rank statistics
     all_ranks = list(ranks.values())
 
-    return {
+    stats = {
         "strategy": name,
         "total_budget": total_budget,
         "n_projections": len(ranks),
@@ -411,6 +482,9 @@ def analyze_strategy(
         "rank_min": min(all_ranks),
         "rank_max": max(all_ranks),
     }
+    if latency_model is not None:
+        stats["predicted_latency_us"] = predicted_latency(ranks, projection_latency_fn(latency_model))
+    return stats
 
 
 def ranks_to_palu_config(ranks: Dict) -> Dict[str, List[int]]:
@@ -424,21 +498,45 @@ def ranks_to_palu_config(ranks: Dict) -> Dict[str, List[int]]:
 
 def main():
     parser = argparse.ArgumentParser(description="GAC Rank Allocation")
-    parser.add_argument("--scores", default="results/rank_scores/llama3_8b.json")
+    parser.add_argument("--scores", default="results/rank_scores/llama3_8b.json",
+                        help="compute_rank_scores.py JSON, or an importance-score .npz from cache/importance/")
+    parser.add_argument("--score-type", default="fisher", choices=SCORE_TYPES,
+                        help="Importance score that drives the proportional allocation")
     parser.add_argument("--palu-config",
                         default="/home/xinj/rap/submodules/palu/"
                                 "Meta-Llama-3-8B-Instruct_ratio-0.7_gs-4-fisher_uniform-svd/config.json")
     parser.add_argument("--profile-csv", default="results/alignment_sweep.csv")
     parser.add_argument("--output", default="results/gac_allocation")
+    parser.add_argument("--roofline-profile", default=None,
+                        help="Predict latency with a calibrated roofline profile (scripts/roofline_latency.py) "
+                             "instead of interpolating --profile-csv")
+    parser.add_argument("--roofline-tokens", type=int, default=2048,
+                        help="Token count (GEMM rows) the roofline profile predicts at")
+    parser.add_argument("--latency-budget", type=float, default=None,
+                        help="Latency-aware DP: max predicted latency as a fraction of gac_dp's")
+    parser.add_argument("--latency-weight", type=float, default=1.0,
+                        help="Latency-aware DP: Fisher value traded per predicted us (without --latency-budget)")
+    parser.add_argument("--latency-align", type=int, default=2,
+                        help="Candidate rank granularity of the latency-aware DP")
+    parser.add_argument("--pareto", action="store_true",
+                        help="Sweep budgets x latency weights and save the Pareto frontier")
+    parser.add_argument("--sweep-ratios", type=str, default=None,
+                        help="Comma-separated compression ratios: write GAC DP configs for all of them "
+                             "(one shared DP) to ranks_gac_dp_sweep.json")
+    parser.add_argument("--pareto-budgets", type=str, default="0.8,0.85,0.9,0.95,1.0",
+                        help="Param budgets for --pareto, as fractions of the PaLU budget")
     args = parser.parse_args()
 
     out_dir = Path(args.output)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # Load data
-    fisher = load_fisher_scores(args.scores)
+    fisher = load_fisher_scores(args.scores, args.score_type)
     palu_ranks = load_palu_ranks(args.palu_config)
     profile_table = load_profile_table(args.profile_csv)
+    latency_model = ProfileLatencyModel.from_csv(args.profile_csv) if profile_table["K"] else None
+    if args.roofline_profile:
+        latency_model = RooflineLatencyModel(DeviceProfile.load(args.roofline_profile), tokens=args.roofline_tokens)
 
     # Compute total budget from existing PaLU checkpoint
     total_budget = sum(sum(r) for r in palu_ranks.values())
@@ -484,6 +582,18 @@ def main():
     strategies["gac_dp"] = strategy_gac_dp(float_ranks, fisher, total_budget,
                                             align=8, search_radius=5)
 
+    # e) Latency-aware GAC DP (measured alignment profile in the objective)
+    if latency_model is not None:
+        latency_fn = projection_latency_fn(latency_model)
+        latency_budget = None
+        if args.latency_budget is not None:
+            latency_budget = args.latency_budget * predicted_latency(strategies["gac_dp"], latency_fn)
+        strategies["gac_latency"] = strategy_gac_latency(
+            float_ranks, fisher, total_budget, latency_fn,
+            latency_budget=latency_budget, latency_weight=args.latency_weight,
+            align=args.latency_align,
+        )
+
     # Step 3: Analyze each strategy
     print("\n" + "=" * 100)
     print(f"{'Strategy':<16} {'Budget':>8} {'Aligned/8':>10} {'Aligned/32':>11} "
@@ -492,7 +602,7 @@ def main():
 
     results = []
     for name, ranks in strategies.items():
-        stats = analyze_strategy(name, ranks, float_ranks, fisher, profile_table)
+        stats = analyze_strategy(name, ranks, float_ranks, fisher, profile_table, latency_model)
         results.append(stats)
         print(f"{stats['strategy']:<16} {stats['total_budget']:>8} "
               f"{stats['n_aligned_mod8']:>6}/{stats['n_projections']:<4}"
@@ -515,6 +625,42 @@ def main():
         with open(out_dir / f"ranks_{name}.json", "w") as f:
             json.dump(config, f, indent=2)
 
+    if args.pareto and latency_model is not None:
+        # Latency weights spanning "ignore latency" to "latency dominates":
+        # scaled so 1 unit trades the mean Fisher score per rank for the mean latency per rank
+        mean_fisher = np.mean([f for proj in PROJ_NAMES for f in fisher[proj]])
+        latency_per_rank = np.mean(latency_fn(None, np.arange(8, FULL_RANK + 1, 8)) / np.arange(8, FULL_RANK + 1, 8))
+        scale = mean_fisher / latency_per_rank
+        weights = [0.0] + [scale * w for w in np.logspace(-2, 2, 9)]
+        budgets = [int(float(f) * total_budget) for f in args.pareto_budgets.split(",")]
+        frontier = pareto_sweep(
+            fisher, float_ranks, budgets, latency_fn, weights, align=args.latency_align,
+        )
+        for point in frontier:
+            point["ranks"] = ranks_to_palu_config(point["ranks"])
+        with open(out_dir / "pareto_frontier.json", "w") as f:
+            json.dump(frontier, f, indent=2)
+        print(f"\nPareto frontier: {len(frontier)} of {len(budgets) * len(weights)} configurations")
+        print(f"{'Budget':>8} {'Weight':>10} {'Params':>8} {'F.Value':>10} {'Latency us':>11} {'Aligned/8':>10}")
+        for point in sorted(frontier, key=lambda p: p["params"]):
+            print(f"{point['budget']:>8} {point['latency_weight']:>10.3g} {point['params']:>8} "
+                  f"{point['fisher_value']:>10.1f} {point['predicted_latency_us']:>11.1f} "
+                  f"{point['pct_aligned_mod8']:>9.0f}%")
+
+    if args.sweep_ratios:
+        full_budget = NUM_PROJECTIONS * NUM_GROUPS * FULL_RANK
+        ratios = [float(r) for r in args.sweep_ratios.split(",")]
+        budgets = [int(r * full_budget) for r in ratios]
+        swept = strategy_gac_dp_sweep(fisher, budgets, align=8, search_radius=5)
+        sweep_configs = {
+            f"{r:.3f}": {"budget": b, "actual_budget": _total_budget(swept[b]),
+                         "ranks": ranks_to_palu_config(swept[b])}
+            for r, b in zip(ratios, budgets)
+        }
+        with open(out_dir / "ranks_gac_dp_sweep.json", "w") as f:
+            json.dump(sweep_configs, f, indent=2)
+        print(f"\nGAC DP sweep: {len(ratios)} ratios written to {out_dir / 'ranks_gac_dp_sweep.json'}")
+
     # Step 5: Print per-layer comparison
     print("\n\nPer-layer rank comparison (per-group ranks):")
     print(f"{'Layer':<6} {'Proj':<8} {'Ideal':>8} {'Unaligned':>10} "
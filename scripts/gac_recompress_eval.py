@@ -26,6 +26,12 @@ from pathlib import Path
 import torch
 import torch.nn as nn
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.lowrank import LOW_RANK_METHODS, low_rank_factorize, rel_frobenius_error, sqrt_split
+from src.ppl_engine import perplexity
+from src.token_cache import TokenCache
+
 
 # -----------------------------------------------------------------------
 # Self-contained headwise low-rank module (no PaLU dependency)
@@ -56,8 +62,13 @@ class HeadwiseLowRankModule(nn.Module):
         return torch.cat(outputs, dim=-1)
 
     @staticmethod
-    def from_linear(old_module: nn.Linear, ranks: list):
-        """Create from existing Linear via per-group SVD decomposition."""
+    def from_linear(old_module: nn.Linear, ranks: list, svd_method: str = "exact"):
+        """Create from existing Linear via per-group SVD decomposition.
+
+        All groups are factorized in one batched call at the largest rank and
+        then truncated per group. The per-group relative Frobenius error is
+        kept in ``new_module.rel_error``.
+        """
         has_bias = old_module.bias is not None
         new_module = HeadwiseLowRankModule(
             ranks, old_module.in_features, old_module.out_features, bias=has_bias
@@ -67,18 +78,14 @@ class HeadwiseLowRankModule(nn.Module):
         if has_bias:
             b = old_module.bias.data.reshape(len(ranks), -1)
 
-        wl_list = []
-        wr_list = []
-        for i in range(len(ranks)):
-            U, S, Vt = torch.linalg.svd(w[i].float(), full_matrices=False)
-            U = U[:, :ranks[i]]
-            S = S[:ranks[i]]
-            Vt = Vt[:ranks[i], :]
-            sqrtS = torch.sqrt(torch.diag(S))
-            L = (U @ sqrtS).to(w.dtype)   # (group_dim, rank)
-            R = (sqrtS @ Vt).to(w.dtype)   # (rank, in_features)
-            wl_list.append(L)
-            wr_list.append(R)
+        fact = low_rank_factorize(w, max(ranks), method=svd_method)
+        L, R = sqrt_split(fact["U"], fact["S"], fact["Vt"], dtype=w.dtype)
+        wl_list = [L[i, :, :r] for i, r in enumerate(ranks)]  # (group_dim, rank)
+        wr_list = [R[i, :r, :] for i, r in enumerate(ranks)]  # (rank, in_features)
+        # Error of each group at its own rank
+        new_module.rel_error = [
+            rel_frobenius_error(w[i], fact["S"][i, :r]).item() for i, r in enumerate(ranks)
+        ]
 
         # Load into U modules
         for i in range(len(ranks)):
@@ -98,35 +105,15 @@ class HeadwiseLowRankModule(nn.Module):
 def compute_perplexity(model, tokenizer, device: str, block_size: int = 512) -> dict:
     """Compute perplexity on WikiText-2 validation set."""
     try:
-        from datasets import load_dataset
-        ds = load_dataset("wikitext", "wikitext-2-raw-v1", split="validation")
-        text = "\n".join(ds["text"])
+        input_ids = TokenCache().get("wikitext2_lines", "validation", tokenizer).ids
     except Exception as e:
         print(f"WARNING: Could not load wikitext-2 ({e}), using fallback")
         text = "Artificial intelligence is transforming systems. " * 1000
+        input_ids = tokenizer(text, return_tensors="pt").input_ids
 
-    enc = tokenizer(text, return_tensors="pt")
-    input_ids = enc.input_ids.to(device)
-
-    nlls = []
-    total_tokens = 0
     model.eval()
-    with torch.inference_mode():
-        for i in range(0, input_ids.size(1), block_size):
-            chunk = input_ids[:, i:i + block_size]
-            if chunk.size(1) < 2:
-                continue
-            out = model(chunk, labels=chunk)
-            nll = out.loss * chunk.size(1)
-            nlls.append(nll)
-            total_tokens += chunk.size(1)
-
-    if not nlls:
-        return {"ppl": None, "nll": None, "tokens": 0}
-
-    nll_sum = torch.stack(nlls).sum()
-    ppl = torch.exp(nll_sum / total_tokens).item()
-    return {"ppl": ppl, "nll": nll_sum.item(), "tokens": total_tokens}
+    result = perplexity(model, input_ids, seq_len=block_size)
+    return {"ppl": result["ppl"], "nll": result["nll"], "tokens": result["tokens"]}
 
 
 def load_rank_config(rank_file: str) -> dict:
@@ -139,6 +126,7 @@ def compress_and_eval(
     strategy_name: str,
     device: str,
     dtype: torch.dtype = torch.float16,
+    svd_method: str = "exact",
 ) -> dict:
     """Load base model, compress with given ranks, evaluate perplexity."""
     from transformers import AutoModelForCausalLM, AutoTokenizer
@@ -157,7 +145,7 @@ def compress_and_eval(
     print(f"  Model loaded in {time.time() - t0:.1f}s")
 
     # Compress: replace k_proj and v_proj with HeadwiseLowRankModule
-    print(f"  Compressing {len(rank_config)} projections via SVD...")
+    print(f"  Compressing {len(rank_config)} projections via SVD ({svd_method})...")
     t1 = time.time()
 
     # Build module lookup
@@ -169,6 +157,7 @@ def compress_and_eval(
             parent_map[full_name] = (module, child_name)
 
     n_compressed = 0
+    rel_errors = []
     for layer_name, ranks_list in rank_config.items():
         if layer_name not in module_dict:
             print(f"  WARNING: {layer_name} not found, skipping")
@@ -184,11 +173,15 @@ def compress_and_eval(
             continue
 
         parent, attr = parent_map[layer_name]
-        low_rank = HeadwiseLowRankModule.from_linear(raw_linear, ranks_list)
+        low_rank = HeadwiseLowRankModule.from_linear(raw_linear, ranks_list, svd_method=svd_method)
         setattr(parent, attr, low_rank)
+        rel_errors.extend(low_rank.rel_error)
         n_compressed += 1
 
     print(f"  Compressed {n_compressed} projections in {time.time() - t1:.1f}s")
+    if rel_errors:
+        print(f"  Relative Frobenius error per group: mean {sum(rel_errors) / len(rel_errors):.4f}, "
+              f"max {max(rel_errors):.4f}")
 
     # Count parameters
     total_params = sum(p.numel() for p in model.parameters())
@@ -218,6 +211,9 @@ def compress_and_eval(
         "total_params": total_params,
         "lr_params": lr_params,
         "n_compressed": n_compressed,
+        "svd_method": svd_method,
+        "rel_error_mean": sum(rel_errors) / len(rel_errors) if rel_errors else None,
+        "rel_error_max": max(rel_errors) if rel_errors else None,
     }
 
 
@@ -297,6 +293,8 @@ def main():
     parser.add_argument("--include-palu", action="store_true")
     parser.add_argument("--device", default="cuda:0")
     parser.add_argument("--dtype", default="float16", choices=["float16", "bfloat16"])
+    parser.add_argument("--svd-method", default="exact", choices=LOW_RANK_METHODS,
+                        help="Low-rank factorization: exact thin SVD, randomized (Halko) or Lanczos")
     args = parser.parse_args()
 
     out_dir = Path(args.output)
@@ -329,7 +327,7 @@ def main():
             continue
 
         rank_config = load_rank_config(rank_file)
-        result = compress_and_eval(rank_config, strategy, args.device, dtype)
+        result = compress_and_eval(rank_config, strategy, args.device, dtype, svd_method=args.svd_method)
         all_results.append(result)
 
     # Print summary
@@ -32,7 +32,6 @@ from typing import Dict, List, Tuple
 
 import numpy as np
 import torch
-import torch.nn as nn
 from tqdm import tqdm
 from transformers import AutoModelForCausalLM, AutoTokenizer, LlamaForCausalLM
 from transformers.models.llama.modeling_llama import LlamaRMSNorm
@@ -44,10 +43,9 @@ import LLMPruner.torch_pruning as tp
 from LLMPruner.pruner import hf_llama_pruner as llama_pruner
 from LLMPruner.datasets.example_samples import get_examples
 
-# Add SVD-LLM to path for data utils
-SVDLLM_DIR = Path(__file__).parent.parent / "third_party" / "SVD-LLM"
-sys.path.insert(0, str(SVDLLM_DIR))
-from utils.data_utils import get_test_data
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.ppl_engine import perplexity
+from src.token_cache import TokenCache
 
 # ---------------------------------------------------------------------------
 # Constants for Llama-3-8B
@@ -213,26 +211,12 @@ def eval_ppl(model, tokenizer, dev, seq_len=2048, batch_size=4):
     """Evaluate WikiText-2 PPL."""
     model.to(dev)
     model.eval()
-    test_loader = get_test_data("wikitext2", tokenizer, seq_len=seq_len, batch_size=batch_size)
-    nlls = []
-    for batch in tqdm(test_loader, desc="PPL eval"):
-        batch = batch.to(dev)
-        output = model(batch, use_cache=False)
-        lm_logits = output.logits
-        if torch.isfinite(lm_logits).all():
-            shift_logits = lm_logits[:, :-1, :].contiguous()
-            shift_labels = batch[:, 1:].contiguous()
-            loss_fct = nn.CrossEntropyLoss(reduction="none")
-            loss = loss_fct(
-                shift_logits.reshape(-1, shift_logits.size(-1)),
-                shift_labels.view(-1)
-            )
-            nlls.append(loss)
-        else:
-            print("  Warning: non-finite logits detected, skipping batch")
-    if not nlls:
-        return float("nan")
-    ppl = np.exp(torch.cat(nlls, dim=-1).mean().item())
+    # Same non-overlapping windows as SVD-LLM's get_test_data, as views into the token cache
+    windows = TokenCache().get("wikitext2", "test", tokenizer).blocks(seq_len)
+    result = perplexity(model, windows, seq_len=seq_len, max_batch_tokens=batch_size * seq_len)
+    if result["skipped"]:
+        print(f"  Warning: non-finite logits detected, skipped {result['skipped']} windows")
+    ppl = result["ppl"] if result["ppl"] is not None else float("nan")
     model.cpu()
     torch.cuda.empty_cache()
     return ppl
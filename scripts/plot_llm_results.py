@@ -6,17 +6,29 @@ Usage:
 import argparse
 import json
 from pathlib import Path
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.results_store import ResultsStore
+
 
 def load_run(run_dir: Path):
-    with open(run_dir / "raw.json") as f:
-        raw = json.load(f)
     with open(run_dir / "summary.json") as f:
         summary = json.load(f)
     with open(run_dir / "config.json") as f:
         config = json.load(f)
+    if (run_dir / "raw.json").exists():
+        # Runs from before the results store
+        with open(run_dir / "raw.json") as f:
+            raw = json.load(f)
+        return raw, summary, config
+    store = ResultsStore(run_dir.parent / "store")
+    raw = {}
+    for m in store.records(experiment=summary["experiment"], run_id=summary["run_id"], include_errors=True):
+        raw.setdefault(m.pop("phase"), []).append(m)
     return raw, summary, config
 
 
@@ -1,19 +1,43 @@
 """Plotting script for night sweep experiments."""
 import json
 import argparse
+import sys
 from pathlib import Path
+from typing import Optional
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-def load_results(run_dir: Path):
-    """Load results from a run directory."""
+from src.results_store import ResultsStore
+
+
+def load_results(run_dir: Path, store_root: Optional[Path] = None):
+    """Load results from a run directory.
+
+    Measurements are read from the results store (default:
+    ``<results-root>/store`` for ``<results-root>/<group>/<run_id>``); run
+    directories from before the store still load from their ``raw.json``.
+    """
     raw_path = run_dir / "raw.json"
-    if not raw_path.exists():
-        raise FileNotFoundError(f"raw.json not found in {run_dir}")
-    
-    with open(raw_path) as f:
-        return json.load(f)
+    if raw_path.exists():
+        with open(raw_path) as f:
+            return json.load(f)
+    
+    summary_path = run_dir / "summary.json"
+    if not summary_path.exists():
+        raise FileNotFoundError(f"Neither raw.json nor summary.json found in {run_dir}")
+    with open(summary_path) as f:
+        summary = json.load(f)
+    
+    store = ResultsStore(store_root or run_dir.parent.parent / "store")
+    experiment = summary["experiment"]
+    run_id = summary.get("run_id", run_dir.name)
+    return {
+        **summary,
+        "config": store.run_metadata(experiment, run_id)["config"],
+        "measurements": store.records(experiment=experiment, run_id=run_id, include_errors=True),
+    }
 
 
 def plot_s1_sdpa_dense(results: dict, output_dir: Path):
@@ -305,10 +329,11 @@ PLOTTERS = {
 
 def main():
     parser = argparse.ArgumentParser(description="Plot night sweep experiment results")
-    parser.add_argument("run_dir", type=Path, help="Run directory containing raw.json")
+    parser.add_argument("run_dir", type=Path, help="Run directory (summary.json, or legacy raw.json)")
+    parser.add_argument("--store", type=Path, default=None, help="Results store (default: <results-root>/store)")
     args = parser.parse_args()
     
-    results = load_results(args.run_dir)
+    results = load_results(args.run_dir, args.store)
     exp_name = results.get("experiment", "")
     
     if exp_name not in PLOTTERS:
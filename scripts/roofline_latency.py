@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Fit and validate the roofline latency model (src/roofline.py) without GPU time.
+
+Calibrate a device profile from existing sweep files:
+    python scripts/roofline_latency.py --calibrate \
+        --alignment-csv results/alignment_sweep.csv \
+        --gemv-json results/gemv_fine_sweep.json \
+        --profile results/roofline/a100_profile.json
+
+Report predicted vs measured error against any benchmark outputs at hand:
+    python scripts/roofline_latency.py --validate \
+        --profile results/roofline/a100_profile.json \
+        --gemm-results results/svdllm_latency/gemm_results.json \
+        --gemv-real-dims results/gemv_real_dims.json \
+        --report results/roofline/validation.json
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.gcompress_bench.dimension_repair import CostTable
+from src.roofline import (
+    DeviceProfile,
+    calibrate_profile,
+    error_summary,
+    gemm_us,
+    load_alignment_sweep,
+    load_gemv_sweep,
+    load_sdpa_sweep,
+    sdpa_us,
+)
+
+
+_SHAPE = re.compile(r"\((\d+), (\d+)\) @ \((\d+), (\d+)\)")
+
+
+def gemm_rows(rows: List[Dict], profile: DeviceProfile) -> List[Dict]:
+    """Predictions for sweep rows (``m, n, k, time_us``)."""
+    return [
+        {
+            "label": f"{r['swept']}={r[r['swept'].lower()]}",
+            "measured_us": r["time_us"],
+            "predicted_us": float(gemm_us(profile, r["m"], r["n"], r["k"])),
+        }
+        for r in rows
+    ]
+
+
+def factorized_gemm_rows(path: str, profile: DeviceProfile) -> List[Dict]:
+    """
+    ``bench_gemm_shapes`` output (scripts/svdllm_latency_bench.py): V and U
+    GEMMs of every (strategy, proj, rank), shapes parsed from ``shape_V``/``shape_U``.
+    """
+    with open(path) as f:
+        results = json.load(f)
+    rows = []
+    for strat, entries in results.items():
+        for label, e in entries.items():
+            for part in ("V", "U"):
+                m, k, _, n = map(int, _SHAPE.match(e[f"shape_{part}"]).groups())
+                rows.append({
+                    "label": f"{strat}/{label}/{part}",
+                    "measured_us": e[f"{part}_proj"]["mean_ms"] * 1000,
+                    "predicted_us": float(gemm_us(profile, m, n, k)),
+                })
+    return rows
+
+
+def svd_decode_rows(path: str, profile: DeviceProfile) -> List[Dict]:
+    """``gemv_real_dims.json``: dense and factorized (x @ B^T @ A^T) decode of each projection."""
+    with open(path) as f:
+        results = json.load(f)
+    rows = []
+    for name, e in results["layers"].items():
+        out_dim, in_dim = e["dims"]["out"], e["dims"]["in"]
+        rows.append({
+            "label": f"{name}/dense",
+            "measured_us": e["original_ms"] * 1000,
+            "predicted_us": float(gemm_us(profile, 1, out_dim, in_dim)),
+        })
+        for kind in ("unaligned", "aligned"):
+            rank = e[f"rank_{kind}"]
+            pred = gemm_us(profile, 1, rank, in_dim) + gemm_us(profile, 1, out_dim, rank)
+            rows.append({
+                "label": f"{name}/svd_r{rank}",
+                "measured_us": e[f"svd_{kind}_ms"] * 1000,
+                "predicted_us": float(pred),
+            })
+    return rows
+
+
+def sdpa_rows(path: str, profile: DeviceProfile) -> List[Dict]:
+    return [
+        {
+            "label": f"b{r['batch']}_s{r['seq_len']}_h{r['n_heads']}_d{r['head_dim']}",
+            "measured_us": r["time_us"],
+            "predicted_us": sdpa_us(profile, r["batch"], r["n_heads"], r["seq_len"], r["seq_len"], r["head_dim"]),
+        }
+        for r in load_sdpa_sweep(path)
+    ]
+
+
+def summarize(rows: List[Dict], worst: int = 10) -> Dict:
+    summary = error_summary([r["predicted_us"] for r in rows], [r["measured_us"] for r in rows])
+    for r in rows:
+        r["error_pct"] = (r["predicted_us"] - r["measured_us"]) / r["measured_us"] * 100
+    summary["worst"] = sorted(rows, key=lambda r: -abs(r["error_pct"]))[:worst]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roofline latency model: calibrate and validate")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="Fit the device profile from the sweep files and save it to --profile")
+    parser.add_argument("--validate", action="store_true",
+                        help="Compare predictions of --profile against every measurement file given")
+    parser.add_argument("--profile", default="results/roofline/device_profile.json")
+    parser.add_argument("--gpu", default="A100", help="Spec-sheet peaks to start calibration from (A100/H100)")
+    parser.add_argument("--peak-tflops", type=float, default=None, help="Override the spec-sheet fp16 peak")
+    parser.add_argument("--bandwidth-gbs", type=float, default=None, help="Override the spec-sheet bandwidth")
+    parser.add_argument("--alignment-csv", default=None, help="profile_alignment.py --sweep CSV")
+    parser.add_argument("--sweep-fixed", nargs=3, type=int, default=[2048, 2048, 128],
+                        metavar=("M", "N", "K"), help="Fixed dims the alignment sweep was run with")
+    parser.add_argument("--gemv-json", default=None, help="gemv_fine_sweep.py output")
+    parser.add_argument("--gemv-fixed", type=int, default=4096, help="Fixed dim of the GEMV sweep")
+    parser.add_argument("--sdpa-json", default=None, help="run_sdpa_benchmark results JSON")
+    parser.add_argument("--gemm-results", default=None, help="svdllm_latency_bench.py gemm_results.json")
+    parser.add_argument("--gemv-real-dims", default=None, help="gemv_real_dims.py output")
+    parser.add_argument("--report", default="results/roofline/validation.json")
+    parser.add_argument("--repair-cost-table", default=None,
+                        help="With --calibrate: also export the fitted curves as a dimension-repair CostTable JSON")
+    args = parser.parse_args()
+
+    if not (args.calibrate or args.validate):
+        parser.error("nothing to do: pass --calibrate and/or --validate")
+
+    if args.calibrate:
+        profile = DeviceProfile.for_gpu(args.gpu)
+        if args.peak_tflops is not None:
+            profile.peak_tflops = args.peak_tflops
+        if args.bandwidth_gbs is not None:
+            profile.bandwidth_gbs = args.bandwidth_gbs
+        calibrate_profile(
+            profile, args.alignment_csv, args.gemv_json, args.sdpa_json,
+            sweep_fixed=tuple(args.sweep_fixed), gemv_fixed=args.gemv_fixed,
+        )
+        profile.save(Path(args.profile))
+        print(f"Profile ({profile.name}): launch={profile.launch_us:.2f}us  gemm_scale={profile.gemm_scale:.3f}  "
+              f"gemv_scale={profile.gemv_scale:.3f}  sdpa_scale={profile.sdpa_scale:.3f}")
+        for key, curve in profile.penalties.items():
+            print(f"  {key:<16} " + " ".join(f"{p:.2f}" for p in curve))
+        print(f"Saved to {args.profile}")
+        if args.repair_cost_table:
+            CostTable.from_device_profile(profile).save(Path(args.repair_cost_table))
+            print(f"Repair cost table saved to {args.repair_cost_table}")
+
+    if args.validate:
+        profile = DeviceProfile.load(Path(args.profile))
+        sources = {}
+        # The sweeps the profile was fitted on are in-sample; they show how well the curves fit
+        if args.alignment_csv:
+            sources["alignment_sweep (in-sample)"] = gemm_rows(
+                load_alignment_sweep(args.alignment_csv, *args.sweep_fixed), profile)
+        if args.gemv_json:
+            sources["gemv_sweep (in-sample)"] = gemm_rows(load_gemv_sweep(args.gemv_json, args.gemv_fixed), profile)
+        if args.sdpa_json:
+            sources["sdpa"] = sdpa_rows(args.sdpa_json, profile)
+        if args.gemm_results:
+            sources["factorized_gemm"] = factorized_gemm_rows(args.gemm_results, profile)
+        if args.gemv_real_dims:
+            sources["svd_decode"] = svd_decode_rows(args.gemv_real_dims, profile)
+        if not sources:
+            parser.error("--validate needs at least one measurement file")
+
+        report = {"profile": profile.to_dict(), "sources": {}}
+        print(f"\n{'Source':<28} {'N':>6} {'MAPE':>8} {'Median':>8} {'Max':>8} {'Spearman':>9}")
+        print("-" * 72)
+        for name, rows in sources.items():
+            if not rows:
+                continue
+            summary = summarize(rows)
+            report["sources"][name] = summary
+            print(f"{name:<28} {summary['n']:>6} {summary['mape_pct']:>7.1f}% {summary['median_ape_pct']:>7.1f}% "
+                  f"{summary['max_ape_pct']:>7.1f}% {summary.get('spearman', float('nan')):>9.3f}")
+
+        out = Path(args.report)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -61,7 +61,15 @@ def parse_args():
         "--device",
         type=str,
         default="cuda:0",
-        help="CUDA device to use"
+        help="Device to use (e.g. cuda:0 or cpu)"
+    )
+    
+    parser.add_argument(
+        "--timer",
+        type=str,
+        choices=["auto", "cuda_event", "perf_counter", "profiler"],
+        default="auto",
+        help="Timer backend (auto: CUDA events on GPU, perf_counter on CPU)"
     )
     
     parser.add_argument(
@@ -176,6 +184,7 @@ def main():
             warmup_iterations=args.warmup,
             measurement_iterations=args.iterations,
             seed=args.seed,
+            timer=args.timer,
             m_values=args.gemm_m_values,
             k_values=args.gemm_k_values,
             n_values=args.gemm_n_values,
@@ -197,6 +206,7 @@ def main():
             warmup_iterations=args.warmup,
             measurement_iterations=args.iterations,
             seed=args.seed,
+            timer=args.timer,
             batch_sizes=args.sdpa_batch_sizes,
             seq_lengths=args.sdpa_seq_lengths,
             n_heads=args.sdpa_n_heads,
@@ -23,7 +23,7 @@ import sys
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional
 
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
@@ -34,8 +34,11 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 sys.path.insert(0, str(Path(__file__).parent.parent / "third_party" / "palu"))
 
 from src.gcompress_bench.metrics import measure_kernel, compute_stats, memory_stats, reset_memory
-from src.gcompress_bench.palu_loader import load_palu_model
-from src.gcompress_bench.dimension_repair import DimensionRepairer, repair_dimension, ShapeContract
+from src.gcompress_bench.palu_loader import load_palu_model, load_repaired_palu, save_repaired_palu
+from src.gcompress_bench.dimension_repair import (
+    CostTable, DimensionRepairer, ModelShapeIndex, repair_dimension, ShapeContract,
+)
+from src.ppl_engine import perplexity
 from environment import collect_environment
 
 
@@ -52,7 +55,7 @@ class BenchmarkConfig:
     trials: int = 3
     dtype: str = "float16"
     device: str = "cuda:0"
-    repair_strategy: str = "minimal"  # minimal, optimal, predefined, tradeoff
+    repair_strategy: str = "minimal"  # minimal, optimal, predefined, tradeoff, cost_model
 
 
 @dataclass
@@ -97,75 +100,41 @@ def analyze_palu_dimensions(model) -> Dict:
 
     We need to detect per-head ranks from U[i].in_features or module.ranks attribute.
     These are the dimensions that may be misaligned (e.g., 114, 117, 121, 125).
+    Baseline (non-PaLU) models report their k_proj/v_proj widths instead.
     """
-    dims = []
-    aligned_8 = 0
-    aligned_16 = 0
-    total = 0
-
-    # Import HeadwiseLowRankModule for type checking
-    try:
-        from palu.model.modules.svd_linear import HeadwiseLowRankModule
-        has_palu = True
-    except ImportError:
-        has_palu = False
-
-    for name, module in model.named_modules():
-        # Check for PaLU's HeadwiseLowRankModule (k_proj/v_proj after SVD)
-        if has_palu and isinstance(module, HeadwiseLowRankModule):
-            # Get per-head ranks from the module's ranks attribute
-            # Each rank is the compressed dimension for one head group
-            for rank in module.ranks:
-                dims.append(rank)
-                total += 1
-                if rank % 8 == 0:
-                    aligned_8 += 1
-                if rank % 16 == 0:
-                    aligned_16 += 1
-        # Fallback: check for standard nn.Linear in attention projections
-        elif hasattr(module, 'weight') and isinstance(module, torch.nn.Linear):
-            if any(proj in name.lower() for proj in ['k_proj', 'v_proj']):
-                # This handles baseline (non-PaLU) models
-                dim = module.out_features
-                dims.append(dim)
-                total += 1
-                if dim % 8 == 0:
-                    aligned_8 += 1
-                if dim % 16 == 0:
-                    aligned_16 += 1
+    return ModelShapeIndex.build(model).alignment_stats()
 
-    return {
-        "unique_dims": sorted(set(dims)),
-        "total_heads": total,
-        "aligned_8_count": aligned_8,
-        "aligned_16_count": aligned_16,
-        "aligned_8_pct": 100.0 * aligned_8 / total if total > 0 else 0,
-        "aligned_16_pct": 100.0 * aligned_16 / total if total > 0 else 0,
-        "misaligned_pct": 100.0 * (total - aligned_8) / total if total > 0 else 0,
-    }
 
+def apply_dimension_repair(model, strategy: str = "minimal", cost_table: Optional[CostTable] = None,
+                           max_total_overhead_pct: Optional[float] = None):
+    """
+    Prepare a reversible dimension repair of a PaLU model.
 
-def apply_dimension_repair(model, strategy: str = "minimal") -> Tuple[torch.nn.Module, Dict]:
-    """Apply dimension repair to PaLU model."""
-    repairer = DimensionRepairer(strategy=strategy)
+    Returns the ``RepairOverlay`` (use it as a context manager to benchmark the
+    repaired variant on the same model object) and the repair info.
+    """
+    repairer = DimensionRepairer(
+        strategy=strategy, cost_table=cost_table, max_total_overhead_pct=max_total_overhead_pct
+    )
 
-    # Analyze before repair
-    before_analysis = analyze_palu_dimensions(model)
+    # Analyze before repair (the shape index is built once and reused below)
+    before_analysis = repairer.index_model(model).alignment_stats()
 
-    # Compute repair plan
+    # Materialize the padded layers; the model itself is untouched until applied
+    overlay = repairer.overlay(model)
+    result = overlay.result
     plan = repairer.compute_repair_plan(model)
 
-    # Apply repair
-    repaired_model, result = repairer.repair_model(model, inplace=False)
-
     # Analyze after repair
-    after_analysis = analyze_palu_dimensions(repaired_model)
+    after_analysis = overlay.index.alignment_stats(dims=overlay.targets)
 
     repair_info = {
         "strategy": strategy,
         "before": before_analysis,
         "after": after_analysis,
         "memory_overhead_pct": result.memory_overhead_pct,
+        "overhead_report": repairer.overhead_report(model),
+        "materialized_mb": overlay.materialized_bytes / 1024 ** 2,
         "affected_layers": len(result.affected_layers),
         "repair_mapping": {
             str(k): {"original": v[0], "repaired": v[1]}
@@ -173,7 +142,7 @@ def apply_dimension_repair(model, strategy: str = "minimal") -> Tuple[torch.nn.M
         },
     }
 
-    return repaired_model, repair_info
+    return overlay, repair_info
 
 
 def gen_input(tokenizer, batch: int, seq_len: int, device: str):
@@ -303,17 +272,12 @@ def compute_perplexity(model, tokenizer, device: str, max_tokens: int = 4096) ->
     """
 
     enc = tokenizer(test_text, return_tensors="pt", truncation=True, max_length=max_tokens)
-    input_ids = enc.input_ids.to(device)
-
-    with torch.inference_mode():
-        outputs = model(input_ids, labels=input_ids)
-        loss = outputs.loss.item()
-        ppl = torch.exp(torch.tensor(loss)).item()
+    result = perplexity(model, enc.input_ids, seq_len=max_tokens)
 
     return {
-        "perplexity": ppl,
-        "loss": loss,
-        "tokens": input_ids.shape[1],
+        "perplexity": result["ppl"],
+        "loss": result["nll"] / result["tokens"],
+        "tokens": enc.input_ids.shape[1],
     }
 
 
@@ -535,7 +499,15 @@ def main():
     parser.add_argument("--device", default="cuda:0", help="Device to run on")
     parser.add_argument("--dtype", default="float16", choices=["float16", "bfloat16"])
     parser.add_argument("--repair-strategy", default="minimal",
-                       choices=["minimal", "optimal", "predefined", "tradeoff"])
+                       choices=["minimal", "optimal", "predefined", "tradeoff", "cost_model"])
+    parser.add_argument("--repair-cost-table", default=None,
+                        help="cost_model: CostTable JSON (default: built-in C23 slowdowns)")
+    parser.add_argument("--repair-overhead-cap", type=float, default=None,
+                        help="cost_model: plan all ranks jointly under this total parameter overhead (%%)")
+    parser.add_argument("--save-repaired", type=Path, default=None,
+                        help="Export the repaired PaLU model (config + safetensors) to this directory")
+    parser.add_argument("--load-repaired", type=Path, default=None,
+                        help="Benchmark a model exported with --save-repaired instead of repairing PaLU again")
     parser.add_argument("--smoke", action="store_true", help="Run smoke test with reduced params")
     parser.add_argument("--skip-baseline", action="store_true", help="Skip baseline (for faster iteration)")
     parser.add_argument("--run-id", default=None, help="Custom run ID")
@@ -614,23 +586,38 @@ def main():
     results["palu"].repair_info = {"before_repair": palu_dim_analysis}
 
     # 3. PaLU + Repair benchmark
-    print("\n" + "="*60)
-    print(f"Applying Dimension Repair (strategy={args.repair_strategy})")
-    print("="*60)
-
-    repaired_model, repair_info = apply_dimension_repair(palu_model, strategy=args.repair_strategy)
-    print(f"Repair applied:")
-    print(f"  Memory overhead: {repair_info['memory_overhead_pct']:.2f}%")
-    print(f"  Affected layers: {repair_info['affected_layers']}")
-    print(f"  After repair - Misaligned: {repair_info['after']['misaligned_pct']:.1f}%")
-
-    # Free original PaLU model before benchmarking repaired model to avoid double memory
-    del palu_model
-    import gc
-    gc.collect()
-    torch.cuda.empty_cache()
+    if args.load_repaired:
+        print("\n" + "="*60)
+        print(f"Loading Repaired PaLU Model from {args.load_repaired}")
+        print("="*60)
+        del palu_model
+        torch.cuda.empty_cache()
+        repaired_model, _, repair_info = load_repaired_palu(args.load_repaired, device=args.device, torch_dtype=torch_dtype)
+        repair_info = repair_info or {"after": analyze_palu_dimensions(repaired_model)}
+        print(f"  After repair - Misaligned: {repair_info['after']['misaligned_pct']:.1f}%")
+        results["palu_repair"] = run_variant("palu_repair", repaired_model, palu_tokenizer, config, repair_info)
+    else:
+        print("\n" + "="*60)
+        print(f"Applying Dimension Repair (strategy={args.repair_strategy})")
+        print("="*60)
 
-    results["palu_repair"] = run_variant("palu_repair", repaired_model, palu_tokenizer, config, repair_info)
+        # Copy-on-write overlay: only the padded layers are new, the rest is shared with palu_model
+        cost_table = CostTable.load(args.repair_cost_table) if args.repair_cost_table else None
+        repair_overlay, repair_info = apply_dimension_repair(
+            palu_model, strategy=args.repair_strategy, cost_table=cost_table,
+            max_total_overhead_pct=args.repair_overhead_cap,
+        )
+        print(f"Repair applied:")
+        print(f"  Memory overhead: {repair_info['memory_overhead_pct']:.2f}%")
+        print(f"  Padded layers: {repair_info['materialized_mb']:.1f} MB")
+        print(f"  Affected layers: {repair_info['affected_layers']}")
+        print(f"  After repair - Misaligned: {repair_info['after']['misaligned_pct']:.1f}%")
+
+        with repair_overlay as repaired_model:
+            if args.save_repaired:
+                save_repaired_palu(repaired_model, args.save_repaired, repair_info)
+                print(f"  Exported repaired model to {args.save_repaired}")
+            results["palu_repair"] = run_variant("palu_repair", repaired_model, palu_tokenizer, config, repair_info)
 
     # Compute comparison
     comparison = compute_comparison(results)
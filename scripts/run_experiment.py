@@ -9,6 +9,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.experiment_runner import load_experiment_spec, run_experiment
 from src.environment import collect_environment
+from src.journal import WorkJournal, journal_context, parse_shard
+from src.results_store import ResultsStore
 
 
 def generate_run_id(exp_name: str) -> str:
@@ -17,28 +19,51 @@ def generate_run_id(exp_name: str) -> str:
     return f"{timestamp}_{exp_name}"
 
 
-def save_results(results: dict, output_dir: Path, run_id: str):
-    """Save experiment results in the required structure."""
+def save_results(results: dict, output_dir: Path, run_id: str, store: ResultsStore):
+    """Save experiment results in the required structure.
+
+    Measurements go to the columnar results store; the run directory keeps
+    the small JSON files (config, summary, env).
+    """
     run_dir = output_dir / run_id
     run_dir.mkdir(parents=True, exist_ok=True)
+    env = collect_environment()
     
     # Save config
     config_path = run_dir / "config.json"
     with open(config_path, 'w') as f:
         json.dump(results["config"], f, indent=2)
     
-    # Save raw results
-    raw_path = run_dir / "raw.json"
-    with open(raw_path, 'w') as f:
-        json.dump(results, f, indent=2)
+    # Save measurements (raw samples included) to the store
+    store.append(
+        results["experiment"],
+        run_id,
+        results.get("measurements", []),
+        env=env,
+        config={**results["config"], "metadata": results.get("metadata", {})},
+    )
     
     # Generate summary
     summary = {
         "experiment": results["experiment"],
+        "run_id": run_id,
         "num_measurements": len(results.get("measurements", [])),
         "successful": len([m for m in results.get("measurements", []) if "error" not in m]),
         "failed": len([m for m in results.get("measurements", []) if "error" in m]),
     }
+    # Experiment-level aggregates (e.g. C2.1 backend_summary) travel with the summary
+    summary.update({
+        k: v for k, v in results.items()
+        if k not in ("experiment", "config", "measurements", "metadata")
+    })
+    adaptive = [m["adaptive"] for m in results.get("measurements", []) if "adaptive" in m]
+    if adaptive:
+        summary["adaptive"] = {
+            "converged": sum(a["stop_reason"] == "converged" for a in adaptive),
+            "time_budget": sum(a["stop_reason"] == "time_budget" for a in adaptive),
+            "max_samples": sum(a["stop_reason"] == "max_samples" for a in adaptive),
+            "elapsed_s": sum(a["elapsed_s"] for a in adaptive),
+        }
     
     summary_path = run_dir / "summary.json"
     with open(summary_path, 'w') as f:
@@ -46,7 +71,6 @@ def save_results(results: dict, output_dir: Path, run_id: str):
     
     # Save environment
     env_path = run_dir / "env.json"
-    env = collect_environment()
     with open(env_path, 'w') as f:
         json.dump(env, f, indent=2)
     
@@ -61,8 +85,8 @@ def main():
     
     parser.add_argument(
         "command",
-        choices=["run"],
-        help="Command to execute"
+        choices=["run", "merge"],
+        help="Command to execute ('merge' stores the merged results from the journals of a sharded run)"
     )
     
     parser.add_argument(
@@ -86,18 +110,46 @@ def main():
         help="Root directory for results"
     )
     
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=None,
+        help="Columnar results store (default: <results-root>/store)"
+    )
+    
     parser.add_argument(
         "--run-id",
         type=str,
         default=None,
-        help="Run ID (default: auto-generated)"
+        help="Run ID (default: auto-generated). Reuse a run ID to resume from its journal"
+    )
+    
+    parser.add_argument(
+        "--shard",
+        type=str,
+        default="0/1",
+        help="Measure only shard i of n of the point space (e.g. 0/4); merge afterwards"
     )
     
     parser.add_argument(
         "--device",
         type=str,
         default="cuda:0",
-        help="CUDA device"
+        help="Device (e.g. cuda:0 or cpu)"
+    )
+    
+    parser.add_argument(
+        "--timer",
+        type=str,
+        choices=["auto", "cuda_event", "perf_counter", "profiler"],
+        default=None,
+        help="Timer backend (default: spec 'timer' key, else auto)"
+    )
+    
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Use adaptive sampling (stop when the median CI converges) if the spec has no 'adaptive' block"
     )
     
     parser.add_argument(
@@ -109,45 +161,87 @@ def main():
     
     args = parser.parse_args()
     
-    if args.command == "run":
-        # Load experiment spec
-        exp_spec = load_experiment_spec(args.spec, args.name)
-        
-        # Generate run ID
-        run_id = args.run_id if args.run_id else generate_run_id(args.name)
-        
-        # Determine output directory (use experiment name as group)
-        exp_group = args.name.split("_")[0]  # S1, S2, G3, etc.
-        output_dir = args.results_root / exp_group
-        
-        print("=" * 70)
-        print(f"Running experiment: {args.name}")
-        print(f"Run ID: {run_id}")
-        print(f"Output directory: {output_dir / run_id}")
-        print("=" * 70)
-        print()
-        
-        # Run experiment
-        results = run_experiment(exp_spec, device=args.device, seed=args.seed)
-        results["metadata"] = {
-            "run_id": run_id,
-            "experiment_name": args.name,
-            "device": args.device,
-            "seed": args.seed,
-        }
-        
-        # Save results
-        run_dir = save_results(results, output_dir, run_id)
-        
+    if args.command == "merge" and not args.run_id:
+        parser.error("merge requires --run-id")
+    if args.command == "merge" and parse_shard(args.shard) != (0, 1):
+        parser.error("merge replays every shard's journal; drop --shard")
+    
+    # Load experiment spec
+    exp_spec = load_experiment_spec(args.spec, args.name)
+    if args.timer is not None:
+        exp_spec["timer"] = args.timer
+    if args.adaptive and not exp_spec.get("adaptive"):
+        exp_spec["adaptive"] = True
+    shard = parse_shard(args.shard)
+    
+    # Generate run ID
+    run_id = args.run_id if args.run_id else generate_run_id(args.name)
+    
+    # Determine output directory (use experiment name as group)
+    exp_group = args.name.split("_")[0]  # S1, S2, G3, etc.
+    output_dir = args.results_root / exp_group
+    
+    # Completed points are journaled as they finish; rerunning the same run ID skips them
+    work = WorkJournal(
+        output_dir / run_id / "journal",
+        shard=shard,
+        context=journal_context(exp_spec, args.seed),
+        replay_only=args.command == "merge",
+        meta={"device": args.device},
+    )
+    
+    print("=" * 70)
+    print(f"{'Running' if args.command == 'run' else 'Merging'} experiment: {args.name}")
+    print(f"Run ID: {run_id}")
+    print(f"Shard: {shard[0]}/{shard[1]}")
+    print(f"Output directory: {output_dir / run_id}")
+    print(f"Resuming {len(work.done)} journaled points")
+    print("=" * 70)
+    print()
+    
+    # Run experiment
+    try:
+        results = run_experiment(exp_spec, device=args.device, seed=args.seed, work=work)
+    finally:
+        work.close()
+    results["metadata"] = {
+        "run_id": run_id,
+        "experiment_name": args.name,
+        "device": args.device,
+        "seed": args.seed,
+        "timer": exp_spec.get("timer", "auto"),
+        "resumed_points": work.resumed,
+    }
+    
+    if args.command == "merge" and work.missing:
+        print(f"⚠️  {work.missing} points have no successful journal entry")
+        results["metadata"]["missing_points"] = work.missing
+    
+    if shard[1] > 1:
+        # Other shards are still writing; results are stored by 'merge'
+        run_dir = output_dir / run_id
         print("=" * 70)
-        print("✅ Experiment completed!")
-        print(f"Results saved to: {run_dir}")
+        print(f"✅ Shard {shard[0]}/{shard[1]} completed "
+              f"({work.skipped_other_shard} points left to other shards)")
+        print(f"Journal: {work.journal_dir}")
         print("=" * 70)
         print()
-        
-        # Print final results path (for Slurm scripts)
         print(run_dir.absolute())
-
+        return
+    
+    # Save results
+    store = ResultsStore(args.store or args.results_root / "store")
+    run_dir = save_results(results, output_dir, run_id, store)
+    
+    print("=" * 70)
+    print("✅ Experiment completed!")
+    print(f"Results saved to: {run_dir}")
+    print(f"Measurements stored in: {store.run_path(results['experiment'], run_id)}")
+    print("=" * 70)
+    print()
+    
+    # Print final results path (for Slurm scripts)
+    print(run_dir.absolute())
 
 if __name__ == "__main__":
     main()
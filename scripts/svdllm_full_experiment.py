@@ -17,6 +17,7 @@ Usage:
 import argparse
 import json
 import math
+import sys
 import time
 from pathlib import Path
 from typing import Dict, List, Tuple
@@ -25,6 +26,11 @@ import numpy as np
 import torch
 import torch.nn as nn
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.ppl_engine import perplexity
+from src.rank_allocation import allocate_aligned_ranks
+from src.token_cache import TokenCache
+
 
 # ---------------------------------------------------------------------------
 # Llama-2-7B constants
@@ -165,105 +171,24 @@ def strategy_gac_dp(
     For each projection, generate candidates (multiples of align near the
     SVD-LLM rank). DP maximizes Fisher-weighted value under budget constraint.
     """
-    projections = []
-    for layer in range(NUM_LAYERS):
-        for proj in ALL_PROJS:
-            key = (layer, proj)
-            ideal = base_ranks[key]
-            f_i = fisher.get(key, 1.0)
-            out_f, in_f = PROJ_SHAPES[proj]
-            max_rank = min(out_f, in_f)
-
-            ideal_aligned = round(ideal / align) * align
-            candidates = []
-            for offset in range(-search_radius, search_radius + 1):
-                c = ideal_aligned + offset * align
-                if c < align:
-                    continue
-                if c > max_rank:
-                    continue
-                candidates.append(c)
-
-            if not candidates:
-                candidates = [max(align, min(max_rank, ideal_aligned))]
-
-            projections.append({
-                "key": key,
-                "ideal": ideal,
-                "fisher": f_i,
-                "candidates": candidates,
-                "param_cost_per_rank": out_f + in_f,
-            })
-
-    # DP with param budget
-    # Scale to manageable units: use align * min_cost as quantum
-    min_cost = min(p["param_cost_per_rank"] for p in projections)
-    # Use a simplified DP: since we have two types of projections (attn/MLP)
-    # with different costs, we track budget directly
-
-    # For tractability, discretize budget in units of (align * min_cost)
-    budget_unit = align * min_cost
-    B = target_budget // budget_unit + 2
-
-    if B > 500000:
-        # Budget too large for DP, fall back to greedy
-        print(f"  Budget too large for DP (B={B}), using greedy alignment")
-        return strategy_round_to_n(base_ranks, fisher, target_budget, align)
-
-    n = len(projections)
-    NEG_INF = float("-inf")
-
-    dp = [NEG_INF] * (B + 1)
-    dp[0] = 0.0
-    choice = [[None] * (B + 1) for _ in range(n)]
-
-    for i, proj in enumerate(projections):
-        new_dp = [NEG_INF] * (B + 1)
-        for c in proj["candidates"]:
-            value_c = proj["fisher"] * (c - proj["ideal"])
-            c_cost = c * proj["param_cost_per_rank"]
-            c_units = c_cost // budget_unit
-            if c_units > B:
-                continue
-            for b in range(int(c_units), B + 1):
-                prev_b = b - int(c_units)
-                if dp[prev_b] > NEG_INF and dp[prev_b] + value_c > new_dp[b]:
-                    new_dp[b] = dp[prev_b] + value_c
-                    choice[i][b] = c
-        dp = new_dp
-
-    # Find best feasible solution
-    max_b = target_budget // budget_unit
-    best_b = None
-    best_value = NEG_INF
-    for b in range(min(max_b, B), max(0, max_b - 10), -1):
-        if dp[b] > NEG_INF:
-            if dp[b] > best_value:
-                best_b = b
-                best_value = dp[b]
-            break
-
-    if best_b is None:
-        for b in range(min(max_b, B), -1, -1):
-            if dp[b] > NEG_INF:
-                best_b = b
-                best_value = dp[b]
-                break
-
-    if best_b is None:
+    ideal_ranks = {
+        (layer, proj): base_ranks[(layer, proj)]
+        for layer in range(NUM_LAYERS) for proj in ALL_PROJS
+    }
+    ranks = allocate_aligned_ranks(
+        ideal_ranks,
+        fisher,
+        unit_costs={k: sum(PROJ_SHAPES[k[1]]) for k in ideal_ranks},
+        max_ranks={k: min(PROJ_SHAPES[k[1]]) for k in ideal_ranks},
+        budget=target_budget,
+        align=align,
+        search_radius=search_radius,
+        max_units=500000,
+    )
+    if ranks is None:
+        print("  GAC DP infeasible or too large, using greedy alignment")
         return strategy_round_to_n(base_ranks, fisher, target_budget, align)
 
-    # Backtrack
-    ranks = {}
-    b = best_b
-    for i in range(n - 1, -1, -1):
-        c = choice[i][b]
-        if c is None:
-            c = projections[i]["candidates"][len(projections[i]["candidates"]) // 2]
-        ranks[projections[i]["key"]] = c
-        c_cost = c * projections[i]["param_cost_per_rank"]
-        b -= int(c_cost // budget_unit)
-
     return ranks
 
 
@@ -338,27 +263,10 @@ def compress_model(model, ranks: Dict[Tuple[int, str], int]):
 @torch.no_grad()
 def compute_perplexity(model, tokenizer, device, block_size=512):
     """Compute WikiText-2 PPL."""
-    from datasets import load_dataset
-    ds = load_dataset("wikitext", "wikitext-2-raw-v1", split="test")
-    text = "\n".join([t for t in ds["text"] if t.strip()])
-    enc = tokenizer(text, return_tensors="pt")
-    input_ids = enc.input_ids.to(device)
-
-    nlls = []
-    total_tokens = 0
+    input_ids = TokenCache().get("wikitext2_nonempty", "test", tokenizer).ids
     model.eval()
-    for i in range(0, input_ids.size(1) - 1, block_size):
-        chunk = input_ids[:, i:i + block_size]
-        if chunk.size(1) < 2:
-            continue
-        out = model(chunk, labels=chunk)
-        nll = out.loss * chunk.size(1)
-        nlls.append(nll)
-        total_tokens += chunk.size(1)
-
-    nll_sum = torch.stack(nlls).sum()
-    ppl = torch.exp(nll_sum / total_tokens).item()
-    return {"ppl": ppl, "nll": nll_sum.item(), "tokens": total_tokens}
+    result = perplexity(model, input_ids, seq_len=block_size)
+    return {"ppl": result["ppl"], "nll": result["nll"], "tokens": result["tokens"]}
 
 
 @torch.no_grad()
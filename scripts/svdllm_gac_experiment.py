@@ -31,7 +31,15 @@ from transformers import AutoModelForCausalLM, AutoTokenizer
 # Add SVD-LLM to path for data utils
 SVDLLM_DIR = Path(__file__).parent.parent / "third_party" / "SVD-LLM"
 sys.path.insert(0, str(SVDLLM_DIR))
-from utils.data_utils import get_calib_train_data, get_test_data
+from utils.data_utils import get_calib_train_data
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.calib_cache import CalibStatsCache
+from src.calib_engine import layerwise_grams
+from src.ppl_engine import perplexity
+from src.token_cache import TokenCache
+from src.rank_allocation import allocate_aligned_ranks, sweep_aligned_ranks
+from src.lowrank import LOW_RANK_METHODS, low_rank_factorize, sqrt_split
 
 
 # ---------------------------------------------------------------------------
@@ -168,83 +176,58 @@ def strategy_round_to_n(base_ranks, fisher, target_budget, n=8):
 # ---------------------------------------------------------------------------
 def strategy_gac_dp(base_ranks, fisher, target_budget, align=8, search_radius=3):
     """GAC DP: multi-choice knapsack for optimal aligned rank allocation."""
-    projections = []
-    for layer in range(NUM_LAYERS):
-        for proj in ALL_PROJS:
-            key = (layer, proj)
-            ideal = base_ranks[key]
-            f_i = fisher.get(key, 1.0)
-            m, n = PROJ_SHAPES[proj]
-            max_rank = min(m, n)
-            unit_cost = m + n  # cost per rank unit
-
-            ideal_aligned = round(ideal / align) * align
-            candidates = []
-            for offset in range(-search_radius, search_radius + 1):
-                c = ideal_aligned + offset * align
-                if align <= c <= max_rank:
-                    candidates.append(c)
-            if not candidates:
-                candidates = [max(align, min(max_rank, ideal_aligned))]
-
-            projections.append({
-                "key": key, "ideal": ideal, "fisher": f_i,
-                "candidates": candidates, "unit_cost": unit_cost,
-            })
-
-    # DP with budget in units of (align * min_unit_cost)
-    min_uc = min(p["unit_cost"] for p in projections)
-    budget_unit = align * min_uc
-    B = target_budget // budget_unit + 2
-
-    if B > 500000:
-        print(f"  DP too large (B={B}), using greedy")
+    ideal_ranks = {
+        (layer, proj): base_ranks[(layer, proj)]
+        for layer in range(NUM_LAYERS) for proj in ALL_PROJS
+    }
+    ranks = allocate_aligned_ranks(
+        ideal_ranks,
+        fisher,
+        unit_costs={k: sum(PROJ_SHAPES[k[1]]) for k in ideal_ranks},
+        max_ranks={k: min(PROJ_SHAPES[k[1]]) for k in ideal_ranks},
+        budget=target_budget,
+        align=align,
+        search_radius=search_radius,
+        max_units=500000,
+    )
+    if ranks is None:
+        print("  GAC DP infeasible or too large, using greedy alignment")
         return strategy_round_to_n(base_ranks, fisher, target_budget, align)
 
-    n_proj = len(projections)
-    NEG_INF = float("-inf")
-    dp = [NEG_INF] * (B + 1)
-    dp[0] = 0.0
-    choice = [[None] * (B + 1) for _ in range(n_proj)]
-
-    for i, p in enumerate(projections):
-        new_dp = [NEG_INF] * (B + 1)
-        for c in p["candidates"]:
-            val = p["fisher"] * (c - p["ideal"])
-            c_units = (c * p["unit_cost"]) // budget_unit
-            if c_units > B:
-                continue
-            for b in range(int(c_units), B + 1):
-                prev = b - int(c_units)
-                if dp[prev] > NEG_INF and dp[prev] + val > new_dp[b]:
-                    new_dp[b] = dp[prev] + val
-                    choice[i][b] = c
-        dp = new_dp
-
-    max_b = target_budget // budget_unit
-    best_b = None
-    for b in range(min(max_b, B), max(0, max_b - 10), -1):
-        if dp[b] > NEG_INF:
-            best_b = b
-            break
-    if best_b is None:
-        for b in range(min(max_b, B), -1, -1):
-            if dp[b] > NEG_INF:
-                best_b = b
-                break
-    if best_b is None:
-        return strategy_round_to_n(base_ranks, fisher, target_budget, align)
+    return _fit_budget(ranks, fisher, target_budget, align)
 
-    ranks = {}
-    b = best_b
-    for i in range(n_proj - 1, -1, -1):
-        c = choice[i][b]
-        if c is None:
-            c = projections[i]["candidates"][len(projections[i]["candidates"]) // 2]
-        ranks[projections[i]["key"]] = c
-        b -= int((c * projections[i]["unit_cost"]) // budget_unit)
-
-    # Post-processing: enforce exact budget constraint
+
+def strategy_gac_dp_sweep(ratios, fisher, align=8, search_radius=3):
+    """
+    ``strategy_gac_dp`` for every keep ratio, with one shared DP
+    (``sweep_aligned_ranks``) instead of one per ratio.
+    Returns ``{ratio: (budget, ranks)}``.
+    """
+    budgets, base_by_budget = {}, {}
+    for ratio in ratios:
+        base_ranks = compute_all_svdllm_ranks(ratio)
+        budgets[ratio] = param_cost(base_ranks)
+        base_by_budget[budgets[ratio]] = base_ranks
+    keys = list(next(iter(base_by_budget.values())))
+    swept = sweep_aligned_ranks(
+        base_by_budget,
+        fisher,
+        unit_costs={k: sum(PROJ_SHAPES[k[1]]) for k in keys},
+        max_ranks={k: min(PROJ_SHAPES[k[1]]) for k in keys},
+        align=align,
+        search_radius=search_radius,
+    )
+    results = {}
+    for ratio, budget in budgets.items():
+        ranks = swept[budget]
+        if ranks is None:
+            ranks = strategy_round_to_n(base_by_budget[budget], fisher, budget, align)
+        results[ratio] = (budget, _fit_budget(dict(ranks), fisher, budget, align))
+    return results
+
+
+def _fit_budget(ranks, fisher, target_budget, align):
+    """Trim (least sensitive first) or top up (most sensitive first) aligned ranks to the exact budget."""
     # DP discretization can cause actual budget to exceed target
     actual = param_cost(ranks)
     if actual > target_budget:
@@ -274,136 +257,53 @@ def strategy_gac_dp(base_ranks, fisher, target_budget, align=8, search_radius=3)
 # Profiling (Cholesky whitening matrices) - computed once
 # ---------------------------------------------------------------------------
 @torch.no_grad()
-def compute_profiling(model, model_name, calib_loader, dev):
-    """Compute Cholesky whitening matrices per linear layer (SVD-LLM step 1)."""
-    layers = model.model.layers
-    model.model.embed_tokens = model.model.embed_tokens.to(dev)
-    model.model.norm = model.model.norm.to(dev)
-    # Move rotary_emb to device (transformers >= 4.46 stores it at model level)
-    if hasattr(model.model, 'rotary_emb'):
-        model.model.rotary_emb = model.model.rotary_emb.to(dev)
-    layers[0] = layers[0].to(dev)
-
-    dtype = next(iter(model.parameters())).dtype
-    inps = torch.zeros(
-        (len(calib_loader), model.seqlen, model.config.hidden_size),
-        dtype=dtype, device=dev
-    )
-    cache = {'i': 0, 'attention_mask': None, 'position_ids': None,
-             'position_embeddings': None}
-
-    class Catcher(nn.Module):
-        def __init__(self, module):
-            super().__init__()
-            self.module = module
-        def forward(self, inp, **kwargs):
-            inps[cache['i']] = inp.cpu()
-            cache['i'] += 1
-            # Capture kwargs — handle None values from newer transformers
-            am = kwargs.get('attention_mask')
-            pi = kwargs.get('position_ids')
-            pe = kwargs.get('position_embeddings')
-            if cache['i'] == 1:  # first sample
-                cache['attention_mask'] = am.cpu() if am is not None else None
-                cache['position_ids'] = pi.cpu() if pi is not None else None
-                if pe is not None:
-                    cache['position_embeddings'] = tuple(t.cpu() for t in pe)
-            else:
-                if am is not None and cache['attention_mask'] is not None:
-                    cache['attention_mask'] = torch.cat(
-                        (cache['attention_mask'], am.cpu()), dim=0)
-                if pi is not None and cache['position_ids'] is not None:
-                    cache['position_ids'] = torch.cat(
-                        (cache['position_ids'], pi.cpu()), dim=0)
-                if pe is not None and cache['position_embeddings'] is not None:
-                    new_pe = tuple(t.cpu() for t in pe)
-                    cache['position_embeddings'] = tuple(
-                        torch.cat((old, new), dim=0)
-                        for old, new in zip(cache['position_embeddings'], new_pe)
-                    )
-            raise ValueError
-
-    layers[0] = Catcher(layers[0])
-    for batch in calib_loader:
-        try:
-            batch = {k: v.to(dev) for k, v in batch.items()}
-            model(**batch)
-        except ValueError:
-            pass
-    layers[0] = layers[0].module
-    layers[0] = layers[0].cpu()
-    model.model.embed_tokens = model.model.embed_tokens.cpu()
-    model.model.norm = model.model.norm.cpu()
-    if hasattr(model.model, 'rotary_emb'):
-        model.model.rotary_emb = model.model.rotary_emb.cpu()
-    torch.cuda.empty_cache()
-
-    outs = torch.zeros_like(inps)
-    attention_masks = cache['attention_mask']
-    position_ids = cache.get('position_ids')
-    position_embeddings = cache.get('position_embeddings')
+def compute_profiling(model, model_name, calib_loader, dev, cache=None,
+                      micro_batch=8, mem_cap_gb=None, scratch_dir=None):
+    """
+    Compute Cholesky whitening matrices per linear layer (SVD-LLM step 1).
 
+    Gram matrices are accumulated layer by layer in fp64 by ``layerwise_grams``
+    (micro-batched; inter-layer activations spill to ``scratch_dir`` above
+    ``mem_cap_gb``). With a ``CalibStatsCache`` each layer's Gram and Cholesky
+    matrices are written to it as soon as the layer is done (nothing is kept
+    in RAM) and the cache is returned; otherwise returns ``{layer: {name: chol}}``.
+    """
     profiling_mat = {}
-    print("Computing Cholesky whitening matrices...")
-    for i in tqdm(range(len(layers))):
-        layer_profile = {}
-        layer = layers[i].to(dev)
-        # Also move rotary_emb to device for per-layer forwarding
-        if hasattr(model.model, 'rotary_emb'):
-            model.model.rotary_emb = model.model.rotary_emb.to(dev)
-        subset = find_layers(layer)
-
-        def hook(module, input, output):
-            inp = input[0].detach().float()
-            if inp.dim() == 2:
-                inp = inp.unsqueeze(0)
-            adds = torch.matmul(inp.transpose(1, 2), inp)
-            module.scaling_diag_matrix += torch.sum(adds, dim=0)
-            del inp, adds
-            torch.cuda.empty_cache()
-
-        handles = []
-        for name in subset:
-            subset[name].scaling_diag_matrix = 0
-            handles.append(subset[name].register_forward_hook(hook))
-
-        for j in range(inps.shape[0]):
-            kwargs = {}
-            if attention_masks is not None:
-                kwargs["attention_mask"] = attention_masks[j].unsqueeze(0).to(dev)
-            if position_embeddings is not None:
-                kwargs["position_embeddings"] = tuple(
-                    t[j].unsqueeze(0).to(dev) for t in position_embeddings
-                )
-            elif position_ids is not None:
-                kwargs["position_ids"] = position_ids[j].unsqueeze(0).to(dev)
-            outs[j] = layer(
-                inps[j].unsqueeze(0).to(dev), **kwargs
-            )[0].cpu()
-
-        for h in handles:
-            h.remove()
-        layer = layer.cpu()
-        if hasattr(model.model, 'rotary_emb'):
-            model.model.rotary_emb = model.model.rotary_emb.cpu()
+    progress = tqdm(total=len(model.model.layers))
 
-        for name in subset:
-            raw = subset[name].scaling_diag_matrix.double().to(dev)
+    def whiten_layer(i, layer, grams):
+        layer_profile = {}
+        for name, gram in grams.items():
             try:
-                chol = torch.linalg.cholesky(raw)
+                chol = torch.linalg.cholesky(gram)
             except Exception:
-                eigenvalues = torch.linalg.eigvalsh(raw)
-                raw += (-eigenvalues[0] + 1e-6) * torch.eye(raw.shape[0]).to(dev)
-                chol = torch.linalg.cholesky(raw)
-            layer_profile[name] = chol.cpu()
-            del raw, chol
-            torch.cuda.empty_cache()
+                eigenvalues = torch.linalg.eigvalsh(gram)
+                chol = torch.linalg.cholesky(
+                    gram + (-eigenvalues[0] + 1e-6) * torch.eye(gram.shape[0], dtype=gram.dtype, device=gram.device)
+                )
+            if cache is not None:
+                layer_profile[name] = {"gram": gram, "chol": chol}
+            else:
+                layer_profile[name] = chol.cpu()
+            del chol
+        if cache is not None:
+            cache.put_layer(i, layer_profile)
+        else:
+            profiling_mat[i] = layer_profile
+        progress.update()
 
-        profiling_mat[i] = layer_profile
-        layers[i] = layer.cpu()
-        inps = outs.clone()
-        torch.cuda.empty_cache()
+    print("Computing Cholesky whitening matrices...")
+    stats = layerwise_grams(
+        model, calib_loader, dev, whiten_layer,
+        micro_batch=micro_batch, mem_cap_gb=mem_cap_gb, scratch_dir=scratch_dir,
+    )
+    progress.close()
+    print(f"  {stats['samples']} samples, peak RSS {stats['peak_rss_gb']:.1f} GB"
+          + (" (activations spilled to disk)" if stats["spilled"] else ""))
 
+    if cache is not None:
+        cache.finalize()
+        return cache
     return profiling_mat
 
 
@@ -411,13 +311,15 @@ def compute_profiling(model, model_name, calib_loader, dev):
 # Whitened SVD compression with per-projection rank override
 # ---------------------------------------------------------------------------
 @torch.no_grad()
-def whitened_svd_compress(model, profiling_mat, ranks_dict, dev):
+def whitened_svd_compress(model, profiling_mat, ranks_dict, dev, svd_method="exact"):
     """
     Apply whitened SVD compression with per-projection rank control.
     ranks_dict: {(layer_idx, proj_name): rank}
+    Returns {(layer_idx, proj_name): relative Frobenius error of the whitened weight}.
     """
     layers = model.model.layers
-    print("Applying whitened SVD compression...")
+    rel_errors = {}
+    print(f"Applying whitened SVD compression ({svd_method})...")
     for i in tqdm(range(len(layers))):
         layer = layers[i]
         subset = find_layers(layer)
@@ -437,15 +339,11 @@ def whitened_svd_compress(model, profiling_mat, ranks_dict, dev):
                 scaling_inv = torch.linalg.inv(scaling)
 
             W_scale = W @ scaling
-            U, S, Vt = torch.linalg.svd(W_scale, full_matrices=False)
-
-            U_trunc = U[:, :rank]
-            S_trunc = S[:rank]
-            Vt_trunc = Vt[:rank, :] @ scaling_inv
+            fact = low_rank_factorize(W_scale, rank, method=svd_method)
+            rel_errors[key] = fact["rel_error"].item()
 
-            sqrtS = torch.diag(torch.sqrt(S_trunc))
-            svd_u = (U_trunc @ sqrtS).half()  # (out_features, rank)
-            svd_v = (sqrtS @ Vt_trunc).half()  # (rank, in_features)
+            svd_u, svd_v = sqrt_split(fact["U"], fact["S"], fact["Vt"] @ scaling_inv, dtype=torch.float16)
+            # svd_u: (out_features, rank), svd_v: (rank, in_features)
 
             # Replace with two-layer factorization
             has_bias = subset[name].bias is not None
@@ -469,9 +367,11 @@ def whitened_svd_compress(model, profiling_mat, ranks_dict, dev):
                 parent = getattr(parent, part)
             setattr(parent, parts[-1], wrapper)
 
-            del W, scaling, scaling_inv, W_scale, U, S, Vt
+            del W, scaling, scaling_inv, W_scale, fact
             torch.cuda.empty_cache()
 
+    return rel_errors
+
 
 class LowRankWrapper(nn.Module):
     def __init__(self, v_proj, u_proj):
@@ -503,26 +403,12 @@ def eval_ppl(model, tokenizer, dev, seq_len=2048, batch_size=4):
     """Evaluate WikiText-2 PPL."""
     model.to(dev)
     model.eval()
-    test_loader = get_test_data("wikitext2", tokenizer, seq_len=seq_len, batch_size=batch_size)
-    nlls = []
-    for batch in tqdm(test_loader, desc="PPL eval"):
-        batch = batch.to(dev)
-        output = model(batch, use_cache=False)
-        lm_logits = output.logits
-        if torch.isfinite(lm_logits).all():
-            shift_logits = lm_logits[:, :-1, :].contiguous()
-            shift_labels = batch[:, 1:].contiguous()
-            loss_fct = nn.CrossEntropyLoss(reduction="none")
-            loss = loss_fct(
-                shift_logits.reshape(-1, shift_logits.size(-1)),
-                shift_labels.view(-1)
-            )
-            nlls.append(loss)
-        else:
-            print("  Warning: non-finite logits detected, skipping batch")
-    if not nlls:
-        return float("nan")
-    ppl = np.exp(torch.cat(nlls, dim=-1).mean().item())
+    # Same non-overlapping windows as SVD-LLM's get_test_data, as views into the token cache
+    windows = TokenCache().get("wikitext2", "test", tokenizer).blocks(seq_len)
+    result = perplexity(model, windows, seq_len=seq_len, max_batch_tokens=batch_size * seq_len)
+    if result["skipped"]:
+        print(f"  Warning: non-finite logits detected, skipped {result['skipped']} windows")
+    ppl = result["ppl"] if result["ppl"] is not None else float("nan")
     model.cpu()
     torch.cuda.empty_cache()
     return ppl
@@ -725,8 +611,21 @@ def main():
     parser.add_argument("--accuracy-tasks", type=str, default="piqa,hellaswag")
     parser.add_argument("--accuracy-limit", type=int, default=200)
     parser.add_argument("--whitening-nsamples", type=int, default=256)
+    parser.add_argument("--svd-method", type=str, default="exact", choices=LOW_RANK_METHODS,
+                        help="Rank-r factorization: exact thin SVD, randomized (Halko) or Lanczos")
     parser.add_argument("--profiling-path", type=str, default=None,
-                        help="Path to pre-computed profiling matrices")
+                        help="Path to pre-computed profiling matrices (legacy torch.save dict)")
+    parser.add_argument("--calib-cache", type=str, default="cache/calib",
+                        help="Root of the per-layer memory-mapped whitening cache")
+    parser.add_argument("--calib-micro-batch", type=int, default=8,
+                        help="Calibration samples per layer forward while profiling")
+    parser.add_argument("--calib-mem-cap-gb", type=float, default=None,
+                        help="Spill calibration activations to --calib-scratch above this size")
+    parser.add_argument("--calib-scratch", type=str, default=None,
+                        help="Directory for spilled calibration activations (default: system temp)")
+    parser.add_argument("--sweep-ratios", type=str, default=None,
+                        help="Comma-separated keep ratios: also write GAC DP ranks for all of them "
+                             "(one shared DP) to ranks_gac_dp_sweep.json")
     parser.add_argument("--strategies", type=str, default=None,
                         help="Comma-separated list of strategies to run (default: all)")
     args = parser.parse_args()
@@ -793,6 +692,19 @@ def main():
         with open(out_dir / f"ranks_{name}.json", "w") as f:
             json.dump(data, f, indent=2)
 
+    if args.sweep_ratios:
+        ratios = [float(r) for r in args.sweep_ratios.split(",")]
+        sweep = strategy_gac_dp_sweep(ratios, fisher, align=8, search_radius=3)
+        with open(out_dir / "ranks_gac_dp_sweep.json", "w") as f:
+            json.dump({
+                f"{ratio:.3f}": {
+                    "budget": budget,
+                    "ranks": [{"layer": k[0], "proj": k[1], "rank": v} for k, v in sorted(ranks.items())],
+                }
+                for ratio, (budget, ranks) in sweep.items()
+            }, f, indent=2)
+        print(f"  GAC DP sweep: {len(ratios)} ratios written to {out_dir / 'ranks_gac_dp_sweep.json'}")
+
     # ---------------------------------------------------------------
     # Step 4: Compute profiling matrices (whitening)
     # ---------------------------------------------------------------
@@ -801,24 +713,29 @@ def main():
         print(f"  Loading from {args.profiling_path}")
         profiling_mat = torch.load(args.profiling_path, weights_only=False)
     else:
-        t0 = time.time()
-        calib_data = get_calib_train_data(
-            "wikitext2", tokenizer, args.whitening_nsamples, seqlen=2048
+        profiling_mat = CalibStatsCache(
+            args.calib_cache, MODEL_ID, "wikitext2", args.whitening_nsamples, model.seqlen
         )
-        profiling_mat = compute_profiling(model, MODEL_ID, calib_data, dev)
-        prof_path = out_dir / "profiling_mat.pt"
-        torch.save(profiling_mat, prof_path)
-        print(f"  Profiling done in {time.time()-t0:.0f}s, saved to {prof_path}")
+        if profiling_mat.complete:
+            print(f"  Using cached whitening matrices in {profiling_mat.path}")
+        else:
+            t0 = time.time()
+            calib_data = get_calib_train_data(
+                "wikitext2", tokenizer, args.whitening_nsamples, seqlen=2048
+            )
+            compute_profiling(
+                model, MODEL_ID, calib_data, dev, cache=profiling_mat,
+                micro_batch=args.calib_micro_batch, mem_cap_gb=args.calib_mem_cap_gb,
+                scratch_dir=args.calib_scratch,
+            )
+            print(f"  Profiling done in {time.time()-t0:.0f}s, cached in {profiling_mat.path}")
 
     # ---------------------------------------------------------------
     # Step 5: Evaluate baseline
     # ---------------------------------------------------------------
     all_results = []
     print("\n[Step 5] Evaluating baseline...")
-    # Free profiling_mat during baseline eval to save RAM
-    prof_path = out_dir / "profiling_mat.pt"
-    del profiling_mat
-    import gc; gc.collect()
+    import gc
 
     t0 = time.time()
     baseline_ppl = eval_ppl(model, tokenizer, dev)
@@ -836,10 +753,6 @@ def main():
     gc.collect()
     torch.cuda.empty_cache()
 
-    # Reload profiling matrices for compression steps
-    print("  Reloading profiling matrices...")
-    profiling_mat = torch.load(prof_path, weights_only=False)
-
     # ---------------------------------------------------------------
     # Step 6: For each strategy, compress and evaluate
     # ---------------------------------------------------------------
@@ -857,9 +770,11 @@ def main():
         model.eval()
 
         # Compress with whitened SVD
-        whitened_svd_compress(model, profiling_mat, ranks, dev)
+        rel_errors = whitened_svd_compress(model, profiling_mat, ranks, dev, svd_method=args.svd_method)
 
         print(f"  Compression done in {time.time()-t0:.0f}s")
+        print(f"  Whitened rel. error: mean {np.mean(list(rel_errors.values())):.4f}, "
+              f"max {max(rel_errors.values()):.4f}")
 
         # PPL
         t1 = time.time()
@@ -874,6 +789,9 @@ def main():
             "ppl": ppl,
             "pct_aligned": pct,
             "budget": param_cost(ranks),
+            "svd_method": args.svd_method,
+            "rel_error_mean": float(np.mean(list(rel_errors.values()))),
+            "rel_error_max": float(max(rel_errors.values())),
             "ranks_summary": {
                 "attn": sorted(set(ranks[(l, p)] for l in range(NUM_LAYERS) for p in ATTN_PROJS)),
                 "mlp": sorted(set(ranks[(l, p)] for l in range(NUM_LAYERS) for p in MLP_PROJS)),
@@ -32,6 +32,7 @@ from scripts.svdllm_gac_experiment import (
     strategy_round_to_n, strategy_gac_dp,
     whitened_svd_compress, LowRankWrapper,
 )
+from src.calib_cache import CalibStatsCache
 
 
 # ---------------------------------------------------------------------------
@@ -373,6 +374,9 @@ def main():
     parser.add_argument("--output", type=str, default="results/svdllm_latency")
     parser.add_argument("--device", type=str, default="cuda")
     parser.add_argument("--profiling-path", type=str, default=None)
+    parser.add_argument("--calib-cache", type=str, default="cache/calib",
+                        help="Whitening cache written by svdllm_gac_experiment.py")
+    parser.add_argument("--whitening-nsamples", type=int, default=256)
     parser.add_argument("--gemm-warmup", type=int, default=100)
     parser.add_argument("--gemm-repeats", type=int, default=500)
     parser.add_argument("--prefill-warmup", type=int, default=5)
@@ -452,8 +456,14 @@ def main():
         print(f"  Loading profiling from {args.profiling_path}")
         profiling_mat = torch.load(args.profiling_path, weights_only=False)
     else:
-        print("  WARNING: No profiling path provided. Skipping end-to-end benchmark.")
-        profiling_mat = None
+        profiling_mat = CalibStatsCache(
+            args.calib_cache, MODEL_ID, "wikitext2", args.whitening_nsamples, 2048
+        )
+        if profiling_mat.complete:
+            print(f"  Using cached whitening matrices in {profiling_mat.path}")
+        else:
+            print("  WARNING: No profiling path or whitening cache. Skipping end-to-end benchmark.")
+            profiling_mat = None
 
     prefill_results = {}
 
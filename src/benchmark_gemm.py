@@ -19,7 +19,7 @@ def run_gemm_benchmark(config: GEMMConfig, output_dir: Path) -> Dict:
     set_deterministic(config.seed)
     device = torch.device(config.device)
     
-    if not torch.cuda.is_available():
+    if device.type == "cuda" and not torch.cuda.is_available():
         raise RuntimeError("CUDA not available")
     
     results = {
@@ -54,6 +54,7 @@ def run_gemm_benchmark(config: GEMMConfig, output_dir: Path) -> Dict:
                                 a, b,
                                 warmup_iterations=config.warmup_iterations,
                                 measurement_iterations=config.measurement_iterations,
+                                timer=config.timer,
                             )
                             result["experiment_type"] = "projection_qkv"
                             result["m"] = m
@@ -104,6 +105,7 @@ def run_gemm_benchmark(config: GEMMConfig, output_dir: Path) -> Dict:
                         a, b,
                         warmup_iterations=config.warmup_iterations,
                         measurement_iterations=config.measurement_iterations,
+                        timer=config.timer,
                     )
                     result["experiment_type"] = "reduction_k"
                     result["m"] = m
@@ -153,6 +155,7 @@ def run_gemm_benchmark(config: GEMMConfig, output_dir: Path) -> Dict:
                                 a, b,
                                 warmup_iterations=config.warmup_iterations,
                                 measurement_iterations=config.measurement_iterations,
+                                timer=config.timer,
                             )
                             result["experiment_type"] = "projection_output"
                             result["m"] = m
@@ -67,7 +67,7 @@ def run_sdpa_benchmark(config: SDPAConfig, output_dir: Path) -> Dict:
     set_deterministic(config.seed)
     device = torch.device(config.device)
     
-    if not torch.cuda.is_available():
+    if device.type == "cuda" and not torch.cuda.is_available():
         raise RuntimeError("CUDA not available")
     
     results = {
@@ -84,7 +84,7 @@ def run_sdpa_benchmark(config: SDPAConfig, output_dir: Path) -> Dict:
                     dtype = get_dtype(dtype_str)
                     
                     # Skip if dtype not supported (e.g., bfloat16 on older GPUs)
-                    if dtype == torch.bfloat16 and not torch.cuda.is_bf16_supported():
+                    if dtype == torch.bfloat16 and device.type == "cuda" and not torch.cuda.is_bf16_supported():
                         print(f"  Skipping {dtype_str} (not supported on this GPU)")
                         continue
                     
@@ -122,14 +122,15 @@ def run_sdpa_benchmark(config: SDPAConfig, output_dir: Path) -> Dict:
                             kernel_fn,
                             warmup_iterations=config.warmup_iterations,
                             measurement_iterations=config.measurement_iterations,
-                            device=str(device)
+                            device=str(device),
+                            timer=config.timer,
                         )
                         
                         # Try to infer backend by attempting to force each one
                         backend_used = None
                         backend_timings = {}
                         
-                        if config.detect_backend and hasattr(torch.backends.cuda, "sdp_kernel"):
+                        if config.detect_backend and device.type == "cuda" and hasattr(torch.backends.cuda, "sdp_kernel"):
                             # Try each backend individually
                             for backend_name in ["flash", "mem_efficient", "math"]:
                                 try:
@@ -157,7 +158,8 @@ def run_sdpa_benchmark(config: SDPAConfig, output_dir: Path) -> Dict:
                                             kernel_fn,
                                             warmup_iterations=5,  # Fewer for backend detection
                                             measurement_iterations=20,
-                                            device=str(device)
+                                            device=str(device),
+                                            timer=config.timer,
                                         )
                                         backend_timings[backend_name] = backend_stats["mean"]
                                         
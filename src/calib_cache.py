@@ -0,0 +1,133 @@
+"""Per-layer, memory-mapped cache of calibration statistics.
+
+Whitening-based compression (SVD-LLM, PaLU) needs one Gram matrix ``X^T X``
+and its Cholesky factor per linear layer. Saving them as one ``torch.save``
+object forces every consumer to load all layers (~32 x 7 matrices of up to
+14336^2) before touching the first one. Here every matrix is its own ``.npy``
+file, opened with ``np.load(mmap_mode=...)`` so only the pages that are
+actually used get read::
+
+    <root>/<model>__<dataset>__n<nsamples>__l<seqlen>/
+        manifest.json
+        layer000.self_attn.k_proj.chol.npy
+        layer000.self_attn.k_proj.gram.npy
+        ...
+
+``cache[i]`` returns ``{name: tensor}`` for layer ``i`` in the layout of the
+old in-memory dicts, so ``profiling_mat[i][name]`` call sites work unchanged.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+
+
+CACHE_KINDS = ("gram", "chol")
+
+
+def cache_key(model_id: str, dataset: str, nsamples: int, seqlen: int) -> str:
+    return f"{model_id.replace('/', '_')}__{dataset}__n{nsamples}__l{seqlen}"
+
+
+class CalibStatsCache:
+    """Directory of individually addressable Gram/Cholesky matrices for one calibration setup."""
+
+    def __init__(self, root: Path, model_id: str, dataset: str, nsamples: int, seqlen: int):
+        self.meta = {"model_id": model_id, "dataset": dataset, "nsamples": nsamples, "seqlen": seqlen}
+        self.path = Path(root) / cache_key(model_id, dataset, nsamples, seqlen)
+
+    def _file(self, layer: int, name: str, kind: str) -> Path:
+        if kind not in CACHE_KINDS:
+            raise ValueError(f"Unknown cache kind '{kind}', expected one of {CACHE_KINDS}")
+        return self.path / f"layer{layer:03d}.{name}.{kind}.npy"
+
+    def _manifest(self) -> Dict[str, Any]:
+        manifest = self.path / "manifest.json"
+        if not manifest.exists():
+            return {**self.meta, "layers": {}, "complete": False}
+        with open(manifest) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp = self.path / "manifest.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.path / "manifest.json")
+
+    @property
+    def complete(self) -> bool:
+        """True once ``finalize`` has been called, i.e. every layer was written."""
+        return self._manifest()["complete"]
+
+    @property
+    def num_layers(self) -> int:
+        return len(self._manifest()["layers"])
+
+    def names(self, layer: int) -> Dict[str, List[str]]:
+        """``{name: [kinds]}`` stored for ``layer``."""
+        return self._manifest()["layers"].get(str(layer), {})
+
+    def has(self, layer: int, name: str, kind: str = "chol") -> bool:
+        return self._file(layer, name, kind).exists()
+
+    def put(self, layer: int, name: str, kind: str, tensor: torch.Tensor):
+        """Write one matrix (atomically, so an interrupted run never leaves a truncated file)."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self._file(layer, name, kind)
+        tmp = path.with_suffix(".npy.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, tensor.detach().cpu().numpy())
+        os.replace(tmp, path)
+
+    def put_layer(self, layer: int, matrices: Dict[str, Dict[str, torch.Tensor]]):
+        """Write ``{name: {kind: tensor}}`` for one layer and record it in the manifest."""
+        for name, kinds in matrices.items():
+            for kind, tensor in kinds.items():
+                self.put(layer, name, kind, tensor)
+        manifest = self._manifest()
+        manifest["layers"][str(layer)] = {name: sorted(kinds) for name, kinds in matrices.items()}
+        self._write_manifest(manifest)
+
+    def finalize(self):
+        manifest = self._manifest()
+        manifest["complete"] = True
+        self._write_manifest(manifest)
+
+    def get(self, layer: int, name: str, kind: str = "chol", mmap: bool = True) -> torch.Tensor:
+        """
+        One matrix as a CPU tensor. With ``mmap`` the tensor is backed by the
+        file (copy-on-write, so in-place edits never reach the cache) and pages
+        are read on first access.
+        """
+        path = self._file(layer, name, kind)
+        if not path.exists():
+            raise KeyError(f"No cached {kind} for layer {layer} '{name}' in {self.path}")
+        return torch.from_numpy(np.load(path, mmap_mode="c" if mmap else None))
+
+    def layer(self, layer: int, kind: str = "chol", mmap: bool = True) -> Dict[str, torch.Tensor]:
+        return {
+            name: self.get(layer, name, kind, mmap=mmap)
+            for name, kinds in self.names(layer).items() if kind in kinds
+        }
+
+    def __getitem__(self, layer: int) -> Dict[str, torch.Tensor]:
+        return self.layer(layer)
+
+    def __len__(self) -> int:
+        return self.num_layers
+
+    @classmethod
+    def from_layer_dicts(
+        cls, profiling_mat: Dict[int, Dict[str, torch.Tensor]], root: Path, model_id: str,
+        dataset: str, nsamples: int, seqlen: int, kind: str = "chol",
+    ) -> "CalibStatsCache":
+        """Convert a legacy ``{layer: {name: tensor}}`` profiling dict (or list) into a cache."""
+        cache = cls(root, model_id, dataset, nsamples, seqlen)
+        items = profiling_mat.items() if isinstance(profiling_mat, dict) else enumerate(profiling_mat)
+        for i, layer_mats in items:
+            cache.put_layer(i, {name: {kind: t} for name, t in layer_mats.items()})
+        cache.finalize()
+        return cache
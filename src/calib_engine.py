@@ -0,0 +1,250 @@
+"""Layer-wise calibration engine for whitening statistics.
+
+SVD-LLM / PaLU whitening needs ``X^T X`` of every linear layer's input over
+the calibration set. The reference implementations keep two full activation
+buffers (``inps``/``outs``: 256 x 2048 x 4096 values each) and form
+``inp^T @ inp`` per sample before summing, which does not fit on a 64 GB host
+for 8B models. ``layerwise_grams`` instead:
+
+- runs each decoder layer over the calibration set in micro-batches,
+- accumulates ``X^T X`` in fp32/fp64 with chunked ``addmm_`` (no
+  ``[batch, hidden, hidden]`` intermediate),
+- keeps the inter-layer activations in RAM only while both buffers fit under
+  ``mem_cap_gb``; otherwise they are memory-mapped scratch files,
+- hands each finished layer's Gram matrices to ``on_layer`` (e.g. to
+  Cholesky-factor them into a ``CalibStatsCache``) and frees them,
+- reports the peak resident set size.
+"""
+import os
+import resource
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+# numpy has no bfloat16; memory-map it as same-width integers and view as the torch dtype
+_NUMPY_STORAGE = {
+    torch.float32: np.float32,
+    torch.float16: np.float16,
+    torch.bfloat16: np.int16,
+}
+
+
+def peak_rss_gb() -> float:
+    """Peak resident set size of this process (Linux reports ru_maxrss in KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 ** 2
+
+
+def find_linears(module: nn.Module, name: str = "") -> Dict[str, nn.Linear]:
+    return {
+        f"{name}.{n}" if name else n: m
+        for n, m in module.named_modules() if isinstance(m, nn.Linear)
+    }
+
+
+class ActivationBuffer:
+    """``[n, seqlen, hidden]`` activations, in RAM or backed by a scratch file."""
+
+    def __init__(self, shape, dtype: torch.dtype, spill: bool, scratch_dir: Optional[str] = None):
+        self.path = None
+        if not spill:
+            self.tensor = torch.empty(shape, dtype=dtype)
+            return
+        fd, self.path = tempfile.mkstemp(suffix=".act", dir=scratch_dir)
+        os.close(fd)
+        array = np.memmap(self.path, dtype=_NUMPY_STORAGE[dtype], mode="w+", shape=tuple(shape))
+        self.tensor = torch.from_numpy(array).view(dtype)
+
+    def close(self):
+        self.tensor = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _KwargsStore:
+    """
+    Per-sample layer kwargs (attention mask, position ids/embeddings) captured
+    at layer 0. Samples usually share identical values, which are stored once.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[Any]] = {}
+
+    @staticmethod
+    def _same(a, b) -> bool:
+        if isinstance(a, tuple):
+            return isinstance(b, tuple) and len(a) == len(b) and all(map(_KwargsStore._same, a, b))
+        return a.shape == b.shape and torch.equal(a, b)
+
+    def add(self, kwargs: Dict[str, Any], batch: int):
+        for k, v in kwargs.items():
+            if isinstance(v, tuple) and all(isinstance(t, torch.Tensor) for t in v):
+                v = tuple(t.cpu() for t in v)
+            elif isinstance(v, torch.Tensor):
+                v = v.cpu()
+            else:
+                continue
+            parts = _split(v) if batch > 1 and _leading(v) == batch else [v] * batch
+            seen = self.samples.setdefault(k, [])
+            for part in parts:
+                if seen and (part is seen[-1] or self._same(seen[-1], part)):
+                    part = seen[-1]
+                seen.append(part)
+
+    def batch(self, start: int, end: int, dev) -> Dict[str, Any]:
+        kwargs = {}
+        for k, seen in self.samples.items():
+            parts = seen[start:end]
+            kwargs[k] = _to(_cat(parts) if any(p is not parts[0] for p in parts) else _expand(parts[0], end - start), dev)
+        return kwargs
+
+
+def _leading(v) -> int:
+    return v[0].shape[0] if isinstance(v, tuple) else (v.shape[0] if v.dim() > 0 else 1)
+
+
+def _split(v):
+    if isinstance(v, tuple):
+        return [tuple(ts) for ts in zip(*(t.split(1) for t in v))]
+    return list(v.split(1))
+
+
+def _cat(parts):
+    if isinstance(parts[0], tuple):
+        return tuple(torch.cat(ts, dim=0) for ts in zip(*parts))
+    return torch.cat(parts, dim=0)
+
+
+def _expand(v, n: int):
+    if isinstance(v, tuple):
+        return tuple(_expand(t, n) for t in v)
+    if v.dim() == 0 or v.shape[0] != 1:
+        return v
+    return v.expand(n, *v.shape[1:])
+
+
+def _to(v, dev):
+    return tuple(t.to(dev) for t in v) if isinstance(v, tuple) else v.to(dev)
+
+
+class _Captured(Exception):
+    pass
+
+
+@torch.no_grad()
+def layerwise_grams(
+    model,
+    calib_loader,
+    dev,
+    on_layer: Callable[[int, nn.Module, Dict[str, torch.Tensor]], None],
+    micro_batch: int = 8,
+    accum_dtype: torch.dtype = torch.float64,
+    chunk_rows: int = 2048,
+    mem_cap_gb: Optional[float] = None,
+    scratch_dir: Optional[str] = None,
+    layer_filter: Optional[Callable[[str], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Accumulate ``X^T X`` for the inputs of every linear in ``model.model.layers``.
+
+    ``calib_loader`` is a re-iterable of batches (dicts with ``input_ids``).
+    For each decoder layer ``i``, ``on_layer(i, layer, {name: gram})`` is
+    called with the ``[in, in]`` Gram matrices (on ``dev``, ``accum_dtype``)
+    once all calibration samples have passed; ``layer_filter(name)`` restricts
+    which linears are accumulated. Activations are spilled to ``scratch_dir``
+    when the two inter-layer buffers would exceed ``mem_cap_gb``.
+    Returns ``{"samples", "spilled", "peak_rss_gb", "seconds"}``.
+    """
+    t0 = time.time()
+    layers = model.model.layers
+    use_cache = model.config.use_cache
+    model.config.use_cache = False
+
+    n = sum(batch["input_ids"].shape[0] for batch in calib_loader)
+    seqlen = next(iter(calib_loader))["input_ids"].shape[-1]
+    dtype = next(iter(model.parameters())).dtype
+    shape = (n, seqlen, model.config.hidden_size)
+    buffer_bytes = 2 * n * seqlen * model.config.hidden_size * torch.finfo(dtype).bits // 8
+    spill = mem_cap_gb is not None and buffer_bytes > mem_cap_gb * 1024 ** 3
+    inps = outs = None
+    try:
+        inps = ActivationBuffer(shape, dtype, spill, scratch_dir)
+        outs = ActivationBuffer(shape, dtype, spill, scratch_dir)
+
+        # Capture the inputs of layer 0
+        pre_layer = [model.model.embed_tokens] + ([model.model.rotary_emb] if hasattr(model.model, "rotary_emb") else [])
+        for m in pre_layer:
+            m.to(dev)
+        layer_kwargs = _KwargsStore()
+        cursor = {"i": 0}
+        first = layers[0]
+
+        class Catcher(nn.Module):
+            def __init__(self, module):
+                super().__init__()
+                self.module = module
+
+            def forward(self, inp, **kwargs):
+                b = inp.shape[0]
+                inps.tensor[cursor["i"]:cursor["i"] + b] = inp.cpu()
+                cursor["i"] += b
+                layer_kwargs.add(kwargs, b)
+                raise _Captured
+
+        layers[0] = Catcher(first.to(dev))
+        try:
+            for batch in calib_loader:
+                try:
+                    model(**{k: v.to(dev) for k, v in batch.items()})
+                except _Captured:
+                    pass
+        finally:
+            layers[0] = first
+        for m in pre_layer:
+            m.cpu()
+        torch.cuda.empty_cache()
+
+        for i in range(len(layers)):
+            layer = layers[i].to(dev)
+            subset = {
+                name: m for name, m in find_linears(layer).items()
+                if layer_filter is None or layer_filter(name)
+            }
+            grams = {
+                name: torch.zeros(m.in_features, m.in_features, dtype=accum_dtype, device=dev)
+                for name, m in subset.items()
+            }
+
+            def make_hook(gram):
+                def hook(module, input, output):
+                    x = input[0].detach().reshape(-1, input[0].shape[-1])
+                    for start in range(0, x.shape[0], chunk_rows):
+                        chunk = x[start:start + chunk_rows].to(accum_dtype)
+                        gram.addmm_(chunk.T, chunk)
+                return hook
+
+            handles = [m.register_forward_hook(make_hook(grams[name])) for name, m in subset.items()]
+            try:
+                for start in range(0, n, micro_batch):
+                    end = min(start + micro_batch, n)
+                    out = layer(inps.tensor[start:end].to(dev), **layer_kwargs.batch(start, end, dev))
+                    outs.tensor[start:end] = (out[0] if isinstance(out, tuple) else out).cpu()
+            finally:
+                for h in handles:
+                    h.remove()
+
+            on_layer(i, layer, grams)
+            del grams
+            layers[i] = layer.cpu()
+            inps, outs = outs, inps
+            torch.cuda.empty_cache()
+    finally:
+        for buf in (inps, outs):
+            if buf is not None:
+                buf.close()
+        model.config.use_cache = use_cache
+    return {"samples": n, "spilled": spill, "peak_rss_gb": peak_rss_gb(), "seconds": time.time() - t0}
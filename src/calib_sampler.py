@@ -0,0 +1,104 @@
+"""Deterministic, index-based calibration sampling over a tokenized corpus.
+
+The calibration loaders of PaLU / ASVD / SVD-LLM draw random character
+offsets, tokenize a slice per sample and ``torch.save`` the resulting list
+of dicts per (dataset, model, nsamples, seqlen, seed). Here samples are
+token windows of a ``TokenCorpus`` (see ``src.token_cache``):
+
+- the start of window ``i`` is output ``i`` of a SplitMix64 stream keyed by
+  the seed, so it does not depend on ``nsamples``: the 256-sample set is
+  the 128-sample set plus 128 more windows,
+- samples are one contiguous ``[n, seqlen]`` int64 tensor, gathered
+  straight from the memory-mapped ids (no tokenization, no per-model cache),
+- a local corpus file (text, JSON lines or pre-tokenized ``.npy``) works
+  without network access.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import torch
+
+from src.token_cache import CorpusSpec, TokenCache, TokenCorpus
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def window_starts(n_tokens: int, nsamples: int, seqlen: int, seed: int, offset: int = 0) -> np.ndarray:
+    """
+    Start offsets of windows ``offset .. offset + nsamples - 1`` in a corpus
+    of ``n_tokens`` tokens. Window ``i`` only depends on ``(seed, i)``.
+    """
+    span = n_tokens - seqlen + 1
+    if span < 1:
+        raise ValueError(f"Corpus of {n_tokens} tokens is shorter than seqlen={seqlen}")
+    with np.errstate(over="ignore"):
+        key = _splitmix64(np.uint64(seed) * _GOLDEN)
+        index = np.arange(offset + 1, offset + nsamples + 1, dtype=np.uint64)
+        draws = _splitmix64(key + index * _GOLDEN)
+    return (draws % np.uint64(span)).astype(np.int64)
+
+
+class CalibSampler:
+    """Seeded calibration windows of one tokenized corpus."""
+
+    def __init__(self, corpus: TokenCorpus, seed: int = 3):
+        self.corpus = corpus
+        self.seed = seed
+
+    @classmethod
+    def from_dataset(
+        cls, corpus: str, tokenizer, split: str = "train", seed: int = 3, cache: Optional[TokenCache] = None,
+    ) -> "CalibSampler":
+        """Sampler over a ``CORPORA`` entry (tokenized once, then read from the token cache)."""
+        cache = cache or TokenCache()
+        return cls(cache.get(corpus, split, tokenizer), seed)
+
+    @classmethod
+    def from_file(
+        cls, path: Union[str, Path], tokenizer=None, seed: int = 3, field: str = "text",
+        cache: Optional[TokenCache] = None,
+    ) -> "CalibSampler":
+        """
+        Sampler over a local corpus: a ``.npy`` of token ids is mapped as is;
+        text / JSON-lines files are tokenized with ``tokenizer`` into the token
+        cache on first use.
+        """
+        path = Path(path).resolve()
+        if path.suffix == ".npy":
+            return cls(TokenCorpus(path, {"corpus": path.stem, "split": "local"}), seed)
+        if tokenizer is None:
+            raise ValueError(f"A tokenizer is needed to tokenize {path}")
+        cache = cache or TokenCache()
+        name = path.name.split(".")[0]
+        # Size and mtime stand in for a revision, so an edited file is re-tokenized
+        stat = path.stat()
+        spec = CorpusSpec(str(path), field=field, revision=f"{stat.st_size}-{stat.st_mtime_ns}")
+        return cls(cache.get(name, "local", tokenizer, spec=spec), seed)
+
+    def starts(self, nsamples: int, seqlen: int, seed: Optional[int] = None) -> np.ndarray:
+        return window_starts(len(self.corpus), nsamples, seqlen, self.seed if seed is None else seed)
+
+    def sample(self, nsamples: int, seqlen: int, seed: Optional[int] = None) -> torch.Tensor:
+        """``[nsamples, seqlen]`` int64 token windows."""
+        return self.corpus.windows(self.starts(nsamples, seqlen, seed), seqlen).long()
+
+    __call__ = sample
+
+    def loader(self, nsamples: int, seqlen: int, batch_size: int = 1, seed: Optional[int] = None) -> List[Dict]:
+        """
+        The samples as the ``[{"input_ids", "attention_mask"}]`` batches the
+        calibration loops iterate; every batch is a view of one ``sample`` tensor.
+        """
+        ids = self.sample(nsamples, seqlen, seed)
+        mask = torch.ones(1, seqlen, dtype=ids.dtype)
+        return [
+            {"input_ids": ids[i:i + batch_size], "attention_mask": mask.expand(len(ids[i:i + batch_size]), -1)}
+            for i in range(0, nsamples, batch_size)
+        ]
@@ -14,6 +14,7 @@ class BenchmarkConfig:
     warmup_iterations: int = 10
     measurement_iterations: int = 100
     seed: int = 42
+    timer: str = "auto"  # Timer backend: auto, cuda_event, perf_counter, profiler
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization."""
@@ -26,6 +26,15 @@ def collect_environment() -> Dict[str, Any]:
         },
     }
     
+    # CPU information (relevant for CPU-timer runs: thread count, SIMD dispatch level)
+    cpu_info = {
+        "num_threads": torch.get_num_threads(),
+        "num_interop_threads": torch.get_num_interop_threads(),
+    }
+    if hasattr(torch.backends, "cpu") and hasattr(torch.backends.cpu, "get_cpu_capability"):
+        cpu_info["capability"] = torch.backends.cpu.get_cpu_capability()  # e.g. AVX2, AVX512
+    env["cpu"] = cpu_info
+    
     # PyTorch information
     if torch.cuda.is_available():
         env["pytorch"] = {
@@ -8,9 +8,17 @@ import torch
 import numpy as np
 
 from .config import BenchmarkConfig
-from .measurement import benchmark_kernel, benchmark_gemm, compute_gemm_tflops, compute_gemm_bandwidth
-from .utils import set_deterministic, get_dtype, allocate_tensors, compute_statistics
+from .measurement import (
+    benchmark_kernel,
+    benchmark_kernel_adaptive,
+    benchmark_gemm,
+    compute_gemm_tflops,
+    compute_gemm_bandwidth,
+)
+from .utils import set_deterministic, get_dtype, allocate_tensors, compute_statistics, median_confidence_interval
 from .environment import collect_environment
+from .timers import resolve_timer
+from .journal import WorkJournal
 
 
 def load_experiment_spec(spec_path: Path, exp_name: str) -> Dict[str, Any]:
@@ -29,29 +37,65 @@ def run_multiple_trials(
     warmup: int,
     measure: int,
     trials: int,
-    device: str = "cuda:0"
+    device: str = "cuda:0",
+    timer: str = "auto",
+    adaptive: Optional[Any] = None,
 ) -> Dict[str, Any]:
-    """Run multiple trials and aggregate results."""
+    """Run multiple trials and aggregate results.
+
+    ``timer`` selects the timing backend (see ``src.timers``); the resolved
+    backend name is recorded in the result so CPU and GPU runs stay distinguishable.
+
+    If ``adaptive`` is set (``True`` or a dict of overrides for
+    ``DEFAULT_ADAPTIVE_CONFIG``), a single adaptive run replaces the fixed
+    trials: ``warmup`` and ``measure * trials`` become upper bounds and sampling
+    stops once the median's confidence interval converges.
+    """
+    if adaptive:
+        stats = benchmark_kernel_adaptive(
+            kernel_fn,
+            max_warmup_iterations=warmup,
+            max_measurement_iterations=measure * trials,
+            device=device,
+            timer=timer,
+            adaptive=adaptive if isinstance(adaptive, dict) else None,
+        )
+        all_times_ms = stats["times_ms"]
+        return {
+            "timer": resolve_timer(timer, device),
+            "trials": 1,
+            "total_measurements": len(all_times_ms),
+            "timing": compute_statistics(all_times_ms),
+            "timing_ci": stats["ci"],
+            "adaptive": stats["adaptive"],
+            "timing_raw": all_times_ms,
+        }
+
     all_times_ms = []
     
     for trial in range(trials):
-        stats = benchmark_kernel(kernel_fn, warmup, measure, device)
+        stats = benchmark_kernel(kernel_fn, warmup, measure, device, timer=timer)
         all_times_ms.extend(stats["times_ms"])
     
     # Aggregate statistics across all trials
     agg_stats = compute_statistics(all_times_ms)
     
     return {
+        "timer": resolve_timer(timer, device),
         "trials": trials,
         "total_measurements": len(all_times_ms),
         "timing": agg_stats,
+        "timing_ci": median_confidence_interval(all_times_ms),
         "timing_raw": all_times_ms,
     }
 
 
-def run_s1_sdpa_dense_sweep(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_s1_sdpa_dense_sweep(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """S1: SDPA dense sweep across head_dim range."""
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtype_str = exp_spec["dtype"]
     dtype = get_dtype(dtype_str)
     shapes = exp_spec["shapes"]
@@ -61,6 +105,8 @@ def run_s1_sdpa_dense_sweep(exp_spec: Dict, device: str = "cuda:0", seed: int =
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
     
     # Generate head_dim list
     # step1 applies up to the boundary (default 128), step2 applies above
@@ -81,6 +127,13 @@ def run_s1_sdpa_dense_sweep(exp_spec: Dict, device: str = "cuda:0", seed: int =
         n_heads = shape["n_heads"]
         
         for head_dim in head_dims:
+            point = {
+                "shape": {"batch": batch, "seq_len": seq_len, "n_heads": n_heads, "head_dim": head_dim},
+                "dtype": dtype_str,
+            }
+            if not work.claim(point, results["measurements"]):
+                continue
+            
             torch.manual_seed(seed)
             query = torch.randn(batch, n_heads, seq_len, head_dim, dtype=dtype, device=device)
             key = torch.randn(batch, n_heads, seq_len, head_dim, dtype=dtype, device=device)
@@ -92,19 +145,19 @@ def run_s1_sdpa_dense_sweep(exp_spec: Dict, device: str = "cuda:0", seed: int =
                 )
             
             try:
-                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                 
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "shape": {"batch": batch, "seq_len": seq_len, "n_heads": n_heads, "head_dim": head_dim},
                     "dtype": dtype_str,
                     **trial_results,
-                })
+                }))
             except Exception as e:
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "shape": {"batch": batch, "seq_len": seq_len, "n_heads": n_heads, "head_dim": head_dim},
                     "dtype": dtype_str,
                     "error": str(e),
-                })
+                }))
             
             del query, key, value
             torch.cuda.empty_cache()
@@ -112,9 +165,12 @@ def run_s1_sdpa_dense_sweep(exp_spec: Dict, device: str = "cuda:0", seed: int =
     return results
 
 
-def run_s2_sdpa_backend_forced(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_s2_sdpa_backend_forced(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """S2: SDPA with forced backends."""
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtype_str = exp_spec["dtype"]
     dtype = get_dtype(dtype_str)
     shape = exp_spec["shape"]
@@ -126,6 +182,8 @@ def run_s2_sdpa_backend_forced(exp_spec: Dict, device: str = "cuda:0", seed: int
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
     
     results = {
         "experiment": "S2_sdpa_backend_forced",
@@ -140,6 +198,10 @@ def run_s2_sdpa_backend_forced(exp_spec: Dict, device: str = "cuda:0", seed: int
         value = torch.randn(batch, n_heads, seq_len, head_dim, dtype=dtype, device=device)
         
         for backend in backends:
+            point = {"shape": shape, "head_dim": head_dim, "backend": backend, "dtype": dtype_str}
+            if not work.claim(point, results["measurements"]):
+                continue
+            
             def make_kernel_fn(b):
                 def kernel_fn():
                     if b == "AUTO":
@@ -166,22 +228,22 @@ def run_s2_sdpa_backend_forced(exp_spec: Dict, device: str = "cuda:0", seed: int
             kernel_fn = make_kernel_fn(backend)
             
             try:
-                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                 
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "head_dim": head_dim,
                     "backend": backend,
                     "dtype": dtype_str,
                     **trial_results,
-                })
+                }))
             except Exception as e:
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "head_dim": head_dim,
                     "backend": backend,
                     "dtype": dtype_str,
                     "error": str(e),
                     "backend_unsupported": True,
-                })
+                }))
         
         del query, key, value
         torch.cuda.empty_cache()
@@ -189,9 +251,12 @@ def run_s2_sdpa_backend_forced(exp_spec: Dict, device: str = "cuda:0", seed: int
     return results
 
 
-def run_g3_gemm_k_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_g3_gemm_k_dense(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """G3: GEMM with K dimension sweep."""
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtypes = exp_spec["dtypes"]
     shape = exp_spec["shape"]
     M = shape["M"]
@@ -202,6 +267,8 @@ def run_g3_gemm_k_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
     
     # Generate K list
     K_values = list(range(K_min, 129, step1))  # 64..128 step 1
@@ -217,13 +284,17 @@ def run_g3_gemm_k_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
         dtype = get_dtype(dtype_str)
         
         for K in K_values:
+            point = {"shape": {"M": M, "N": N, "K": K}, "dtype": dtype_str}
+            if not work.claim(point, results["measurements"]):
+                continue
+            
             a, b = allocate_tensors((M, K), (K, N), dtype=dtype, device=device, seed=seed)
             
             def kernel_fn():
                 torch.matmul(a, b)
             
             try:
-                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                 
                 # Compute TFLOPs for mean
                 mean_time_s = trial_results["timing"]["mean"] / 1000.0
@@ -233,7 +304,7 @@ def run_g3_gemm_k_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
                 # Compute TFLOPs for all measurements
                 tflops_list = [compute_gemm_tflops(M, N, K, t / 1000.0) for t in trial_results["timing_raw"]]
                 
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "shape": {"M": M, "N": N, "K": K},
                     "dtype": dtype_str,
                     **trial_results,
@@ -242,13 +313,13 @@ def run_g3_gemm_k_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
                         "tflops_stats": compute_statistics(tflops_list),
                         "bandwidth_gbs_mean": bandwidth,
                     },
-                })
+                }))
             except Exception as e:
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "shape": {"M": M, "N": N, "K": K},
                     "dtype": dtype_str,
                     "error": str(e),
-                })
+                }))
             
             del a, b
             torch.cuda.empty_cache()
@@ -256,9 +327,12 @@ def run_g3_gemm_k_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
     return results
 
 
-def run_g4_gemm_n_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_g4_gemm_n_dense(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """G4: GEMM with N dimension sweep (projection-like)."""
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtypes = exp_spec["dtypes"]
     M_values = exp_spec["M_values"]
     K = exp_spec["K"]
@@ -268,6 +342,8 @@ def run_g4_gemm_n_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
     
     # Generate N list
     N_values = list(range(N_min, 129, step1))  # 64..128 step 1
@@ -284,13 +360,17 @@ def run_g4_gemm_n_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
         
         for M in M_values:
             for N in N_values:
+                point = {"shape": {"M": M, "K": K, "N": N}, "dtype": dtype_str}
+                if not work.claim(point, results["measurements"]):
+                    continue
+                
                 a, b = allocate_tensors((M, K), (K, N), dtype=dtype, device=device, seed=seed)
                 
                 def kernel_fn():
                     torch.matmul(a, b)
                 
                 try:
-                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                     
                     mean_time_s = trial_results["timing"]["mean"] / 1000.0
                     tflops = compute_gemm_tflops(M, N, K, mean_time_s)
@@ -298,7 +378,7 @@ def run_g4_gemm_n_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
                     
                     tflops_list = [compute_gemm_tflops(M, N, K, t / 1000.0) for t in trial_results["timing_raw"]]
                     
-                    results["measurements"].append({
+                    results["measurements"].append(work.complete(point, {
                         "shape": {"M": M, "K": K, "N": N},
                         "dtype": dtype_str,
                         **trial_results,
@@ -307,13 +387,13 @@ def run_g4_gemm_n_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
                             "tflops_stats": compute_statistics(tflops_list),
                             "bandwidth_gbs_mean": bandwidth,
                         },
-                    })
+                    }))
                 except Exception as e:
-                    results["measurements"].append({
+                    results["measurements"].append(work.complete(point, {
                         "shape": {"M": M, "K": K, "N": N},
                         "dtype": dtype_str,
                         "error": str(e),
-                    })
+                    }))
                 
                 del a, b
                 torch.cuda.empty_cache()
@@ -321,9 +401,12 @@ def run_g4_gemm_n_dense(exp_spec: Dict, device: str = "cuda:0", seed: int = 42)
     return results
 
 
-def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_p1_padding_rescue(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """P1: Padding rescue comparison."""
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtype_str = exp_spec["dtype"]
     dtype = get_dtype(dtype_str)
     logical_dim = exp_spec["logical_head_dim"]
@@ -333,6 +416,8 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
     
     results = {
         "experiment": "P1_padding_rescue",
@@ -347,6 +432,15 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
     
     for physical_dim in pad_options:
         logical_dim_actual = min(logical_dim, physical_dim)
+        point = {
+            "operation": "SDPA",
+            "shape": sdpa_shape,
+            "logical_dim": logical_dim,
+            "physical_dim": physical_dim,
+            "dtype": dtype_str,
+        }
+        if not work.claim(point, results["measurements"]):
+            continue
         
         torch.manual_seed(seed)
         query = torch.randn(batch, n_heads, seq_len, physical_dim, dtype=dtype, device=device)
@@ -366,25 +460,25 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
             return out[:, :, :, :logical_dim_actual] if physical_dim > logical_dim_actual else out
         
         try:
-            trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+            trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
             
             memory_overhead = ((physical_dim - logical_dim) / logical_dim * 100) if physical_dim > logical_dim else 0
             
-            results["measurements"].append({
+            results["measurements"].append(work.complete(point, {
                 "operation": "SDPA",
                 "logical_dim": logical_dim_actual,
                 "physical_dim": physical_dim,
                 "memory_overhead_pct": memory_overhead,
                 "dtype": dtype_str,
                 **trial_results,
-            })
+            }))
         except Exception as e:
-            results["measurements"].append({
+            results["measurements"].append(work.complete(point, {
                 "operation": "SDPA",
                 "logical_dim": logical_dim_actual,
                 "physical_dim": physical_dim,
                 "error": str(e),
-            })
+            }))
         
         del query, key, value
         torch.cuda.empty_cache()
@@ -399,6 +493,15 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
             for physical_dim in pad_options:
                 logical_dim_actual = min(logical_dim, physical_dim)
                 dim_to_pad = K if K == logical_dim else N
+                point = {
+                    "operation": "GEMM",
+                    "shape": gemm_shape,
+                    "logical_dim": logical_dim,
+                    "physical_dim": physical_dim,
+                    "dtype": dtype_str,
+                }
+                if not work.claim(point, results["measurements"]):
+                    continue
                 
                 if dim_to_pad == K:
                     a, b = allocate_tensors((M, physical_dim), (physical_dim, N), dtype=dtype, device=device, seed=seed)
@@ -417,10 +520,10 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
                     return out
                 
                 try:
-                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                     memory_overhead = ((physical_dim - logical_dim) / logical_dim * 100) if physical_dim > logical_dim else 0
                     
-                    results["measurements"].append({
+                    results["measurements"].append(work.complete(point, {
                         "operation": "GEMM",
                         "shape_type": "reduction" if K == logical_dim else "projection",
                         "logical_dim": logical_dim_actual,
@@ -429,15 +532,15 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
                         "memory_overhead_pct": memory_overhead,
                         "dtype": dtype_str,
                         **trial_results,
-                    })
+                    }))
                 except Exception as e:
-                    results["measurements"].append({
+                    results["measurements"].append(work.complete(point, {
                         "operation": "GEMM",
                         "shape_type": "reduction" if K == logical_dim else "projection",
                         "logical_dim": logical_dim_actual,
                         "physical_dim": physical_dim,
                         "error": str(e),
-                    })
+                    }))
                 
                 del a, b
                 torch.cuda.empty_cache()
@@ -445,7 +548,9 @@ def run_p1_padding_rescue(exp_spec: Dict, device: str = "cuda:0", seed: int = 42
     return results
 
 
-def run_c21_backend_selection(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_c21_backend_selection(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """C2.1: Verify PyTorch SDPA backend selection boundaries.
 
     This experiment verifies:
@@ -455,6 +560,7 @@ def run_c21_backend_selection(exp_spec: Dict, device: str = "cuda:0", seed: int
     4. Focus on PaLU-typical dimensions (114-125 range)
     """
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtype_str = exp_spec["dtype"]
     dtype = get_dtype(dtype_str)
     shapes = exp_spec["shapes"]
@@ -463,6 +569,8 @@ def run_c21_backend_selection(exp_spec: Dict, device: str = "cuda:0", seed: int
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
 
     results = {
         "experiment": "C21_backend_selection",
@@ -477,6 +585,14 @@ def run_c21_backend_selection(exp_spec: Dict, device: str = "cuda:0", seed: int
         n_heads = shape["n_heads"]
 
         for head_dim in head_dims:
+            point = {
+                "shape": {"batch": batch, "seq_len": seq_len, "n_heads": n_heads, "head_dim": head_dim},
+                "dtype": dtype_str,
+                "backends": backends,
+            }
+            if not work.claim(point, results["measurements"]):
+                continue
+
             torch.manual_seed(seed)
             query = torch.randn(batch, n_heads, seq_len, head_dim, dtype=dtype, device=device)
             key = torch.randn(batch, n_heads, seq_len, head_dim, dtype=dtype, device=device)
@@ -512,7 +628,7 @@ def run_c21_backend_selection(exp_spec: Dict, device: str = "cuda:0", seed: int
                 kernel_fn = make_kernel_fn(backend)
 
                 try:
-                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                     backend_results[backend] = {
                         "available": True,
                         "timing": trial_results["timing"],
@@ -552,27 +668,32 @@ def run_c21_backend_selection(exp_spec: Dict, device: str = "cuda:0", seed: int
                 "detected_backend": detected_backend,
                 "backend_results": backend_results,
             }
-            results["measurements"].append(measurement)
-
-            # Update summary
-            key_str = f"{batch}x{seq_len}x{n_heads}x{head_dim}"
-            results["backend_summary"][key_str] = {
-                "head_dim": head_dim,
-                "detected_backend": detected_backend,
-                "is_8_aligned": is_8_aligned,
-                "flash_available": backend_results.get("FLASH", {}).get("available", False),
-                "mem_efficient_available": backend_results.get("MEM_EFFICIENT", {}).get("available", False),
-            }
+            results["measurements"].append(work.complete(point, measurement))
 
             del query, key, value
             torch.cuda.empty_cache()
 
+    # Build summary from all measurements (including points resumed from the journal)
+    for m in results["measurements"]:
+        m_shape = m["shape"]
+        key_str = f"{m_shape['batch']}x{m_shape['seq_len']}x{m_shape['n_heads']}x{m_shape['head_dim']}"
+        results["backend_summary"][key_str] = {
+            "head_dim": m_shape["head_dim"],
+            "detected_backend": m["detected_backend"],
+            "is_8_aligned": m["alignment"]["mod_8"],
+            "flash_available": m["backend_results"].get("FLASH", {}).get("available", False),
+            "mem_efficient_available": m["backend_results"].get("MEM_EFFICIENT", {}).get("available", False),
+        }
+
     return results
 
 
-def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int = 42) -> Dict:
+def run_het1_hetero_batching(
+    exp_spec: Dict, device: str = "cuda:0", seed: int = 42, work: Optional[WorkJournal] = None
+) -> Dict:
     """HET1: Heterogeneous head batching penalty."""
     set_deterministic(seed)
+    work = work or WorkJournal()
     dtype_str = exp_spec["dtype"]
     dtype = get_dtype(dtype_str)
     total_N = exp_spec["total_N"]
@@ -581,6 +702,8 @@ def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int =
     warmup = exp_spec.get("warmup", 50)
     measure = exp_spec.get("measure", 200)
     trials = exp_spec.get("trials", 3)
+    timer = exp_spec.get("timer", "auto")
+    adaptive = exp_spec.get("adaptive")
     
     results = {
         "experiment": "HET1_head_hetero_batching_penalty",
@@ -593,6 +716,9 @@ def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int =
     
     for pattern_name, pattern in patterns.items():
         groups = pattern["groups"]
+        point = {"pattern": pattern_name, "groups": groups, "total_N": total_N, "dtype": dtype_str}
+        if not work.claim(point, results["measurements"]):
+            continue
         
         # Uniform: single GEMM
         if pattern_name == "uniform":
@@ -603,23 +729,23 @@ def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int =
                 return torch.matmul(a, b)
             
             try:
-                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                 mean_time_s = trial_results["timing"]["mean"] / 1000.0
                 tflops = compute_gemm_tflops(M, N, K, mean_time_s)
                 
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "pattern": pattern_name,
                     "num_gemm_calls": 1,
                     "shape": {"M": M, "K": K, "N": N},
                     "dtype": dtype_str,
                     **trial_results,
                     "derived": {"tflops_mean": tflops},
-                })
+                }))
             except Exception as e:
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "pattern": pattern_name,
                     "error": str(e),
-                })
+                }))
             
             del a, b
             torch.cuda.empty_cache()
@@ -641,7 +767,7 @@ def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int =
                     return torch.matmul(a, b)
                 
                 try:
-                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device)
+                    trial_results = run_multiple_trials(kernel_fn, warmup, measure, trials, device, timer, adaptive)
                     mean_time_s = trial_results["timing"]["mean"] / 1000.0
                     tflops = compute_gemm_tflops(M, N_group, K, mean_time_s)
                     
@@ -649,11 +775,11 @@ def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int =
                     num_calls += 1
                     total_flops += 2 * M * N_group * K
                 except Exception as e:
-                    results["measurements"].append({
+                    results["measurements"].append(work.complete(point, {
                         "pattern": pattern_name,
                         "group": {"dim": dim, "count": count},
                         "error": str(e),
-                    })
+                    }))
                 
                 del a, b
                 torch.cuda.empty_cache()
@@ -661,13 +787,13 @@ def run_het1_hetero_batching(exp_spec: Dict, device: str = "cuda:0", seed: int =
             if num_calls > 0:
                 effective_tflops = total_flops / (total_latency / 1000.0) / 1e12
                 
-                results["measurements"].append({
+                results["measurements"].append(work.complete(point, {
                     "pattern": pattern_name,
                     "num_gemm_calls": num_calls,
                     "total_latency_ms": total_latency,
                     "dtype": dtype_str,
                     "derived": {"effective_tflops": effective_tflops},
-                })
+                }))
     
     return results
 
@@ -686,13 +812,18 @@ EXPERIMENT_RUNNERS = {
 def run_experiment(
     exp_spec: Dict,
     device: str = "cuda:0",
-    seed: int = 42
+    seed: int = 42,
+    work: Optional[WorkJournal] = None,
 ) -> Dict:
-    """Run an experiment based on its specification."""
+    """Run an experiment based on its specification.
+
+    Pass a ``WorkJournal`` to make the run resumable and/or sharded; without
+    one every point is measured and nothing is journaled.
+    """
     exp_type = exp_spec["type"]
     
     if exp_type not in EXPERIMENT_RUNNERS:
         raise ValueError(f"Unknown experiment type: {exp_type}")
     
     runner = EXPERIMENT_RUNNERS[exp_type]
-    return runner(exp_spec, device=device, seed=seed)
+    return runner(exp_spec, device=device, seed=seed, work=work)
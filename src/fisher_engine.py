@@ -0,0 +1,168 @@
+"""Memory-bounded Fisher information of linear weights.
+
+PaLU's ``calib_fisher_info`` lets autograd keep a gradient for every
+parameter of the model, adds an fp32 copy of each attention weight's squared
+gradient to a tensor of the same size and saves those elementwise tensors
+with ``torch.save``, although rank search only reads one mean per low-rank
+group. ``fisher_information`` instead:
+
+- only lets the scored weights require grad,
+- squares each weight's gradient in a post-accumulate hook, reduces it to
+  per-row / per-column sums in row chunks and frees ``.grad`` on the spot,
+- keeps the elementwise ``[out, in]`` tensor only for the names in ``full``,
+- can run with gradient checkpointing, and can split every calibration batch
+  into micro-batches whose gradients are accumulated before squaring, so a
+  batch's contribution does not depend on ``micro_batch_size``.
+
+Per-row sums cover any contiguous grouping of output channels (heads, PaLU
+low-rank groups) as well as the whole-weight total, and take a few kilobytes
+per model to cache.
+"""
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+import torch
+import torch.nn as nn
+
+
+REDUCTIONS = ("rows", "cols", "abs_rows")
+
+# Squared-gradient temporaries are formed at most this many elements at a time
+CHUNK_ELEMS = 1 << 24
+
+
+def _reduce_into(stats: Dict[str, torch.Tensor], grad: torch.Tensor, chunk_rows: int):
+    for start in range(0, grad.shape[0], chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        sq = grad[rows].float().square()
+        if "rows" in stats:
+            stats["rows"][rows] += sq.sum(dim=1)
+        if "cols" in stats:
+            stats["cols"] += sq.sum(dim=0)
+        if "full" in stats:
+            stats["full"][rows] += sq
+        if "abs_rows" in stats:
+            stats["abs_rows"][rows] += grad[rows].float().abs().sum(dim=1)
+
+
+@contextmanager
+def _grad_only_for(model: nn.Module, params: Iterable[nn.Parameter]):
+    saved = [(p, p.requires_grad) for p in model.parameters()]
+    keep = {id(p) for p in params}
+    try:
+        for p, _ in saved:
+            p.requires_grad_(id(p) in keep)
+        yield
+    finally:
+        for p, flag in saved:
+            p.requires_grad_(flag)
+
+
+@contextmanager
+def _checkpointing(model: nn.Module, enabled: bool):
+    """Hugging Face gradient checkpointing (non-reentrant), which is only active in training mode."""
+    if not enabled:
+        yield
+        return
+    if not hasattr(model, "gradient_checkpointing_enable"):
+        raise ValueError(f"{type(model).__name__} does not support gradient checkpointing")
+    was_enabled = getattr(model, "is_gradient_checkpointing", False)
+    was_training = model.training
+    try:
+        model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
+    except TypeError:
+        model.gradient_checkpointing_enable()
+    model.train()
+    try:
+        yield
+    finally:
+        model.train(was_training)
+        if not was_enabled:
+            model.gradient_checkpointing_disable()
+
+
+def fisher_information(
+    model: nn.Module,
+    calib_loader,
+    device,
+    module_filter: Optional[Callable[[str], bool]] = None,
+    reductions: Sequence[str] = ("rows",),
+    full: Sequence[str] = (),
+    micro_batch_size: Optional[int] = None,
+    gradient_checkpointing: bool = False,
+) -> Dict[str, Dict[str, torch.Tensor]]:
+    """
+    Empirical Fisher information (mean squared gradient of the LM loss per
+    calibration batch) of every ``nn.Linear`` whose name passes
+    ``module_filter``.
+
+    The loss of a batch is the model's own ``labels`` loss of
+    ``input_ids[:, :-1]`` against ``input_ids[:, 1:]``, as in PaLU. With
+    ``micro_batch_size`` a batch is run in slices whose losses are weighted
+    by their share of the batch.
+
+    Returns ``{name: {"rows": [out], "cols": [in], "full": [out, in]}}`` with
+    the requested ``reductions`` (sums of the mean squared gradient over the
+    reduced axis) and ``full`` only for names listed in ``full``; fp32, CPU.
+    ``"abs_rows"`` adds per-row sums of the mean absolute gradient (gradient
+    L1 scores) from the same backward passes.
+    """
+    unknown = set(reductions) - set(REDUCTIONS)
+    if unknown:
+        raise ValueError(f"Unknown reductions {sorted(unknown)}, expected a subset of {REDUCTIONS}")
+    targets = {
+        name: m for name, m in model.named_modules()
+        if isinstance(m, nn.Linear) and (module_filter is None or module_filter(name))
+    }
+    if not targets:
+        raise ValueError("No nn.Linear module matches module_filter")
+
+    stats: Dict[str, Dict[str, torch.Tensor]] = {}
+    state = {"reduce": False}
+    handles = []
+
+    def make_hook(name: str, chunk_rows: int):
+        def hook(param):
+            if state["reduce"]:
+                _reduce_into(stats[name], param.grad, chunk_rows)
+                param.grad = None
+        return hook
+
+    for name, m in targets.items():
+        out_features, in_features = m.weight.shape
+        kw = {"dtype": torch.float32, "device": m.weight.device}
+        stats[name] = {}
+        if "rows" in reductions:
+            stats[name]["rows"] = torch.zeros(out_features, **kw)
+        if "cols" in reductions:
+            stats[name]["cols"] = torch.zeros(in_features, **kw)
+        if "abs_rows" in reductions:
+            stats[name]["abs_rows"] = torch.zeros(out_features, **kw)
+        if name in full:
+            stats[name]["full"] = torch.zeros(out_features, in_features, **kw)
+        chunk_rows = max(1, CHUNK_ELEMS // in_features)
+        handles.append(m.weight.register_post_accumulate_grad_hook(make_hook(name, chunk_rows)))
+
+    n_batches = 0
+    try:
+        with _grad_only_for(model, [m.weight for m in targets.values()]), _checkpointing(model, gradient_checkpointing):
+            for batch in calib_loader:
+                ids = batch["input_ids"] if isinstance(batch, dict) else batch
+                parts = ids.split(micro_batch_size or len(ids))
+                for i, part in enumerate(parts):
+                    # Gradients of all but the last slice accumulate in .grad; the last one squares them
+                    state["reduce"] = i == len(parts) - 1
+                    part = part.to(device)
+                    loss = model(input_ids=part[:, :-1], labels=part[:, 1:])[0]
+                    (loss * (len(part) / len(ids))).backward()
+                n_batches += 1
+    finally:
+        for h in handles:
+            h.remove()
+        for m in targets.values():
+            m.weight.grad = None
+
+    return {
+        name: {kind: (t / max(n_batches, 1)).cpu() for kind, t in s.items()}
+        for name, s in stats.items()
+    }
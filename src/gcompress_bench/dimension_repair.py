@@ -9,9 +9,15 @@ Implements shape alignment constraints and repair strategies based on C2/C3 find
 Reference: results/C23/20260124_220005_C23_hardware_layer/
 """
 
+import copy
+import functools
+import json
+import weakref
 from dataclasses import dataclass, field
 from enum import Enum
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
 import torch
 import torch.nn as nn
 
@@ -23,6 +29,7 @@ class AlignmentStrategy(Enum):
     OPTIMAL = "optimal"          # Pad to next 16-aligned or predefined fast path
     PREDEFINED = "predefined"    # Pad to nearest {64, 96, 112, 128, ...}
     TRADEOFF = "tradeoff"        # Choose based on overhead threshold
+    COST_MODEL = "cost_model"    # Minimize predicted latency x memory (see CostTable)
 
 
 @dataclass
@@ -74,20 +81,162 @@ class ShapeContract:
         return 100.0 * (padded - original) / original
 
 
+# Operators a repaired dimension feeds, and their default weights
+DEFAULT_OPERATORS = {"sdpa": 1.0, "gemm_k": 1.0, "gemm_n": 1.0}
+
+
+def _step_curve(steps: List[Tuple[int, float]], period: int = 16) -> List[float]:
+    """Residue curve (index ``d % period``) from ``(alignment, slowdown)`` steps; the first unmet step applies."""
+    curve = []
+    for r in range(period):
+        curve.append(next((slowdown for align, slowdown in steps if r % align != 0), 1.0))
+    return curve
+
+
+@dataclass
+class CostTable:
+    """
+    Per-device latency model of the operators a padded dimension feeds:
+    ``sdpa`` (head_dim), ``gemm_k`` (reduction dim, e.g. U[i] at rank r) and
+    ``gemm_n`` (output dim, e.g. VT rows of a group). Work grows linearly with
+    the dimension, so ``latency(op, d) = d * curves[op][d % len(curve)]``.
+
+    The default curves encode the C23 findings above (H1/H3/H4); a measured
+    table comes from ``from_device_profile`` or a JSON file (``save``/``load``).
+    """
+    curves: Dict[str, List[float]] = field(default_factory=lambda: {
+        "sdpa": _step_curve([(8, 1 / 0.6)]),              # H3: 40% efficiency loss
+        "gemm_k": _step_curve([(8, 2.0), (16, 1.58)]),    # H4: 50% throughput loss; H1: 58% slowdown
+        "gemm_n": _step_curve([(8, 2.0), (16, 1.15)]),    # unvectorized stores; 8 -> 16: +15%
+    })
+    device: str = "default"
+
+    def latency(self, op: str, dims) -> np.ndarray:
+        dims = np.asarray(dims, dtype=np.int64)
+        curve = np.asarray(self.curves.get(op, [1.0]), dtype=np.float64)
+        return dims * curve[dims % len(curve)]
+
+    def mix_latency(self, dims, operators: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Predicted latency of ``dims`` under a weighted operator mix."""
+        operators = DEFAULT_OPERATORS if operators is None else operators
+        return sum(w * self.latency(op, dims) for op, w in operators.items())
+
+    @classmethod
+    def from_device_profile(cls, profile) -> "CostTable":
+        """
+        Curves fitted on a device, from a ``src.roofline.DeviceProfile``
+        (anything with ``name`` and ``penalties``); ops the profile has no
+        curve for keep the defaults.
+        """
+        table = cls(device=profile.name)
+        for op, key in (("sdpa", "sdpa.head_dim"), ("gemm_k", "gemm.K"), ("gemm_n", "gemm.N")):
+            if key in profile.penalties:
+                table.curves[op] = list(profile.penalties[key])
+        return table
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"device": self.device, "curves": self.curves}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "CostTable":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(curves=data["curves"], device=data.get("device", "default"))
+
+
+def _cost_candidates(dims: np.ndarray, contract: ShapeContract) -> np.ndarray:
+    """``[n, 5]`` padding candidates per dim: itself, next multiple of 8/16/32, next recommended value."""
+    recommended = np.asarray(contract.recommended_values, dtype=np.int64)
+    fits = recommended[None, :] >= dims[:, None]
+    predefined = recommended[fits.argmax(axis=-1)] if len(recommended) else dims
+    predefined = np.where(fits.any(axis=-1), predefined, dims) if len(recommended) else dims
+    return np.stack([dims, -(-dims // 8) * 8, -(-dims // 16) * 16, -(-dims // 32) * 32, predefined], axis=-1)
+
+
+def repair_dimensions(
+    dims,
+    strategy: Union[str, AlignmentStrategy] = AlignmentStrategy.MINIMAL,
+    max_overhead_pct: float = 20.0,
+    contract: Optional[ShapeContract] = None,
+    cost_table: Optional[CostTable] = None,
+    operators: Optional[Dict[str, float]] = None,
+) -> np.ndarray:
+    """
+    Vectorized ``repair_dimension`` over an array of dimensions.
+
+    Returns an int64 array of repaired dimensions, element-wise identical to
+    calling ``repair_dimension`` on each entry. ``cost_table`` and
+    ``operators`` only affect ``AlignmentStrategy.COST_MODEL``.
+    """
+    if contract is None:
+        contract = ShapeContract()
+
+    if isinstance(strategy, str):
+        strategy = AlignmentStrategy(strategy)
+
+    dims = np.asarray(dims, dtype=np.int64)
+    if strategy == AlignmentStrategy.COST_MODEL:
+        # Cheapest latency x memory among the candidates within the overhead threshold
+        cost_table = cost_table or CostTable()
+        candidates = _cost_candidates(dims.reshape(-1), contract)
+        base = np.maximum(candidates[:, :1], 1)
+        score = cost_table.mix_latency(candidates, operators) * candidates
+        score[100.0 * (candidates - candidates[:, :1]) / base > max_overhead_pct] = np.inf
+        return np.take_along_axis(candidates, score.argmin(axis=-1)[:, None], axis=-1).reshape(dims.shape)
+
+    recommended = np.asarray(contract.recommended_values, dtype=np.int64)
+    up8 = ((dims + 7) // 8) * 8
+    up16 = ((dims + 15) // 16) * 16
+
+    # First recommended value >= dim, in contract order (-1 if there is none)
+    fits = recommended[None, :] >= dims[..., None]
+    has_predefined = fits.any(axis=-1)
+    predefined = np.where(has_predefined, recommended[fits.argmax(axis=-1)], -1) if len(recommended) else np.full_like(dims, -1)
+
+    if strategy == AlignmentStrategy.MINIMAL:
+        repaired = up8
+    elif strategy == AlignmentStrategy.OPTIMAL:
+        repaired = up16
+    elif strategy == AlignmentStrategy.PREDEFINED:
+        repaired = np.where(predefined >= 0, predefined, up16)
+    elif strategy == AlignmentStrategy.TRADEOFF:
+        # Smallest candidate within the overhead threshold, else 8-aligned
+        candidates = np.stack([up8, up16, np.where(predefined >= 0, predefined, up8)], axis=-1)
+        candidates = np.sort(candidates, axis=-1)
+        base = np.maximum(dims, 1)[..., None]
+        overhead = np.where(dims[..., None] > 0, 100.0 * (candidates - dims[..., None]) / base, 0.0)
+        ok = overhead <= max_overhead_pct
+        first = np.take_along_axis(candidates, ok.argmax(axis=-1)[..., None], axis=-1)[..., 0]
+        repaired = np.where(ok.any(axis=-1), first, up8)
+    else:
+        repaired = dims
+
+    # Already aligned to optimal - no repair needed
+    keep = (dims % contract.optimal_alignment == 0) | np.isin(dims, recommended)
+    return np.where(keep, dims, repaired)
+
+
 def repair_dimension(
     head_dim: int,
     strategy: Union[str, AlignmentStrategy] = AlignmentStrategy.MINIMAL,
     max_overhead_pct: float = 20.0,
     contract: Optional[ShapeContract] = None,
+    cost_table: Optional[CostTable] = None,
+    operators: Optional[Dict[str, float]] = None,
 ) -> int:
     """
     Repair head_dim to the nearest aligned value based on strategy.
 
     Args:
         head_dim: Original dimension to repair
-        strategy: Repair strategy (minimal, optimal, predefined, tradeoff)
-        max_overhead_pct: Maximum acceptable memory overhead for tradeoff strategy
+        strategy: Repair strategy (minimal, optimal, predefined, tradeoff, cost_model)
+        max_overhead_pct: Maximum acceptable memory overhead for tradeoff/cost_model strategy
         contract: Custom ShapeContract (uses default if None)
+        cost_table: Per-device operator latencies for cost_model (default CostTable if None)
+        operators: Operator mix weights for cost_model (DEFAULT_OPERATORS if None)
 
     Returns:
         Repaired dimension that satisfies alignment constraints
@@ -101,62 +250,284 @@ def repair_dimension(
         112  # Nearest predefined value
         >>> repair_dimension(125, strategy="tradeoff", max_overhead_pct=5.0)
         128  # 2.4% overhead acceptable
+        >>> repair_dimension(113, strategy="cost_model")
+        128  # 16-aligned beats 120 once K % 16 slowdowns are priced in
 
     Performance Impact (from C23):
         - Non-aligned → 8-aligned: +50% throughput (vectorized loads)
         - 8-aligned → 16-aligned: +15% throughput (Tensor Core tiles)
     """
-    if contract is None:
-        contract = ShapeContract()
+    return int(repair_dimensions([head_dim], strategy, max_overhead_pct, contract, cost_table, operators)[0])
+
+
+@functools.lru_cache(maxsize=None)
+def _headwise_module_type():
+    """PaLU's HeadwiseLowRankModule, or None when PaLU is not importable."""
+    try:
+        from palu.model.modules.svd_linear import HeadwiseLowRankModule
+    except ImportError:
+        return None
+    return HeadwiseLowRankModule
+
+
+# Row kinds of a ModelShapeIndex
+HEADWISE_U = "headwise_u"    # per-group rank of a HeadwiseLowRankModule (pads U[i] in and VT out)
+LINEAR_OUT = "linear_out"    # k_proj/v_proj nn.Linear: out_features is the head dim
+LINEAR_IN = "linear_in"      # o_proj nn.Linear: in_features matches the head dim
+
+# Operators each row kind's dim feeds (for AlignmentStrategy.COST_MODEL)
+KIND_OPERATORS = {
+    HEADWISE_U: {"gemm_n": 1.0, "gemm_k": 1.0},   # VT rows of the group, U[i] reduction
+    LINEAR_OUT: {"gemm_n": 1.0, "sdpa": 1.0},     # projection width, attention head_dim
+    LINEAR_IN: {"gemm_k": 1.0},                   # o_proj reduction
+}
+
+SHAPE_INDEX_DTYPE = np.dtype([
+    ("path", object),          # module path from named_modules()
+    ("kind", "U10"),
+    ("group", np.int32),       # head group of a HEADWISE_U row, -1 otherwise
+    ("dim", np.int64),         # the dimension subject to repair
+    ("in_features", np.int64),
+    ("out_features", np.int64),
+])
+
+
+class ModelShapeIndex:
+    """
+    Compact table of every repairable dimension of a model, built with one
+    ``named_modules()`` walk. Planning, statistics and overhead reports are
+    vectorized queries over it, so they cost microseconds for any model size.
+
+    Rows (``SHAPE_INDEX_DTYPE``):
+    - ``HEADWISE_U``: one per head group of a ``HeadwiseLowRankModule``;
+      ``dim`` is the group rank, ``in_features``/``out_features`` are those of
+      the module (VT input) and one group (U output).
+    - ``LINEAR_OUT`` / ``LINEAR_IN``: plain k/v (out) and o (in) projections.
+    """
 
-    if isinstance(strategy, str):
-        strategy = AlignmentStrategy(strategy)
+    def __init__(self, table: np.ndarray):
+        self.table = table
 
-    # Already aligned to optimal - no repair needed
-    if contract.is_aligned(head_dim, "optimal") or head_dim in contract.recommended_values:
-        return head_dim
+    @classmethod
+    def build(cls, model: nn.Module) -> "ModelShapeIndex":
+        headwise = _headwise_module_type()
+        rows = []
+        skip_prefix = None
+        for name, module in model.named_modules():
+            # The VT/U linears of a headwise module are covered by its per-group rows
+            if skip_prefix is not None and name.startswith(skip_prefix):
+                continue
+            skip_prefix = None
+            if headwise is not None and isinstance(module, headwise):
+                skip_prefix = name + "."
+                group_dim = module.out_features // len(module.ranks)
+                for i, rank in enumerate(module.ranks):
+                    rows.append((name, HEADWISE_U, i, rank, module.in_features, group_dim))
+            elif isinstance(module, nn.Linear):
+                leaf = name.rsplit(".", 1)[-1].lower()
+                if "k_proj" in leaf or "v_proj" in leaf:
+                    rows.append((name, LINEAR_OUT, -1, module.out_features, module.in_features, module.out_features))
+                elif "o_proj" in leaf:
+                    rows.append((name, LINEAR_IN, -1, module.in_features, module.in_features, module.out_features))
+        return cls(np.array(rows, dtype=SHAPE_INDEX_DTYPE))
 
-    if strategy == AlignmentStrategy.MINIMAL:
-        # Pad to next 8-aligned
-        return ((head_dim + 7) // 8) * 8
+    def __len__(self) -> int:
+        return len(self.table)
 
-    elif strategy == AlignmentStrategy.OPTIMAL:
-        # Pad to next 16-aligned
-        return ((head_dim + 15) // 16) * 16
+    @property
+    def dims(self) -> np.ndarray:
+        return self.table["dim"]
+
+    def keys(self) -> List[str]:
+        """Row names as used in repair plans: ``<path>.U.<i>`` for head groups, ``<path>`` otherwise."""
+        return [
+            f"{path}.U.{group}" if kind == HEADWISE_U else path
+            for path, kind, group in zip(self.table["path"], self.table["kind"], self.table["group"])
+        ]
 
-    elif strategy == AlignmentStrategy.PREDEFINED:
-        # Find nearest predefined value >= head_dim
-        for v in contract.recommended_values:
-            if v >= head_dim:
-                return v
-        # Fallback: pad to 16-aligned
-        return ((head_dim + 15) // 16) * 16
+    def as_dict(self) -> Dict[str, int]:
+        return dict(zip(self.keys(), self.dims.tolist()))
 
-    elif strategy == AlignmentStrategy.TRADEOFF:
-        # Try progressively stricter alignments until overhead exceeds threshold
-        candidates = [
-            ((head_dim + 7) // 8) * 8,    # 8-aligned
-            ((head_dim + 15) // 16) * 16,  # 16-aligned
-        ]
-        # Add predefined values
-        for v in contract.recommended_values:
-            if v >= head_dim:
-                candidates.append(v)
-                break
+    def plan(
+        self,
+        strategy: Union[str, AlignmentStrategy] = AlignmentStrategy.MINIMAL,
+        max_overhead_pct: float = 20.0,
+        contract: Optional[ShapeContract] = None,
+        cost_table: Optional[CostTable] = None,
+    ) -> np.ndarray:
+        """Repaired ``dim`` of every row (COST_MODEL prices each kind's own operator mix)."""
+        if AlignmentStrategy(strategy) != AlignmentStrategy.COST_MODEL:
+            return repair_dimensions(self.dims, strategy, max_overhead_pct, contract)
+        targets = self.dims.copy()
+        for kind, operators in KIND_OPERATORS.items():
+            mask = self.table["kind"] == kind
+            if mask.any():
+                targets[mask] = repair_dimensions(
+                    self.dims[mask], strategy, max_overhead_pct, contract, cost_table, operators
+                )
+        return targets
 
-        # Sort by padded size
-        candidates = sorted(set(candidates))
+    def plan_joint(
+        self,
+        max_total_overhead_pct: float,
+        cost_table: Optional[CostTable] = None,
+        contract: Optional[ShapeContract] = None,
+        iters: int = 50,
+    ) -> np.ndarray:
+        """
+        Plan every row at once: minimize the total predicted latency (each
+        row's operator mix, weighted by its parameter count per unit of dim)
+        subject to the added parameters staying within
+        ``max_total_overhead_pct`` of the indexed ones.
+
+        Each row picks among ``_cost_candidates``; the memory constraint is
+        priced in with a Lagrange weight that is bisected to the smallest
+        value whose plan fits, so dims where padding buys the most latency
+        per parameter are padded first.
+        """
+        cost_table = cost_table or CostTable()
+        contract = contract or ShapeContract()
+        if len(self) == 0:
+            return self.dims.copy()
+        candidates = _cost_candidates(self.dims, contract)
+        unit_params = self.param_counts(np.ones(len(self), dtype=np.int64)).astype(np.float64)[:, None]
+        latency = np.zeros(candidates.shape, dtype=np.float64)
+        for kind, operators in KIND_OPERATORS.items():
+            mask = self.table["kind"] == kind
+            latency[mask] = cost_table.mix_latency(candidates[mask], operators)
+        latency *= unit_params
+        added = (candidates - self.dims[:, None]) * unit_params
+        cap = max_total_overhead_pct / 100.0 * float(self.param_counts().sum())
+
+        def choose(weight: float) -> np.ndarray:
+            return (latency + weight * added).argmin(axis=-1)
+
+        rows = np.arange(len(self))
+        pick = choose(0.0)
+        if added[rows, pick].sum() > cap:
+            lo, hi = 0.0, 1.0
+            while added[rows, choose(hi)].sum() > cap:
+                hi *= 2
+            for _ in range(iters):
+                mid = 0.5 * (lo + hi)
+                lo, hi = (mid, hi) if added[rows, choose(mid)].sum() > cap else (lo, mid)
+            pick = choose(hi)
+        return candidates[rows, pick]
+
+    def with_dims(self, dims: np.ndarray) -> "ModelShapeIndex":
+        """The index of the same model after repairing every row to ``dims``."""
+        table = self.table.copy()
+        table["dim"] = dims
+        linear_out = table["kind"] == LINEAR_OUT
+        linear_in = table["kind"] == LINEAR_IN
+        table["out_features"][linear_out] = table["dim"][linear_out]
+        table["in_features"][linear_in] = table["dim"][linear_in]
+        return ModelShapeIndex(table)
+
+    def param_counts(self, dims: Optional[np.ndarray] = None) -> np.ndarray:
+        """Weight parameters per row: a head group's VT rows plus its U columns, or the full linear."""
+        t = self.table
+        dims = t["dim"] if dims is None else np.asarray(dims, dtype=np.int64)
+        return np.where(
+            t["kind"] == HEADWISE_U,
+            dims * (t["in_features"] + t["out_features"]),
+            np.where(t["kind"] == LINEAR_OUT, dims * t["in_features"], dims * t["out_features"]),
+        )
+
+    def alignment_stats(self, kinds: Tuple[str, ...] = (HEADWISE_U, LINEAR_OUT), dims: Optional[np.ndarray] = None) -> Dict:
+        """Alignment distribution of the head dims (per-group ranks and k/v widths by default)."""
+        mask = np.isin(self.table["kind"], kinds)
+        d = (self.dims if dims is None else np.asarray(dims))[mask]
+        total = int(len(d))
+        aligned_8 = int((d % 8 == 0).sum())
+        aligned_16 = int((d % 16 == 0).sum())
+        return {
+            "unique_dims": np.unique(d).tolist(),
+            "total_heads": total,
+            "aligned_8_count": aligned_8,
+            "aligned_16_count": aligned_16,
+            "aligned_8_pct": 100.0 * aligned_8 / total if total > 0 else 0,
+            "aligned_16_pct": 100.0 * aligned_16 / total if total > 0 else 0,
+            "misaligned_pct": 100.0 * (total - aligned_8) / total if total > 0 else 0,
+        }
+
+    def overhead_report(self, targets: np.ndarray) -> Dict:
+        """Dimension and parameter overhead of repairing every row to ``targets``, overall and per kind."""
+        targets = np.asarray(targets, dtype=np.int64)
+        orig_params = self.param_counts()
+        new_params = self.param_counts(targets)
+
+        def summarize(mask):
+            orig, new = int(self.dims[mask].sum()), int(targets[mask].sum())
+            return {
+                "rows": int(mask.sum()),
+                "affected": int((targets[mask] != self.dims[mask]).sum()),
+                "total_original_dim": orig,
+                "total_repaired_dim": new,
+                "memory_overhead_pct": 100.0 * (new - orig) / orig if orig > 0 else 0.0,
+                "original_params": int(orig_params[mask].sum()),
+                "added_params": int((new_params - orig_params)[mask].sum()),
+            }
+
+        report = summarize(np.ones(len(self), dtype=bool))
+        report["per_kind"] = {
+            kind: summarize(self.table["kind"] == kind) for kind in np.unique(self.table["kind"]).tolist()
+        }
+        return report
 
-        # Return first candidate within overhead threshold
-        for padded in candidates:
-            overhead = contract.memory_overhead(head_dim, padded)
-            if overhead <= max_overhead_pct:
-                return padded
 
-        # If all exceed threshold, return minimal (8-aligned)
-        return ((head_dim + 7) // 8) * 8
+def _empty_linear(in_features: int, out_features: int, bias: bool, like: torch.Tensor) -> nn.Linear:
+    """``nn.Linear`` with uninitialized parameters on ``like``'s device/dtype (no random init to overwrite)."""
+    return torch.nn.utils.skip_init(
+        nn.Linear, in_features, out_features, bias=bias, device=like.device, dtype=like.dtype
+    )
 
-    return head_dim
+
+def _pad_linear(layer: nn.Linear, dim_axis: str, target_dim: int) -> nn.Linear:
+    """Padded copy of ``layer`` (see ``DimensionRepairer.repair_linear_layer``)."""
+    weight = layer.weight.data  # [out_features, in_features]
+    out_features, in_features = weight.shape
+    new_out = max(target_dim, out_features) if dim_axis == "out" else out_features
+    new_in = max(target_dim, in_features) if dim_axis == "in" else in_features
+
+    # One allocation at the padded size: copy the original block, zero only the pad
+    new_layer = _empty_linear(new_in, new_out, layer.bias is not None, weight)
+    with torch.no_grad():
+        new_layer.weight[:out_features, :in_features].copy_(weight)
+        new_layer.weight[out_features:].zero_()
+        new_layer.weight[:out_features, in_features:].zero_()
+        if layer.bias is not None:
+            new_layer.bias[:out_features].copy_(layer.bias.data)
+            new_layer.bias[out_features:].zero_()
+
+    return new_layer
+
+
+def _padded_row_index(old_sizes: List[int], new_sizes: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row layout of block-wise padding: ``dest[i]`` is where source row ``i``
+    lands when block ``g`` grows from ``old_sizes[g]`` to ``new_sizes[g]``
+    rows (pad at the end of each block); ``pad`` lists the remaining rows.
+    """
+    old = np.asarray(old_sizes, dtype=np.int64)
+    new = np.asarray(new_sizes, dtype=np.int64)
+    if (new < old).any():
+        raise ValueError(f"Padding cannot shrink blocks: {old_sizes} -> {new_sizes}")
+    old_starts = np.cumsum(old) - old
+    new_starts = np.cumsum(new) - new
+    dest = np.repeat(new_starts - old_starts, old) + np.arange(old.sum())
+    is_pad = np.ones(new.sum(), dtype=bool)
+    is_pad[dest] = False
+    return dest, np.flatnonzero(is_pad)
+
+
+def _shallow_module_copy(module: nn.Module) -> nn.Module:
+    """A copy of ``module`` sharing its parameters, buffers and children, whose own registries can be edited freely."""
+    clone = copy.copy(module)
+    clone._modules = module._modules.copy()
+    clone._parameters = module._parameters.copy()
+    clone._buffers = module._buffers.copy()
+    return clone
 
 
 @dataclass
@@ -211,10 +582,33 @@ class DimensionRepairer:
         strategy: Union[str, AlignmentStrategy] = AlignmentStrategy.MINIMAL,
         max_overhead_pct: float = 20.0,
         contract: Optional[ShapeContract] = None,
+        cost_table: Optional[CostTable] = None,
+        max_total_overhead_pct: Optional[float] = None,
     ):
+        """
+        ``cost_table`` prices the COST_MODEL strategy. With
+        ``max_total_overhead_pct`` set, COST_MODEL plans the whole model
+        jointly under that global parameter-overhead cap
+        (``ModelShapeIndex.plan_joint``) instead of per dimension.
+        """
         self.strategy = AlignmentStrategy(strategy) if isinstance(strategy, str) else strategy
         self.max_overhead_pct = max_overhead_pct
         self.contract = contract or ShapeContract()
+        self.cost_table = cost_table
+        self.max_total_overhead_pct = max_total_overhead_pct
+        self._indices = weakref.WeakKeyDictionary()
+
+    def index_model(self, model: nn.Module, refresh: bool = False) -> ModelShapeIndex:
+        """
+        The model's ``ModelShapeIndex``, built on first use and cached per
+        model object. ``repair_model`` keeps the cache in sync; pass
+        ``refresh=True`` after changing the model's shapes by other means.
+        """
+        index = None if refresh else self._indices.get(model)
+        if index is None:
+            index = ModelShapeIndex.build(model)
+            self._indices[model] = index
+        return index
 
     def analyze_model(self, model: nn.Module) -> Dict[str, int]:
         """
@@ -227,43 +621,20 @@ class DimensionRepairer:
         - VT: nn.Linear with out_features = sum(ranks) [GROUP-level]
         - U: nn.ModuleList of nn.Linear, each with in_features = ranks[i] [PER-HEAD]
 
-        We detect per-head ranks from module.ranks or U[i].in_features.
+        We detect per-head ranks from module.ranks. The VT/U linears inside the
+        module are not reported on their own.
 
         Returns:
             Dict mapping layer names to their current head_dim values
         """
-        dims = {}
-
-        # Try to import PaLU's HeadwiseLowRankModule
-        try:
-            from palu.model.modules.svd_linear import HeadwiseLowRankModule
-            has_palu = True
-        except ImportError:
-            has_palu = False
-
-        for name, module in model.named_modules():
-            # Check for PaLU's HeadwiseLowRankModule (replaces k_proj/v_proj)
-            if has_palu and isinstance(module, HeadwiseLowRankModule):
-                # For each head group in this module, store per-head rank
-                for i, rank in enumerate(module.ranks):
-                    # Create unique key for each head group's rank
-                    dims[f"{name}.U.{i}"] = rank
-
-            # Fallback: check for standard nn.Linear in attention projections
-            elif isinstance(module, nn.Linear):
-                # Check for common attention projection patterns
-                if any(proj in name.lower() for proj in ['q_proj', 'k_proj', 'v_proj', 'o_proj']):
-                    in_features = module.in_features
-                    out_features = module.out_features
-
-                    # K/V projections: out_features is the compressed dimension
-                    if 'k_proj' in name.lower() or 'v_proj' in name.lower():
-                        dims[name] = out_features
-                    # For O projection, in_features should match K/V compressed dim
-                    elif 'o_proj' in name.lower():
-                        dims[name] = in_features
+        return self.index_model(model).as_dict()
 
-        return dims
+    def plan_targets(self, model: nn.Module) -> Tuple[ModelShapeIndex, np.ndarray]:
+        """The model's shape index and the repaired dim of each of its rows."""
+        index = self.index_model(model)
+        if self.strategy == AlignmentStrategy.COST_MODEL and self.max_total_overhead_pct is not None:
+            return index, index.plan_joint(self.max_total_overhead_pct, self.cost_table, self.contract)
+        return index, index.plan(self.strategy, self.max_overhead_pct, self.contract, self.cost_table)
 
     def compute_repair_plan(
         self,
@@ -275,19 +646,13 @@ class DimensionRepairer:
         Returns:
             Dict mapping layer names to (original_dim, repaired_dim) tuples
         """
-        dims = self.analyze_model(model)
-        plan = {}
+        index, targets = self.plan_targets(model)
+        return dict(zip(index.keys(), zip(index.dims.tolist(), targets.tolist())))
 
-        for name, dim in dims.items():
-            repaired = repair_dimension(
-                dim,
-                strategy=self.strategy,
-                max_overhead_pct=self.max_overhead_pct,
-                contract=self.contract,
-            )
-            plan[name] = (dim, repaired)
-
-        return plan
+    def overhead_report(self, model: nn.Module) -> Dict:
+        """Dimension/parameter overhead of this repairer's plan for ``model`` (see ``ModelShapeIndex.overhead_report``)."""
+        index, targets = self.plan_targets(model)
+        return index.overhead_report(targets)
 
     def repair_linear_layer(
         self,
@@ -306,39 +671,75 @@ class DimensionRepairer:
         Returns:
             New linear layer with padded weights
         """
-        weight = layer.weight.data  # [out_features, in_features]
-        bias = layer.bias.data if layer.bias is not None else None
-
-        out_features, in_features = weight.shape
-
-        if dim_axis == "out":
-            # Pad output dimension (rows)
-            if target_dim > out_features:
-                pad_size = target_dim - out_features
-                weight_pad = torch.zeros(pad_size, in_features,
-                                        dtype=weight.dtype, device=weight.device)
-                weight = torch.cat([weight, weight_pad], dim=0)
-                if bias is not None:
-                    bias_pad = torch.zeros(pad_size, dtype=bias.dtype, device=bias.device)
-                    bias = torch.cat([bias, bias_pad], dim=0)
-                out_features = target_dim
-
-        elif dim_axis == "in":
-            # Pad input dimension (columns)
-            if target_dim > in_features:
-                pad_size = target_dim - in_features
-                weight_pad = torch.zeros(out_features, pad_size,
-                                        dtype=weight.dtype, device=weight.device)
-                weight = torch.cat([weight, weight_pad], dim=1)
-                in_features = target_dim
-
-        # Create new layer
-        new_layer = nn.Linear(in_features, out_features, bias=bias is not None)
-        new_layer.weight.data = weight
-        if bias is not None:
-            new_layer.bias.data = bias
-
-        return new_layer
+        return _pad_linear(layer, dim_axis, target_dim)
+
+    def _repair_patches(
+        self,
+        model: nn.Module,
+        index: ModelShapeIndex,
+        targets: np.ndarray,
+    ) -> List[Tuple[str, str, object]]:
+        """
+        Materialize the repaired submodules without modifying ``model``.
+
+        Returns ``(owner_path, attribute, new_value)`` assignments which,
+        applied in order, turn ``model`` into its repaired version.
+        """
+        table = index.table
+        patches = []
+
+        # Group repairs by HeadwiseLowRankModule for batch processing
+        palu_repairs = {}  # {module_name: {idx: (orig, target)}}
+        for row in np.flatnonzero(targets != index.dims):
+            path, kind = table["path"][row], table["kind"][row]
+            orig, target = int(index.dims[row]), int(targets[row])
+            if kind == HEADWISE_U:
+                palu_repairs.setdefault(path, {})[int(table["group"][row])] = (orig, target)
+            else:
+                # Handle standard nn.Linear layers
+                parent_path, _, layer_name = path.rpartition(".")
+                dim_axis = "out" if kind == LINEAR_OUT else "in"
+                new_layer = self.repair_linear_layer(model.get_submodule(path), dim_axis, target)
+                patches.append((parent_path, layer_name, new_layer))
+
+        # PaLU-specific repairs
+        for module_name, head_repairs in palu_repairs.items():
+            module = model.get_submodule(module_name)
+
+            # Repair each U[i] layer and update VT accordingly
+            new_ranks = list(module.ranks)
+            for head_idx, (orig, target) in head_repairs.items():
+                # Pad U[head_idx]: input dimension (rank -> target)
+                new_u = self.repair_linear_layer(module.U[head_idx], "in", target)
+                patches.append((f"{module_name}.U", str(head_idx), new_u))
+                new_ranks[head_idx] = target
+
+            # Update VT to match new total ranks: each head's rows move to its
+            # padded offset in one scatter, and only the pad rows are zeroed
+            # VT.weight shape: [sum(ranks), in_features]
+            vt_weight = module.VT.weight.data
+            dest, pad = _padded_row_index(module.ranks, new_ranks)
+            new_vt = _empty_linear(vt_weight.shape[1], sum(new_ranks), False, vt_weight)
+            with torch.no_grad():
+                new_vt.weight.index_copy_(0, torch.as_tensor(dest, device=vt_weight.device), vt_weight)
+                new_vt.weight.index_fill_(0, torch.as_tensor(pad, device=vt_weight.device), 0)
+            patches.append((module_name, "VT", new_vt))
+
+            # Update ranks list
+            patches.append((module_name, "ranks", new_ranks))
+
+        return patches
+
+    def _repair_result(self, index: ModelShapeIndex, targets: np.ndarray) -> RepairResult:
+        report = index.overhead_report(targets)
+        return RepairResult(
+            original_dims=index.as_dict(),
+            repaired_dims=dict(zip(index.keys(), targets.tolist())),
+            strategy=self.strategy.value,
+            total_original_params=report["original_params"],
+            total_repaired_params=report["original_params"] + report["added_params"],
+            memory_overhead_pct=report["memory_overhead_pct"],
+        )
 
     def repair_model(
         self,
@@ -354,185 +755,254 @@ class DimensionRepairer:
 
         Args:
             model: Model to repair
-            inplace: If True, modify model in place; otherwise return a copy
+            inplace: If True, modify model in place; otherwise return a copy.
+                The copy only duplicates the repaired modules and their
+                ancestors; every untouched submodule and parameter is shared
+                with ``model``. See ``overlay`` for a reversible in-place repair.
 
         Returns:
             Tuple of (repaired_model, RepairResult)
         """
-        if not inplace:
-            import copy
-            model = copy.deepcopy(model)
+        index, targets = self.plan_targets(model)
+        patches = self._repair_patches(model, index, targets)
 
-        # Try to import PaLU's HeadwiseLowRankModule
-        try:
-            from palu.model.modules.svd_linear import HeadwiseLowRankModule
-            has_palu = True
-        except ImportError:
-            has_palu = False
+        root = model if inplace else _shallow_module_copy(model)
+        copied = {"": root}
 
-        plan = self.compute_repair_plan(model)
+        def writable(path: str) -> nn.Module:
+            """Module at ``path`` in the result, copied (with its ancestors) on first access unless inplace."""
+            if inplace:
+                return model.get_submodule(path)
+            if path not in copied:
+                parent_path, _, name = path.rpartition(".")
+                parent = writable(parent_path)
+                copied[path] = _shallow_module_copy(parent._modules[name])
+                parent._modules[name] = copied[path]
+            return copied[path]
 
-        original_dims = {}
-        repaired_dims = {}
+        for owner_path, attr, value in patches:
+            setattr(writable(owner_path), attr, value)
 
-        # Group repairs by HeadwiseLowRankModule for batch processing
-        palu_repairs = {}  # {module_name: {idx: (orig, target)}}
+        # The result's shapes are known from the plan, no need to walk it again
+        self._indices[root] = index.with_dims(targets)
+        return root, self._repair_result(index, targets)
 
-        for name, (orig, target) in plan.items():
-            original_dims[name] = orig
-            repaired_dims[name] = target
+    def overlay(self, model: nn.Module) -> "RepairOverlay":
+        """Reversible in-place repair of ``model``; see ``RepairOverlay``."""
+        return RepairOverlay(self, model)
 
-            if orig == target:
-                continue
 
-            # Check if this is a PaLU U layer (format: module_name.U.idx)
-            if '.U.' in name and has_palu:
-                # Parse module name and head index
-                parts = name.rsplit('.U.', 1)
-                module_name = parts[0]
-                head_idx = int(parts[1])
+class RepairOverlay:
+    """
+    Copy-on-write repaired variant of a model.
+
+    The padded replacements of the repaired submodules (PaLU ``U[i]``/``VT``,
+    plain k/v/o projections) are materialized once; ``apply`` swaps them into
+    ``model`` in place and ``rollback`` swaps the originals back. Everything
+    else, i.e. nearly all parameters, is shared, so the repaired and
+    unrepaired variants cost one model plus the padded layers, instead of the
+    two full models of ``copy.deepcopy``. Swapping only rebinds submodules,
+    so device placement and any dispatch hooks on untouched modules stay
+    intact.
+
+    Example:
+        >>> overlay = DimensionRepairer("minimal").overlay(palu_model)
+        >>> with overlay:
+        ...     bench(palu_model)   # repaired
+        >>> bench(palu_model)       # original again
+    """
 
-                if module_name not in palu_repairs:
-                    palu_repairs[module_name] = {}
-                palu_repairs[module_name][head_idx] = (orig, target)
-            else:
-                # Handle standard nn.Linear layers
-                parts = name.split('.')
-                parent = model
-                for part in parts[:-1]:
-                    parent = getattr(parent, part)
-                layer_name = parts[-1]
-                layer = getattr(parent, layer_name)
-
-                if not isinstance(layer, nn.Linear):
-                    continue
-
-                # Determine which dimension to pad
-                if 'k_proj' in name.lower() or 'v_proj' in name.lower():
-                    dim_axis = "out"
-                elif 'o_proj' in name.lower():
-                    dim_axis = "in"
-                else:
-                    continue
-
-                new_layer = self.repair_linear_layer(layer, dim_axis, target)
-                setattr(parent, layer_name, new_layer)
-
-        # Apply PaLU-specific repairs
-        if has_palu and palu_repairs:
-            for module_name, head_repairs in palu_repairs.items():
-                # Navigate to the HeadwiseLowRankModule
-                parts = module_name.split('.')
-                module = model
-                for part in parts:
-                    module = getattr(module, part)
-
-                if not isinstance(module, HeadwiseLowRankModule):
-                    continue
-
-                # Repair each U[i] layer and update VT accordingly
-                new_ranks = list(module.ranks)
-                for head_idx, (orig, target) in head_repairs.items():
-                    # Pad U[head_idx]: input dimension (rank -> target)
-                    u_layer = module.U[head_idx]
-                    new_u = self.repair_linear_layer(u_layer, "in", target)
-                    module.U[head_idx] = new_u
-                    new_ranks[head_idx] = target
-
-                # Update VT to match new total ranks
-                # VT.weight shape: [sum(ranks), in_features]
-                old_total = sum(module.ranks)
-                new_total = sum(new_ranks)
-
-                if old_total != new_total:
-                    vt_weight = module.VT.weight.data  # [sum(ranks), in_features]
-                    in_features = vt_weight.shape[1]
-
-                    # Build new VT weight by padding each head's slice
-                    new_vt_slices = []
-                    old_offset = 0
-                    for i, (old_rank, new_rank) in enumerate(zip(module.ranks, new_ranks)):
-                        old_slice = vt_weight[old_offset:old_offset + old_rank, :]
-                        if new_rank > old_rank:
-                            pad_size = new_rank - old_rank
-                            pad = torch.zeros(pad_size, in_features,
-                                            dtype=vt_weight.dtype, device=vt_weight.device)
-                            new_slice = torch.cat([old_slice, pad], dim=0)
-                        else:
-                            new_slice = old_slice
-                        new_vt_slices.append(new_slice)
-                        old_offset += old_rank
-
-                    new_vt_weight = torch.cat(new_vt_slices, dim=0)
-
-                    # Create new VT layer
-                    new_vt = nn.Linear(in_features, new_total, bias=False)
-                    new_vt.weight.data = new_vt_weight
-                    module.VT = new_vt
-
-                # Update ranks list
-                module.ranks = new_ranks
-
-        # Calculate memory overhead
-        total_orig = sum(original_dims.values())
-        total_repaired = sum(repaired_dims.values())
-        overhead = 100.0 * (total_repaired - total_orig) / total_orig if total_orig > 0 else 0.0
-
-        result = RepairResult(
-            original_dims=original_dims,
-            repaired_dims=repaired_dims,
-            strategy=self.strategy.value,
-            memory_overhead_pct=overhead,
+    def __init__(self, repairer: DimensionRepairer, model: nn.Module):
+        self.repairer = repairer
+        self.model = model
+        self.index, self.targets = repairer.plan_targets(model)
+        self.result = repairer._repair_result(self.index, self.targets)
+        self._patches = repairer._repair_patches(model, self.index, self.targets)
+        self._saved = None
+
+    @property
+    def active(self) -> bool:
+        return self._saved is not None
+
+    @property
+    def materialized_bytes(self) -> int:
+        """Memory held by the padded replacement modules."""
+        return sum(
+            p.numel() * p.element_size()
+            for _, _, value in self._patches if isinstance(value, nn.Module)
+            for p in value.parameters()
         )
 
-        return model, result
+    def apply(self) -> nn.Module:
+        """Swap the repaired modules in (no-op if already applied) and return the model."""
+        if self.active:
+            return self.model
+        saved = []
+        for owner_path, attr, value in self._patches:
+            owner = self.model.get_submodule(owner_path)
+            saved.append((owner, attr, getattr(owner, attr)))
+            setattr(owner, attr, value)
+        self._saved = saved
+        self.repairer._indices[self.model] = self.index.with_dims(self.targets)
+        return self.model
+
+    def rollback(self) -> nn.Module:
+        """Restore the original modules (no-op if not applied) and return the model."""
+        if not self.active:
+            return self.model
+        for owner, attr, original in reversed(self._saved):
+            setattr(owner, attr, original)
+        self._saved = None
+        self.repairer._indices[self.model] = self.index
+        return self.model
+
+    def __enter__(self) -> nn.Module:
+        return self.apply()
+
+    def __exit__(self, *exc):
+        self.rollback()
+        return False
+
+
+class RuntimePadding:
+    """
+    Handle of a runtime-padded forward installed on one module; ``remove()``
+    restores the module's own forward.
+
+    Outputs are written by ``out=`` GEMMs straight into a width-aligned
+    buffer whose pad columns were zeroed once at allocation. Buffers are
+    cached per input shape (the last ``max_buffers`` shapes), so decode steps
+    reuse the same memory. Each call therefore overwrites the previous
+    output of the same shape: this is meant for inference, where a
+    projection's output is consumed before the module runs again. With
+    autograd enabled the padded output is produced with ``F.pad`` instead.
+    """
+
+    def __init__(self, module: nn.Module, forward, max_buffers: int = 4):
+        self.module = module
+        self.max_buffers = max_buffers
+        self._buffers = {}
+        self._own_forward = module.__dict__.get("forward")
+        module.forward = forward
+
+    def buffer(self, name: str, shape: Tuple[int, ...], like: torch.Tensor) -> torch.Tensor:
+        key = (name, tuple(shape), like.dtype, like.device)
+        buf = self._buffers.pop(key, None)
+        if buf is None:
+            buf = torch.zeros(shape, dtype=like.dtype, device=like.device)
+            if len(self._buffers) >= self.max_buffers:
+                self._buffers.pop(next(iter(self._buffers)))
+        # Most recently used last
+        self._buffers[key] = buf
+        return buf
+
+    def remove(self):
+        if self._own_forward is None:
+            self.module.__dict__.pop("forward", None)
+        else:
+            self.module.forward = self._own_forward
+        self._buffers.clear()
+
+
+def _matmul_into(out: torch.Tensor, x: torch.Tensor, weight: torch.Tensor, bias: Optional[torch.Tensor]):
+    """``out = x @ weight.T (+ bias)`` written in place; ``out`` may be a column slice of a wider buffer."""
+    if bias is None:
+        torch.mm(x, weight.t(), out=out)
+    else:
+        torch.addmm(bias, x, weight.t(), out=out)
+
+
+def _pad_linear_output(layer: nn.Linear, target_dim: int) -> RuntimePadding:
+    """Runtime padding of an nn.Linear's output features to ``target_dim``."""
+    orig_dim = layer.out_features
+    pad_size = target_dim - orig_dim
+
+    def forward(x):
+        if torch.is_grad_enabled():
+            return torch.nn.functional.pad(torch.nn.functional.linear(x, layer.weight, layer.bias), (0, pad_size))
+        lead = x.shape[:-1]
+        out = handle.buffer("out", (*lead, target_dim), x)
+        _matmul_into(out.view(-1, target_dim)[:, :orig_dim], x.reshape(-1, x.shape[-1]), layer.weight, layer.bias)
+        return out
+
+    handle = RuntimePadding(layer, forward)
+    return handle
+
+
+def _pad_headwise_ranks(module: nn.Module, targets: List[int]) -> RuntimePadding:
+    """
+    Runtime padding of a HeadwiseLowRankModule's per-group ranks: each
+    group's VT rows are projected straight into its slot of a padded latent
+    buffer, and each group's reconstruct GEMM runs at the padded K against a
+    zero-padded copy of U[i] (built once here, the model's weights are not
+    modified), writing into its column slice of the output buffer.
+    Quantized-latent modules keep their own forward.
+    """
+    ranks = list(module.ranks)
+    group_dim = module.out_features // len(ranks)
+    src = np.cumsum(ranks) - ranks
+    dst = np.cumsum(targets) - targets
+    total = int(sum(targets))
+    padded_u = [
+        _pad_linear(u, "in", t) if t > r else u
+        for u, r, t in zip(module.U, ranks, targets)
+    ]
+    own_forward = module.forward
+
+    def forward(hidden_states):
+        if torch.is_grad_enabled() or module.quantized_latents:
+            return own_forward(hidden_states)
+        lead = hidden_states.shape[:-1]
+        x = hidden_states.reshape(-1, hidden_states.shape[-1])
+        latent = handle.buffer("latent", (x.shape[0], total), x)
+        out = handle.buffer("out", (*lead, module.out_features), x)
+        out2d = out.view(-1, module.out_features)
+        vt = module.VT.weight
+        for g, (r, t) in enumerate(zip(ranks, targets)):
+            _matmul_into(latent[:, dst[g]:dst[g] + r], x, vt[src[g]:src[g] + r], None)
+        for g, (u, t) in enumerate(zip(padded_u, targets)):
+            _matmul_into(out2d[:, g * group_dim:(g + 1) * group_dim], latent[:, dst[g]:dst[g] + t], u.weight, u.bias)
+        return out
+
+    handle = RuntimePadding(module, forward)
+    return handle
 
 
 def create_repair_hooks(
     model: nn.Module,
     strategy: Union[str, AlignmentStrategy] = AlignmentStrategy.MINIMAL,
-) -> Dict[str, callable]:
+) -> Dict[str, RuntimePadding]:
     """
-    Create forward hooks that apply runtime padding to attention inputs.
+    Install runtime padding on attention projections instead of padding weights.
 
     This is an alternative to weight modification - instead of padding weights,
-    we pad the input tensors at runtime. This is useful for:
+    the padded dimensions are produced at runtime. This is useful for:
     - Quick experimentation without modifying model weights
     - Validating padding effectiveness before permanent repair
 
+    k_proj/v_proj nn.Linear outputs are written into a preallocated,
+    already padded buffer; HeadwiseLowRankModule groups run their latent and
+    reconstruct GEMMs at the padded ranks (see ``RuntimePadding``).
+
     Returns:
-        Dict of hook handles that can be removed later
+        Dict of handles whose ``remove()`` restores the original forward
     """
     repairer = DimensionRepairer(strategy=strategy)
-    plan = repairer.compute_repair_plan(model)
+    index, targets = repairer.plan_targets(model)
+    table = index.table
     hooks = {}
 
-    def make_padding_hook(orig_dim: int, target_dim: int, dim_axis: str):
-        def hook(module, inputs, outputs):
-            if dim_axis == "out" and outputs.shape[-1] == orig_dim:
-                # Pad last dimension of output
-                pad_size = target_dim - orig_dim
-                padding = torch.zeros(
-                    *outputs.shape[:-1], pad_size,
-                    dtype=outputs.dtype, device=outputs.device
-                )
-                return torch.cat([outputs, padding], dim=-1)
-            return outputs
-        return hook
-
-    for name, (orig, target) in plan.items():
-        if orig == target:
-            continue
-
-        # Navigate to layer
-        parts = name.split('.')
-        layer = model
-        for part in parts:
-            layer = getattr(layer, part)
-
-        if 'k_proj' in name.lower() or 'v_proj' in name.lower():
-            hook_fn = make_padding_hook(orig, target, "out")
-            handle = layer.register_forward_hook(hook_fn)
-            hooks[name] = handle
+    headwise_targets = {}
+    for row in np.flatnonzero(targets != index.dims):
+        path, kind = table["path"][row], table["kind"][row]
+        if kind == LINEAR_OUT:
+            hooks[path] = _pad_linear_output(model.get_submodule(path), int(targets[row]))
+        elif kind == HEADWISE_U:
+            headwise_targets.setdefault(path, {})[int(table["group"][row])] = int(targets[row])
+
+    for path, group_targets in headwise_targets.items():
+        module = model.get_submodule(path)
+        padded = [group_targets.get(i, r) for i, r in enumerate(module.ranks)]
+        hooks[path] = _pad_headwise_ranks(module, padded)
 
     return hooks
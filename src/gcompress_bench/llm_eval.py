@@ -9,6 +9,9 @@ import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
 from environment import collect_environment
+from ppl_engine import perplexity
+from token_cache import TokenCache
+from results_store import ResultsStore
 from .metrics import compute_stats
 from .palu_loader import load_palu_model
 
@@ -43,38 +46,25 @@ def load_text_corpus() -> str:
     return tiny_text
 
 
-def get_wikitext():
+def get_wikitext_ids(tokenizer) -> torch.Tensor:
+    """WikiText-2 validation token ids from the token cache (tokenized on first use)."""
     try:
-        from datasets import load_dataset
-        ds = load_dataset("wikitext", "wikitext-2-raw-v1", split="validation")
-        return "\n".join(ds["text"])
+        return TokenCache().get("wikitext2_lines", "validation", tokenizer).ids
     except Exception:
-        return load_text_corpus()
+        return tokenizer(load_text_corpus(), return_tensors="pt").input_ids
+
+
+def _ppl_row(result: dict) -> dict:
+    return {"ppl": result["ppl"], "nll": result["nll"], "tokens": result["tokens"]}
 
 
 def compute_ppl(model, tokenizer, text: str, device: str, block_size: int = 512):
-    enc = tokenizer(text, return_tensors="pt")
-    input_ids = enc.input_ids.to(device)
-    nlls = []
-    for i in range(0, input_ids.size(1), block_size):
-        chunk = input_ids[:, i : i + block_size]
-        if chunk.size(1) < 2:
-            continue
-        with torch.inference_mode():
-            out = model(chunk, labels=chunk)
-            nll = out.loss * chunk.size(1)
-            nlls.append(nll)
-    if not nlls:
-        return {"ppl": None, "nll": None, "tokens": 0}
-    nll_sum = torch.stack(nlls).sum()
-    tok_count = input_ids.size(1)
-    ppl = torch.exp(nll_sum / tok_count).item()
-    return {"ppl": ppl, "nll": nll_sum.item(), "tokens": tok_count}
-
-
-def run_ppl(model, tokenizer, device):
-    text = get_wikitext()
-    return compute_ppl(model, tokenizer, text, device)
+    input_ids = tokenizer(text, return_tensors="pt").input_ids
+    return _ppl_row(perplexity(model, input_ids, seq_len=block_size))
+
+
+def run_ppl(model, tokenizer, device, block_size: int = 512):
+    return _ppl_row(perplexity(model, get_wikitext_ids(tokenizer), seq_len=block_size))
 
 
 def run_lmeval(variant, model, tokenizer, tasks: str, limit: int, device: str, dtype_str: str):
@@ -104,12 +94,34 @@ def run_lmeval(variant, model, tokenizer, tasks: str, limit: int, device: str, d
     return {"raw": results, "scores": scores}
 
 
+def eval_measurements(raw: dict) -> list:
+    """One store row per ppl result / lm-eval task score."""
+    measurements = []
+    if "ppl" in raw:
+        measurements.append({"phase": "ppl", **raw["ppl"]})
+    if "lmeval" in raw:
+        res = raw["lmeval"]
+        if "error" in res:
+            measurements.append({"phase": "lmeval", "error": res["error"]})
+        for task, acc in res.get("scores", {}).items():
+            measurements.append({"phase": "lmeval", "task": task, "acc": acc})
+    return measurements
+
+
 def save_results(run_dir: Path, config: dict, raw: dict, summary: dict, run_summary: str):
+    """Write run metadata to ``run_dir`` and the measurements to ``<out>/store``."""
     run_dir.mkdir(parents=True, exist_ok=True)
     (run_dir / "config.json").write_text(json.dumps(config, indent=2))
     env = collect_environment()
     (run_dir / "env.json").write_text(json.dumps(env, indent=2))
-    (run_dir / "raw.json").write_text(json.dumps(raw, indent=2))
+    experiment = f"llm_{config['suite']}"
+    ResultsStore(run_dir.parent / "store").append(
+        experiment, run_dir.name, eval_measurements(raw), env=env, config=config
+    )
+    if "raw" in raw.get("lmeval", {}):
+        # Full harness output is not tabular; keep it next to the run
+        (run_dir / "lmeval_harness.json").write_text(json.dumps(raw["lmeval"]["raw"], default=str))
+    summary = {"experiment": experiment, "run_id": run_dir.name, **summary}
     (run_dir / "summary.json").write_text(json.dumps(summary, indent=2))
     (run_dir / "run_summary.md").write_text(run_summary)
 
@@ -10,6 +10,7 @@ from transformers import AutoModelForCausalLM, AutoTokenizer
 
 from .metrics import measure_kernel, compute_stats, memory_stats, reset_memory
 from environment import collect_environment
+from results_store import ResultsStore
 from .palu_loader import load_palu_model
 
 
@@ -64,6 +65,7 @@ def benchmark_prefill(model, tokenizer, device, batches, seq_lens, warmup, measu
                     "timing": res["stats"],
                     "throughput_toks_per_s": compute_stats(throughput),
                     "memory": mem,
+                    "times_ms": res["times_ms"],
                 })
             except RuntimeError as e:
                 # OOM or other CUDA error: record and skip this (and larger seq for same batch)
@@ -104,6 +106,7 @@ def benchmark_decode(model, tokenizer, device, batches, ctx_lens, gen_lens, warm
                         "timing": res["stats"],
                         "throughput_toks_per_s": compute_stats(throughput),
                         "memory": mem,
+                        "times_ms": res["times_ms"],
                     })
                 except RuntimeError as e:
                     decode_results.append({
@@ -122,11 +125,15 @@ def benchmark_decode(model, tokenizer, device, batches, ctx_lens, gen_lens, warm
 
 
 def save_results(run_dir: Path, config: dict, raw: dict, summary: dict, run_summary: str):
+    """Write run metadata to ``run_dir`` and the measurements to ``<out>/store``."""
     run_dir.mkdir(parents=True, exist_ok=True)
     (run_dir / "config.json").write_text(json.dumps(config, indent=2))
     env = collect_environment()
     (run_dir / "env.json").write_text(json.dumps(env, indent=2))
-    (run_dir / "raw.json").write_text(json.dumps(raw, indent=2))
+    experiment = f"llm_{config['suite']}"
+    measurements = [{"phase": phase, **m} for phase, records in raw.items() for m in records]
+    ResultsStore(run_dir.parent / "store").append(experiment, run_dir.name, measurements, env=env, config=config)
+    summary = {"experiment": experiment, "run_id": run_dir.name, **summary}
     (run_dir / "summary.json").write_text(json.dumps(summary, indent=2))
     (run_dir / "run_summary.md").write_text(run_summary)
 
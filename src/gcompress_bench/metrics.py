@@ -1,10 +1,15 @@
 """
-Metrics utilities: CUDA event timing, statistics, and memory capture.
+Metrics utilities: kernel timing (CUDA events or CPU wall clock), statistics, and memory capture.
 """
 from typing import Dict, List
 import torch
 import numpy as np
 
+try:
+    from ..timers import get_timer, synchronize
+except ImportError:  # imported as top-level `gcompress_bench` with src/ on sys.path
+    from timers import get_timer, synchronize
+
 
 def compute_stats(times_ms: List[float]) -> Dict:
     arr = np.array(times_ms, dtype=np.float64)
@@ -26,39 +31,36 @@ def measure_kernel(
     measure: int,
     trials: int,
     device: str = "cuda",
+    timer: str = "auto",
 ) -> Dict:
     """
-    Run fn multiple times with CUDA events.
+    Run fn multiple times with the selected timer backend (see src/timers.py).
     Returns raw times_ms across all trials and stats.
     """
-    assert torch.cuda.is_available(), "CUDA required"
-    torch.cuda.synchronize(device)
+    timer_name, time_fn = get_timer(timer, device)
+    synchronize(device)
     times_ms: List[float] = []
 
     for _ in range(trials):
         # warmup
         for _ in range(warmup):
             fn()
-        torch.cuda.synchronize(device)
+        synchronize(device)
 
         # measure
-        for _ in range(measure):
-            start = torch.cuda.Event(enable_timing=True)
-            end = torch.cuda.Event(enable_timing=True)
-            start.record()
-            fn()
-            end.record()
-            torch.cuda.synchronize(device)
-            times_ms.append(start.elapsed_time(end))
+        times_ms.extend(time_fn(fn, measure, device))
 
     stats = compute_stats(times_ms)
     return {
+        "timer": timer_name,
         "times_ms": times_ms,
         "stats": stats,
     }
 
 
 def memory_stats() -> Dict:
+    if not torch.cuda.is_available():
+        return {"max_memory_allocated": 0, "max_memory_reserved": 0}
     torch.cuda.synchronize()
     return {
         "max_memory_allocated": int(torch.cuda.max_memory_allocated()),
@@ -67,4 +69,5 @@ def memory_stats() -> Dict:
 
 
 def reset_memory():
-    torch.cuda.reset_peak_memory_stats()
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
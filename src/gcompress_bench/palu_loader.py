@@ -1,18 +1,32 @@
 """
 PaLU helper: locate compressed checkpoint directory and load model/tokenizer.
 Uses PaluLlamaConfig/PaluLlamaForCausalLM from third_party/palu.
+
+Dimension-repaired models can be exported with ``save_repaired_palu`` and
+reloaded with ``load_repaired_palu``: the export holds the config with the
+repaired ``head_wise_ranks`` and the padded weights as one safetensors file,
+so the repaired model is rebuilt without loading the original checkpoint and
+re-running the repair.
 """
+import copy
 import glob
+import json
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Optional, Tuple, Union
 
 import torch
+from safetensors.torch import save_model
 from transformers import AutoTokenizer
 
+from palu.model.modules.svd_linear import HeadwiseLowRankModule
 from palu.model.svd_llama.configuration_palu_llama import PaluLlamaConfig
 from palu.model.svd_llama.modeling_palu_llama import PaluLlamaForCausalLM
 
 
+REPAIRED_WEIGHTS = "model.safetensors"
+REPAIR_MANIFEST = "repair.json"
+
+
 def find_palu_dir(
     base: str = "/home/xinj/rap/submodules/palu",
     pattern: str = "Meta-Llama-3-8B-Instruct_ratio-0.7_gs-4*",
@@ -23,22 +37,98 @@ def find_palu_dir(
     return Path(candidates[0])
 
 
-def load_palu_model(
-    device: str = "cuda",
-    torch_dtype: torch.dtype = torch.float16,
-) -> Tuple[torch.nn.Module, AutoTokenizer, Path]:
-    palu_dir = find_palu_dir()
+def _baseline_tokenizer() -> AutoTokenizer:
+    # Use baseline tokenizer to avoid tokenizer.json format issues in palu dir.
+    baseline_id = "meta-llama/Meta-Llama-3-8B-Instruct"
+    return AutoTokenizer.from_pretrained(baseline_id, use_fast=True)
+
 
+def _from_pretrained(
+    model_dir: Path, device: str, torch_dtype: torch.dtype, reconstruct_mode: str,
+) -> torch.nn.Module:
     # PaLU checkpoint uses custom config/model type `palullama`.
-    config = PaluLlamaConfig.from_pretrained(palu_dir)
-    model = PaluLlamaForCausalLM.from_pretrained(
-        palu_dir,
+    config = PaluLlamaConfig.from_pretrained(model_dir)
+    # How HeadwiseLowRankModule.reconstruct runs: "loop", "bmm" or "block_diag"
+    config.reconstruct_mode = reconstruct_mode
+    # low_cpu_mem_usage builds the modules on the meta device and fills them
+    # from the (memory-mapped) safetensors shards, skipping the random init
+    return PaluLlamaForCausalLM.from_pretrained(
+        model_dir,
         config=config,
         torch_dtype=torch_dtype,
+        low_cpu_mem_usage=True,
         device_map="auto" if device.startswith("cuda") else None,
     )
 
-    # Use baseline tokenizer to avoid tokenizer.json format issues in palu dir.
-    baseline_id = "meta-llama/Meta-Llama-3-8B-Instruct"
-    tokenizer = AutoTokenizer.from_pretrained(baseline_id, use_fast=True)
-    return model, tokenizer, palu_dir
+
+def load_palu_model(
+    device: str = "cuda",
+    torch_dtype: torch.dtype = torch.float16,
+    reconstruct_mode: str = "loop",
+) -> Tuple[torch.nn.Module, AutoTokenizer, Path]:
+    palu_dir = find_palu_dir()
+    model = _from_pretrained(palu_dir, device, torch_dtype, reconstruct_mode)
+    return model, _baseline_tokenizer(), palu_dir
+
+
+def head_wise_ranks(model: torch.nn.Module) -> Dict[str, list]:
+    """``{module path: ranks}`` of every HeadwiseLowRankModule, the layout of ``config.head_wise_ranks``."""
+    return {
+        name: [int(r) for r in module.ranks]
+        for name, module in model.named_modules() if isinstance(module, HeadwiseLowRankModule)
+    }
+
+
+def save_repaired_palu(
+    model: torch.nn.Module,
+    out_dir: Union[str, Path],
+    repair_info: Optional[Dict] = None,
+) -> Path:
+    """
+    Export a (dimension-repaired) PaLU model to ``out_dir``.
+
+    Writes ``config.json`` with ``head_wise_ranks`` taken from the modules
+    (so the padded ranks replace the original ones), the weights as
+    ``model.safetensors`` and, if given, ``repair_info`` as ``repair.json``.
+    The model and its config object are not modified, so this also works on
+    the copies returned by ``DimensionRepairer.repair_model`` (which share
+    the config with the original) and inside a ``RepairOverlay``.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    config = copy.deepcopy(model.config)
+    config.head_wise_ranks = head_wise_ranks(model)
+    config.save_pretrained(out_dir)
+    # save_model drops tied duplicates (they are re-tied on load) and makes views contiguous
+    save_model(model, str(out_dir / REPAIRED_WEIGHTS), metadata={"format": "pt"}, force_contiguous=True)
+
+    if repair_info is not None:
+        with open(out_dir / REPAIR_MANIFEST, "w") as f:
+            json.dump(repair_info, f, indent=2, default=str)
+    return out_dir
+
+
+def load_repaired_palu(
+    repaired_dir: Union[str, Path],
+    device: str = "cuda",
+    torch_dtype: torch.dtype = torch.float16,
+    reconstruct_mode: str = "loop",
+) -> Tuple[torch.nn.Module, AutoTokenizer, Optional[Dict]]:
+    """
+    Load a model written by ``save_repaired_palu``.
+
+    ``PaluLlamaForCausalLM`` builds its HeadwiseLowRankModules from the saved
+    (repaired) ``head_wise_ranks``, so the padded weights load without shape
+    mismatches. Returns ``(model, tokenizer, repair_info)``; ``repair_info``
+    is None when the export was saved without one.
+    """
+    repaired_dir = Path(repaired_dir)
+    model = _from_pretrained(repaired_dir, device, torch_dtype, reconstruct_mode)
+
+    repair_info = None
+    manifest = repaired_dir / REPAIR_MANIFEST
+    if manifest.exists():
+        with open(manifest) as f:
+            repair_info = json.load(f)
+    return model, _baseline_tokenizer(), repair_info
@@ -0,0 +1,289 @@
+"""Importance scores of linear layers for rank allocation, from one sweep.
+
+Fisher and gradient-L1 scores (``scripts/compute_rank_scores.py``), input
+activation norms, weight magnitudes and stable ranks
+(``compute_layer_sensitivity`` in ``scripts/asvd_gac_experiment.py``, ASVD's
+``calib_sensitivity_stable_rank``) used to be computed by separate passes
+over the calibration set or by a full ``svdvals`` per weight.
+``compute_scores`` produces any subset of ``SCORE_TYPES`` together:
+
+- ``fisher`` / ``gradient``: per-row sums of the mean squared / absolute
+  weight gradient, from one ``src.fisher_engine.fisher_information`` run,
+- ``activation``: mean L2 norm of the layer input per token, from forward
+  pre-hooks of the same passes (forward-only when no gradient score is asked),
+- ``magnitude``: per-row squared L2 norms of the weight (no data),
+- ``stable_rank``: ``||W||_F / ||W||_2`` with the spectral norm from power
+  iteration (no data).
+
+``ImportanceScores`` keeps the scores of one calibration setup in a single
+``.npz`` file, one member per (score type, module), so consumers read only
+what they index::
+
+    <root>/<model>__<dataset>__n<nsamples>__l<seqlen>.npz
+        __meta__                          JSON: key fields, seed, module shapes
+        fisher/model.layers.0.self_attn.k_proj
+        stable_rank/model.layers.0.self_attn.k_proj
+        ...
+
+Missing score types are computed and merged into the file on demand
+(``ensure``). ``total`` / ``mean`` / ``groups`` / ``per_layer`` /
+``sensitivity_dict`` turn the stored statistics into the score layouts of the
+allocators (GAC rank allocation, PaLU rank search, ASVD binary search).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.calib_cache import cache_key
+from src.fisher_engine import fisher_information
+
+
+SCORE_TYPES = ("fisher", "gradient", "activation", "magnitude", "stable_rank")
+
+# Scores stored per output row; the others are one value per module
+ROW_SCORES = ("fisher", "gradient", "magnitude")
+
+_GRADIENT_REDUCTION = {"fisher": "rows", "gradient": "abs_rows"}
+
+
+def spectral_norm(weight: torch.Tensor, iters: int = 1000, tol: float = 1e-7) -> float:
+    """Largest singular value of ``weight`` by power iteration on ``W^T W`` (fp32, deterministic start)."""
+    w = weight.detach().float()
+    gen = torch.Generator().manual_seed(0)
+    v = torch.randn(w.shape[1], generator=gen).to(w.device)
+    v /= v.norm()
+    sigma = 0.0
+    for _ in range(iters):
+        u = w @ v
+        u /= u.norm().clamp_min(1e-30)
+        v = w.T @ u
+        prev, sigma = sigma, v.norm().item()
+        if sigma == 0.0:
+            break
+        v /= sigma
+        if abs(sigma - prev) <= tol * sigma:
+            break
+    return sigma
+
+
+def stable_rank(weight: torch.Tensor) -> float:
+    """``sqrt(||W||_F^2 / ||W||_2^2)``, as in ASVD's stable-rank sensitivity."""
+    fro_sq = weight.detach().float().square().sum().item()
+    return (fro_sq / (spectral_norm(weight) ** 2 + 1e-8)) ** 0.5
+
+
+def _linears(model: nn.Module, module_filter: Optional[Callable[[str], bool]]) -> Dict[str, nn.Linear]:
+    return {
+        name: m for name, m in model.named_modules()
+        if isinstance(m, nn.Linear) and (module_filter is None or module_filter(name))
+    }
+
+
+def compute_scores(
+    model: nn.Module,
+    calib_loader,
+    device,
+    types: Sequence[str] = SCORE_TYPES,
+    module_filter: Optional[Callable[[str], bool]] = None,
+    micro_batch_size: Optional[int] = None,
+    gradient_checkpointing: bool = False,
+) -> Dict[str, Dict[str, torch.Tensor]]:
+    """
+    ``{score type: {module name: tensor}}`` for the ``nn.Linear`` modules
+    passing ``module_filter``: ``[out]`` rows for ``ROW_SCORES``, a
+    one-element tensor otherwise. Data-dependent types share one sweep over
+    ``calib_loader`` (batches of ``input_ids``, fed as ``input_ids[:, :-1]``).
+    """
+    unknown = set(types) - set(SCORE_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown score types {sorted(unknown)}, expected a subset of {SCORE_TYPES}")
+    targets = _linears(model, module_filter)
+    scores: Dict[str, Dict[str, torch.Tensor]] = {t: {} for t in types}
+
+    if "magnitude" in types:
+        for name, m in targets.items():
+            scores["magnitude"][name] = m.weight.detach().float().square().sum(dim=1).cpu()
+    if "stable_rank" in types:
+        for name, m in targets.items():
+            scores["stable_rank"][name] = torch.tensor([stable_rank(m.weight)])
+
+    handles, act_sum, act_count = [], {}, {}
+    if "activation" in types:
+        # Sum and count of per-token norms: a checkpointing recompute adds to both and keeps the mean
+        def make_hook(name):
+            def hook(module, args):
+                x = args[0].detach()
+                act_sum[name] = act_sum.get(name, 0.0) + x.float().norm(dim=-1).sum().item()
+                act_count[name] = act_count.get(name, 0) + x[..., 0].numel()
+            return hook
+        handles = [m.register_forward_pre_hook(make_hook(name)) for name, m in targets.items()]
+
+    try:
+        grad_types = [t for t in types if t in _GRADIENT_REDUCTION]
+        if grad_types:
+            stats = fisher_information(
+                model, calib_loader, device, module_filter=lambda name: name in targets,
+                reductions=[_GRADIENT_REDUCTION[t] for t in grad_types],
+                micro_batch_size=micro_batch_size, gradient_checkpointing=gradient_checkpointing,
+            )
+            for t in grad_types:
+                scores[t] = {name: s[_GRADIENT_REDUCTION[t]] for name, s in stats.items()}
+        elif "activation" in types:
+            with torch.no_grad():
+                for batch in calib_loader:
+                    ids = batch["input_ids"] if isinstance(batch, dict) else batch
+                    for part in ids.split(micro_batch_size or len(ids)):
+                        model(input_ids=part[:, :-1].to(device))
+    finally:
+        for h in handles:
+            h.remove()
+
+    if "activation" in types:
+        scores["activation"] = {
+            name: torch.tensor([act_sum.get(name, 0.0) / max(act_count.get(name, 0), 1)]) for name in targets
+        }
+    return scores
+
+
+class ImportanceScores:
+    """Importance scores of one (model, dataset, nsamples, seqlen) calibration setup, in one ``.npz`` file."""
+
+    def __init__(self, root: Path, model_id: str, dataset: str, nsamples: int, seqlen: int, seed: Optional[int] = None):
+        self.meta = {"model_id": model_id, "dataset": dataset, "nsamples": nsamples, "seqlen": seqlen, "seed": seed}
+        self.path = Path(root) / f"{cache_key(model_id, dataset, nsamples, seqlen)}.npz"
+        self._keys: List[str] = []                 # members stored in the file
+        self._arrays: Dict[str, np.ndarray] = {}   # members read so far, plus unsaved ones
+        self._shapes: Dict[str, List[int]] = {}
+        self._load()
+
+    @classmethod
+    def open(cls, path: Path) -> "ImportanceScores":
+        """Read an existing score file without knowing its key."""
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["__meta__"]))
+        scores = cls(Path(path).parent, meta["model_id"], meta["dataset"], meta["nsamples"], meta["seqlen"], meta["seed"])
+        if scores.path != Path(path):
+            raise ValueError(f"{path} does not match its own key ({scores.path.name})")
+        return scores
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with np.load(self.path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["__meta__"]))
+            if meta["seed"] != self.meta["seed"]:
+                return  # scores of other calibration samples: recomputed and overwritten
+            self._shapes = meta["shapes"]
+            self._keys = [k for k in npz.files if k != "__meta__"]
+
+    def _read(self, keys: Iterable[str]):
+        keys = [k for k in keys if k not in self._arrays]
+        if keys:
+            with np.load(self.path, allow_pickle=False) as npz:
+                self._arrays.update({k: npz[k] for k in keys})
+
+    @property
+    def types(self) -> List[str]:
+        return sorted({k.split("/", 1)[0] for k in self._keys})
+
+    def names(self, score_type: str) -> List[str]:
+        prefix = f"{score_type}/"
+        return [k[len(prefix):] for k in self._keys if k.startswith(prefix)]
+
+    def get(self, score_type: str, name: str) -> np.ndarray:
+        key = f"{score_type}/{name}"
+        if key not in self._keys:
+            raise KeyError(f"No '{score_type}' score for {name} in {self.path}")
+        self._read([key])
+        return self._arrays[key]
+
+    def put(self, scores: Dict[str, Dict[str, torch.Tensor]], shapes: Dict[str, Sequence[int]]):
+        """Merge ``compute_scores`` output into the file (atomically rewritten)."""
+        self._read(self._keys)
+        for score_type, per_module in scores.items():
+            for name, t in per_module.items():
+                self._arrays[f"{score_type}/{name}"] = t.detach().cpu().numpy().astype(np.float32)
+        self._shapes.update({name: list(shape) for name, shape in shapes.items()})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, __meta__=np.array(json.dumps({**self.meta, "shapes": self._shapes})), **self._arrays)
+        os.replace(tmp, self.path)
+        self._keys = list(self._arrays)
+
+    def ensure(
+        self,
+        model: nn.Module,
+        calib_loader,
+        device,
+        types: Iterable[str],
+        module_filter: Optional[Callable[[str], bool]] = None,
+        refresh: bool = False,
+        **kwargs,
+    ) -> "ImportanceScores":
+        """
+        Compute the score types (or modules) of ``types`` that are not stored
+        yet, in one sweep; ``refresh`` recomputes them all.
+        """
+        targets = _linears(model, module_filter)
+        missing = [t for t in types if refresh or not set(targets) <= set(self.names(t))]
+        if missing:
+            scores = compute_scores(model, calib_loader, device, missing, module_filter=lambda n: n in targets, **kwargs)
+            self.put(scores, {name: m.weight.shape for name, m in targets.items()})
+        return self
+
+    # ── score layouts ────────────────────────────────────────────────────
+
+    def total(self, score_type: str, name: str) -> float:
+        """
+        Whole-module score: ``sqrt(sum E[g^2])`` (fisher), ``E[||g||_1]``
+        (gradient), ``||W||_F`` (magnitude), or the stored value.
+        """
+        a = self.get(score_type, name).astype(np.float64)
+        if score_type in ("fisher", "magnitude"):
+            return float(np.sqrt(a.sum()))
+        return float(a.sum())
+
+    def mean(self, score_type: str, name: str) -> float:
+        """Size-independent module score: root mean square (fisher, magnitude) or mean (gradient) per weight."""
+        numel = int(np.prod(self._shapes[name]))
+        a = self.get(score_type, name).astype(np.float64)
+        if score_type in ("fisher", "magnitude"):
+            return float(np.sqrt(a.sum() / numel))
+        if score_type == "gradient":
+            return float(a.sum() / numel)
+        return float(a.sum())
+
+    def groups(self, score_type: str, name: str, num_groups: int) -> List[float]:
+        """``mean`` of each of ``num_groups`` contiguous output-row groups (module-wide types repeat their value)."""
+        if score_type not in ROW_SCORES:
+            return [self.mean(score_type, name)] * num_groups
+        rows = self.get(score_type, name).astype(np.float64).reshape(num_groups, -1)
+        per_weight = rows.sum(axis=1) / (rows.shape[1] * self._shapes[name][1])
+        return (np.sqrt(per_weight) if score_type != "gradient" else per_weight).tolist()
+
+    def per_layer(
+        self, score_type: str, proj: str, num_layers: int, template: str = "model.layers.{layer}.self_attn.{proj}",
+    ) -> List[float]:
+        """``total`` of ``proj`` in every decoder layer (the ``compute_rank_scores`` JSON layout)."""
+        return [self.total(score_type, template.format(layer=i, proj=proj)) for i in range(num_layers)]
+
+    def sensitivity_dict(
+        self, score_type: str, param_ratios: Sequence[float], names: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Dict[float, float]]:
+        """
+        ``{name: {param_ratio: mean * (1 - param_ratio)}}`` for ASVD-style
+        binary search (larger = compressed later). ASVD's own stable-rank
+        sensitivity ``-sr * ratio**0.1`` is built by
+        ``calib_sensitivity_stable_rank`` in scripts/asvd_simple.
+        """
+        out = {}
+        for name in names if names is not None else self.names(score_type):
+            s = self.mean(score_type, name)
+            out[name] = {r: s * (1 - r) for r in param_ratios}
+        return out
@@ -0,0 +1,146 @@
+"""Work-item journal for resumable, sharded experiment sweeps.
+
+Every measured point of a sweep (shape, head_dim/K/N, dtype, backend, ...) is
+addressed by a content hash of the point plus the sampling parameters that
+affect its result. Completed points are appended to a JSONL journal as soon as
+they finish, so a rerun with the same run directory skips them, and
+``shard=(i, n)`` splits the point space deterministically across workers.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Spec keys that change how a point is measured (and therefore its result)
+SAMPLING_KEYS = ("type", "warmup", "measure", "trials", "timer", "adaptive")
+
+
+def point_key(point: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> str:
+    """Content hash (sha1 hex) of a work item and its measurement context."""
+    payload = json.dumps({"point": point, "context": context or {}}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parse an ``"i/n"`` shard string into ``(i, n)`` with ``0 <= i < n``."""
+    try:
+        index, count = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{shard}', expected 'i/n' (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{shard}': need 0 <= i < n")
+    return index, count
+
+
+def iter_journal(journal_dir: Path) -> Iterator[Dict[str, Any]]:
+    """Yield entries from every shard journal in ``journal_dir`` (in file order)."""
+    for path in sorted(Path(journal_dir).glob("*.jsonl")):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from a killed job; the point is simply redone
+                    continue
+
+
+class WorkJournal:
+    """
+    Tracks which sweep points this worker should measure.
+
+    With no ``journal_dir`` every point is claimed and nothing is persisted,
+    which is the behaviour of a plain (non-resumable) run. With
+    ``replay_only=True`` nothing is claimed: running a sweep just collects the
+    journaled points in sweep order (used to merge shards). ``meta`` (e.g. the
+    device) is written with every entry but is not part of the point key, so
+    shards on different devices split one key space.
+    """
+
+    def __init__(
+        self,
+        journal_dir: Optional[Path] = None,
+        shard: Tuple[int, int] = (0, 1),
+        context: Optional[Dict[str, Any]] = None,
+        replay_only: bool = False,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        self.journal_dir = Path(journal_dir) if journal_dir is not None else None
+        self.shard_index, self.shard_count = shard
+        self.context = context or {}
+        self.replay_only = replay_only
+        self.meta = meta or {}
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.skipped_other_shard = 0
+        self.missing = 0
+        self.resumed = 0
+        self._fh = None
+
+        if self.journal_dir is not None:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            for entry in iter_journal(self.journal_dir):
+                # Failed points are journaled for the record but retried on rerun
+                if "error" not in entry["record"]:
+                    self.done[entry["key"]] = entry["record"]
+            if not replay_only:
+                path = self.journal_dir / f"shard_{self.shard_index}_of_{self.shard_count}.jsonl"
+                self._fh = open(path, "a")
+
+    def key(self, point: Dict[str, Any]) -> str:
+        return point_key(point, self.context)
+
+    def owns(self, key: str) -> bool:
+        """Deterministic shard assignment from the content hash."""
+        return int(key[:12], 16) % self.shard_count == self.shard_index
+
+    def claim(self, point: Dict[str, Any], measurements: List[Dict[str, Any]]) -> bool:
+        """
+        Return True if this worker should measure ``point``.
+
+        Points already in the journal are replayed into ``measurements`` and
+        return False; points owned by another shard also return False.
+        """
+        key = self.key(point)
+        if key in self.done:
+            measurements.append(self.done[key])
+            self.resumed += 1
+            return False
+        if self.replay_only:
+            self.missing += 1
+            return False
+        if not self.owns(key):
+            self.skipped_other_shard += 1
+            return False
+        return True
+
+    def complete(self, point: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+        """Append a finished point to the journal and return ``record`` unchanged."""
+        if self._fh is not None:
+            key = self.key(point)
+            entry = {"key": key, "point": point, "record": record, **self.meta}
+            self._fh.write(json.dumps(entry) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            if "error" not in record:
+                self.done[key] = record
+        return record
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def journal_context(exp_spec: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    """
+    Measurement context folded into every point hash of an experiment. The
+    device is left out: it would give shards on different GPUs (and merge)
+    different key spaces.
+    """
+    context = {k: exp_spec.get(k) for k in SAMPLING_KEYS}
+    context["seed"] = seed
+    return context
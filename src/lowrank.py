@@ -0,0 +1,139 @@
+"""Rank-r matrix factorization engine shared by the SVD compression scripts.
+
+All compression paths only keep the top-r singular triplets, so computing a
+full thin SVD of e.g. a 14336x4096 MLP weight wastes most of the wall time.
+``low_rank_factorize`` offers three methods:
+
+- ``exact``: full thin SVD, truncated (reference)
+- ``randomized``: Halko-Martinsson-Tropp range finder with power iterations
+- ``lanczos``: Golub-Kahan-Lanczos bidiagonalization with full reorthogonalization
+
+Every method returns factors of the best rank-r approximation within its
+search subspace (``U S Vt = P_U A``), so the relative Frobenius error can be
+reported exactly from the singular values without forming ``U S Vt``.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+
+
+LOW_RANK_METHODS = ("exact", "randomized", "lanczos")
+
+
+def _generator(device: torch.device, seed: int) -> torch.Generator:
+    return torch.Generator(device=device).manual_seed(seed)
+
+
+def _randomized_basis(A: torch.Tensor, size: int, n_iter: int, seed: int) -> torch.Tensor:
+    """Orthonormal basis [..., m, size] for the dominant column space of A."""
+    n = A.shape[-1]
+    omega = torch.randn(*A.shape[:-2], n, size, generator=_generator(A.device, seed), device=A.device, dtype=A.dtype)
+    Q, _ = torch.linalg.qr(A @ omega)
+    # Power iterations sharpen the spectrum decay; QR after each product keeps them stable
+    for _ in range(n_iter):
+        Z, _ = torch.linalg.qr(A.mT @ Q)
+        Q, _ = torch.linalg.qr(A @ Z)
+    return Q
+
+
+def _lanczos_basis(A: torch.Tensor, size: int, seed: int) -> torch.Tensor:
+    """Left Krylov basis [m, size] from Golub-Kahan-Lanczos bidiagonalization of a 2D A."""
+    m, n = A.shape
+    U = A.new_zeros(m, size)
+    V = A.new_zeros(n, size)
+    v = torch.randn(n, generator=_generator(A.device, seed), device=A.device, dtype=A.dtype)
+    v = v / v.norm()
+    u_prev = A.new_zeros(m)
+    beta = 0.0
+    steps = 0
+    for j in range(size):
+        V[:, j] = v
+        u = A @ v - beta * u_prev
+        # Full reorthogonalization: plain Lanczos loses orthogonality within a few dozen steps
+        u -= U[:, :j] @ (U[:, :j].T @ u)
+        alpha = u.norm()
+        if alpha <= torch.finfo(A.dtype).eps:
+            break
+        u = u / alpha
+        U[:, j] = u
+        steps = j + 1
+        v = A.T @ u - alpha * v
+        v -= V[:, :j + 1] @ (V[:, :j + 1].T @ v)
+        beta = v.norm()
+        if beta <= torch.finfo(A.dtype).eps:
+            break
+        v = v / beta
+        u_prev = u
+    return U[:, :steps]
+
+
+def low_rank_factorize(
+    A: torch.Tensor,
+    rank: int,
+    method: str = "exact",
+    oversample: int = 10,
+    n_iter: int = 2,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Rank-``rank`` factorization ``A ~= U @ diag(S) @ Vt``.
+
+    ``A`` may carry leading batch dimensions (e.g. ``[G, group_dim, in]`` for
+    per-head decompositions). Computation runs in float32 (float64 inputs stay
+    float64). ``oversample`` extra basis vectors (and, for ``randomized``,
+    ``n_iter`` power iterations) trade time for accuracy; ``seed`` makes the
+    random start deterministic. Returns ``U [..., m, r]``, ``S [..., r]``, ``Vt [..., r, n]``,
+    and ``rel_error``: ``||A - U S Vt||_F / ||A||_F`` per matrix.
+    """
+    if method not in LOW_RANK_METHODS:
+        raise ValueError(f"Unknown low-rank method '{method}', expected one of {LOW_RANK_METHODS}")
+    if A.dtype != torch.float64:
+        A = A.to(torch.float32)
+    m, n = A.shape[-2:]
+    rank = min(rank, m, n)
+    # Lanczos Ritz vectors converge from the top of the spectrum down, so the
+    # Krylov space needs roughly twice the target rank to resolve the r-th triplet
+    size = min((2 * rank if method == "lanczos" else rank) + oversample, m, n)
+
+    if method == "exact" or size == min(m, n):
+        # The search subspace would be the whole space: a thin SVD is cheaper
+        U, S, Vt = torch.linalg.svd(A, full_matrices=False)
+    else:
+        if method == "randomized":
+            Q = _randomized_basis(A, size, n_iter, seed)
+        else:
+            flat = A.reshape(-1, m, n)
+            bases = [_lanczos_basis(a, size, seed) for a in flat]
+            width = min(b.shape[-1] for b in bases)
+            Q = torch.stack([b[:, :width] for b in bases]).reshape(*A.shape[:-2], m, width)
+        # SVD of the small projected matrix gives the best rank-r approximation in span(Q)
+        Ub, S, Vt = torch.linalg.svd(Q.mT @ A, full_matrices=False)
+        U = Q @ Ub
+
+    U, S, Vt = U[..., :rank], S[..., :rank], Vt[..., :rank, :]
+
+    return {"U": U, "S": S, "Vt": Vt, "rel_error": rel_frobenius_error(A, S), "method": method}
+
+
+def rel_frobenius_error(A: torch.Tensor, S: torch.Tensor) -> torch.Tensor:
+    """
+    ``||A - U S Vt||_F / ||A||_F`` for factors from ``low_rank_factorize``
+    (or any prefix of them, e.g. ``S[..., :r]`` for a smaller rank).
+
+    ``U S Vt`` is an orthogonal projection of A, so ``||A - P_U A||^2 = ||A||^2 - sum(S^2)``.
+    """
+    norm_sq = A.double().square().sum(dim=(-2, -1))
+    residual_sq = (norm_sq - S.double().square().sum(dim=-1)).clamp(min=0)
+    return torch.sqrt(residual_sq / norm_sq.clamp(min=torch.finfo(torch.float64).tiny))
+
+
+def sqrt_split(
+    U: torch.Tensor, S: torch.Tensor, Vt: torch.Tensor, dtype: Optional[torch.dtype] = None
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Fuse singular values as ``L = U sqrt(S)`` (out x r) and ``R = sqrt(S) Vt`` (r x in)."""
+    sqrt_s = torch.sqrt(S)
+    L = U * sqrt_s.unsqueeze(-2)
+    R = sqrt_s.unsqueeze(-1) * Vt
+    if dtype is not None:
+        L, R = L.to(dtype), R.to(dtype)
+    return L, R
@@ -1,61 +1,48 @@
-"""High-precision CUDA event timing and performance metrics."""
+"""High-precision kernel timing and performance metrics."""
+import time
 import torch
-from typing import List, Dict, Callable
+from typing import Any, List, Dict, Callable, Optional
 import numpy as np
 
-from .utils import compute_statistics
+from .utils import compute_statistics, median_confidence_interval, detect_change_point
+from .timers import get_timer, synchronize
 
 
 def benchmark_kernel(
     kernel_fn: Callable,
     warmup_iterations: int = 10,
     measurement_iterations: int = 100,
-    device: str = "cuda:0"
+    device: str = "cuda:0",
+    timer: str = "auto",
 ) -> Dict[str, float]:
     """
-    Benchmark a CUDA kernel using CUDA events for high-precision timing.
+    Benchmark a kernel with the selected timer backend.
     
     Args:
         kernel_fn: Function to benchmark (should be a no-arg callable that performs the operation)
         warmup_iterations: Number of warmup iterations
         measurement_iterations: Number of measurement iterations
-        device: CUDA device string
+        device: Device string (e.g. "cuda:0" or "cpu")
+        timer: Timer backend name from ``src.timers.TIMER_BACKENDS`` or "auto"
+            (CUDA events on GPU, perf_counter on CPU)
     
     Returns:
         Dictionary with timing statistics (in milliseconds)
     """
-    if not torch.cuda.is_available():
-        raise RuntimeError("CUDA not available")
+    _, time_fn = get_timer(timer, device)
     
     # Synchronize before starting
-    torch.cuda.synchronize(device)
+    synchronize(device)
     
     # Warmup
     for _ in range(warmup_iterations):
         kernel_fn()
     
     # Synchronize after warmup
-    torch.cuda.synchronize(device)
+    synchronize(device)
     
     # Measurement
-    events = []
-    for _ in range(measurement_iterations):
-        start_event = torch.cuda.Event(enable_timing=True)
-        end_event = torch.cuda.Event(enable_timing=True)
-        
-        start_event.record()
-        kernel_fn()
-        end_event.record()
-        
-        events.append((start_event, end_event))
-    
-    # Synchronize and extract timings
-    torch.cuda.synchronize(device)
-    
-    times_ms = []
-    for start_event, end_event in events:
-        elapsed_ms = start_event.elapsed_time(end_event)
-        times_ms.append(elapsed_ms)
+    times_ms = time_fn(kernel_fn, measurement_iterations, device)
     
     # Compute statistics
     stats = compute_statistics(times_ms)
@@ -67,6 +54,99 @@ def benchmark_kernel(
     return stats
 
 
+DEFAULT_ADAPTIVE_CONFIG = {
+    "target_rel_ci": 0.01,   # Stop once 95% CI half-width of the median is within 1%
+    "confidence": 0.95,
+    "time_budget_s": 30.0,   # Hard wall-clock cap per measured point (warmup included)
+    "min_samples": 30,       # Never stop with fewer steady-state samples than this
+    "batch": 10,             # Iterations timed between convergence checks
+    "warmup_chunk": 5,       # Iterations per warmup detection step
+    "min_steady": 10,        # Samples required after the change point to end warmup
+}
+
+
+def benchmark_kernel_adaptive(
+    kernel_fn: Callable,
+    max_warmup_iterations: int = 50,
+    max_measurement_iterations: int = 600,
+    device: str = "cuda:0",
+    timer: str = "auto",
+    adaptive: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Benchmark a kernel, sampling only until the median has converged.
+    
+    Warmup iterations are timed in chunks and end as soon as change-point
+    detection shows at least ``min_steady`` samples after the last level shift
+    (or ``max_warmup_iterations`` is reached). Measurement then proceeds in
+    batches until the relative CI of the median drops below ``target_rel_ci``,
+    the time budget runs out, or ``max_measurement_iterations`` is reached.
+    
+    Args:
+        kernel_fn: No-arg callable that performs the operation
+        max_warmup_iterations: Upper bound on warmup iterations
+        max_measurement_iterations: Upper bound on measured iterations
+        device: Device string (e.g. "cuda:0" or "cpu")
+        timer: Timer backend name (see ``benchmark_kernel``)
+        adaptive: Overrides for ``DEFAULT_ADAPTIVE_CONFIG``
+    
+    Returns:
+        Dictionary with timing statistics (in milliseconds), the achieved
+        confidence interval and a description of why sampling stopped
+    """
+    cfg = {**DEFAULT_ADAPTIVE_CONFIG, **(adaptive or {})}
+    _, time_fn = get_timer(timer, device)
+    start = time.perf_counter()
+    
+    def out_of_time():
+        return time.perf_counter() - start >= cfg["time_budget_s"]
+    
+    synchronize(device)
+    
+    # Warmup: time chunks until the series shows a settled steady state
+    warmup_times = []
+    change_point = 0
+    while len(warmup_times) < max_warmup_iterations and not out_of_time():
+        chunk = min(cfg["warmup_chunk"], max_warmup_iterations - len(warmup_times))
+        warmup_times.extend(time_fn(kernel_fn, chunk, device))
+        change_point = detect_change_point(warmup_times)
+        if len(warmup_times) - change_point >= cfg["min_steady"]:
+            break
+    
+    # Steady-state warmup samples are valid measurements
+    times_ms = warmup_times[change_point:]
+    ci = median_confidence_interval(times_ms, cfg["confidence"])
+    
+    stop_reason = "max_samples"
+    while len(times_ms) < max_measurement_iterations:
+        if len(times_ms) >= cfg["min_samples"] and ci["rel_half_width"] <= cfg["target_rel_ci"]:
+            stop_reason = "converged"
+            break
+        if out_of_time():
+            stop_reason = "time_budget"
+            break
+        chunk = min(cfg["batch"], max_measurement_iterations - len(times_ms))
+        times_ms.extend(time_fn(kernel_fn, chunk, device))
+        ci = median_confidence_interval(times_ms, cfg["confidence"])
+    else:
+        if len(times_ms) >= cfg["min_samples"] and ci["rel_half_width"] <= cfg["target_rel_ci"]:
+            stop_reason = "converged"
+    
+    stats = compute_statistics(times_ms)
+    stats["times_ms"] = times_ms
+    stats["times_s"] = [t / 1000.0 for t in times_ms]
+    stats["ci"] = ci
+    stats["adaptive"] = {
+        "warmup_iterations": len(warmup_times),
+        "warmup_change_point": change_point,
+        "stop_reason": stop_reason,
+        "elapsed_s": time.perf_counter() - start,
+        "config": cfg,
+    }
+    
+    return stats
+
+
 def compute_gemm_tflops(m: int, n: int, k: int, time_s: float) -> float:
     """Compute achieved TFLOPs for GEMM operation."""
     # GEMM: C = A @ B where A is (M, K) and B is (K, N)
@@ -96,6 +176,7 @@ def benchmark_gemm(
     b: torch.Tensor,
     warmup_iterations: int = 10,
     measurement_iterations: int = 100,
+    timer: str = "auto",
 ) -> Dict:
     """
     Benchmark a GEMM operation and return comprehensive metrics.
@@ -105,6 +186,7 @@ def benchmark_gemm(
         b: Right tensor (K, N)
         warmup_iterations: Number of warmup iterations
         measurement_iterations: Number of measurement iterations
+        timer: Timer backend name (see ``benchmark_kernel``)
     
     Returns:
         Dictionary with timing and performance metrics
@@ -124,7 +206,8 @@ def benchmark_gemm(
         kernel_fn,
         warmup_iterations=warmup_iterations,
         measurement_iterations=measurement_iterations,
-        device=str(a.device)
+        device=str(a.device),
+        timer=timer,
     )
     
     # Compute performance metrics for mean time
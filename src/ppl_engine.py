@@ -0,0 +1,251 @@
+"""Batched perplexity evaluation shared by the eval scripts.
+
+Every script used to score one window per forward pass with batch size 1,
+materialize the full ``[B, T, vocab]`` logits (and their fp32 copy inside
+the loss) and, for the stride-half sliding window, recompute every
+overlapping context token. ``perplexity`` instead:
+
+- packs windows into batches of up to ``max_batch_tokens`` tokens,
+- runs the backbone once and applies the LM head + cross entropy in chunks
+  of ``loss_chunk_tokens`` positions, so only ``[chunk, vocab]`` fp32
+  logits exist at any time,
+- in ``strided`` mode keeps the overlapping context as ``past_key_values``
+  and only feeds the ``stride`` new tokens per step.
+
+Modes (``stride`` selects the mode):
+
+- ``blocks`` (``stride=None``): non-overlapping windows of ``seq_len``
+  tokens, each scoring its own ``seq_len - 1`` next-token predictions
+  (the SVD-LLM/ASVD protocol). A 2D ``input_ids`` with more than one row is
+  taken as pre-cut windows.
+- ``strided``: every scored token sees between ``seq_len - stride`` and
+  ``seq_len - 1`` tokens of context, as in the Hugging Face sliding-window
+  recipe. The stream is split into independent chains of at most
+  ``chain_len`` positions (default ``max_position_embeddings``) that are
+  run in lockstep as a batch. Within a chain the cached context keys were
+  computed with their own preceding context rather than re-encoded from
+  the window start, so numbers can differ marginally from the recompute
+  recipe.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+
+PPL_MODES = ("blocks", "strided")
+
+IGNORE_INDEX = -100
+
+
+def _split_model(model) -> Tuple[Optional[torch.nn.Module], Optional[torch.nn.Module]]:
+    """
+    ``(backbone, lm_head)`` of a Hugging Face causal LM, or ``(None, None)``
+    when logits cannot be formed chunk by chunk (non-HF model, or a config
+    that post-processes logits).
+    """
+    config = getattr(model, "config", None)
+    if getattr(config, "final_logit_softcapping", None) or getattr(config, "logit_scale", None):
+        return None, None
+    get_head = getattr(model, "get_output_embeddings", None)
+    head = get_head() if get_head is not None else None
+    backbone = getattr(model, "base_model", None)
+    if head is None or backbone is None or backbone is model:
+        return None, None
+    return backbone, head
+
+
+def _model_device(model) -> torch.device:
+    device = getattr(model, "device", None)
+    return device if isinstance(device, torch.device) else next(model.parameters()).device
+
+
+def _keep_last(past, n: int):
+    """Truncate a KV cache (legacy tuples or ``DynamicCache``) to its last ``n`` positions."""
+    if isinstance(past, (tuple, list)):
+        return tuple(tuple(t[..., -n:, :] for t in layer) for layer in past)
+    if hasattr(past, "layers"):
+        # transformers >= 4.56: one cache object per layer
+        for layer in past.layers:
+            layer.keys = layer.keys[..., -n:, :]
+            layer.values = layer.values[..., -n:, :]
+    else:
+        past.key_cache = [k[..., -n:, :] for k in past.key_cache]
+        past.value_cache = [v[..., -n:, :] for v in past.value_cache]
+        if hasattr(past, "_seen_tokens"):
+            past._seen_tokens = n
+    return past
+
+
+def score_tokens(
+    model,
+    input_ids: torch.Tensor,
+    targets: torch.Tensor,
+    past_key_values=None,
+    position_ids: Optional[torch.Tensor] = None,
+    use_cache: bool = False,
+    loss_chunk_tokens: int = 2048,
+) -> Tuple[torch.Tensor, torch.Tensor, Any]:
+    """
+    Forward ``input_ids`` ``[B, T]`` and sum the NLL of ``targets`` ``[B, T]``
+    (``IGNORE_INDEX`` = not scored) per row.
+
+    Returns ``(nll [B] float64, counts [B], past_key_values)``.
+    """
+    backbone, head = _split_model(model)
+    kwargs = {"use_cache": use_cache}
+    if past_key_values is not None:
+        kwargs["past_key_values"] = past_key_values
+    if position_ids is not None:
+        kwargs["position_ids"] = position_ids
+    out = (backbone or model)(input_ids=input_ids, **kwargs)
+    hidden = out[0]
+
+    batch, length = targets.shape
+    targets = targets.to(hidden.device)
+    step = max(1, loss_chunk_tokens // batch)
+    nll = torch.zeros(batch, dtype=torch.float64, device=hidden.device)
+    for start in range(0, length, step):
+        logits = hidden[:, start:start + step]
+        if head is not None:
+            logits = head(logits)
+        loss = F.cross_entropy(
+            logits.float().flatten(0, 1), targets[:, start:start + step].flatten(),
+            ignore_index=IGNORE_INDEX, reduction="none",
+        )
+        nll += loss.view(batch, -1).sum(dim=1, dtype=torch.float64)
+    counts = (targets != IGNORE_INDEX).sum(dim=1)
+    return nll, counts, getattr(out, "past_key_values", None) if use_cache else None
+
+
+def _windows(input_ids: torch.Tensor, seq_len: int) -> List[torch.Tensor]:
+    if input_ids.dim() == 2 and input_ids.shape[0] > 1:
+        return list(input_ids)
+    stream = input_ids.reshape(-1)
+    return [w for w in stream.split(seq_len) if w.numel() >= 2]
+
+
+def _batches(lengths: List[int], per_batch: int) -> List[Tuple[int, int]]:
+    """``[start, end)`` runs of consecutive equal lengths, at most ``per_batch`` long."""
+    runs, start = [], 0
+    for i in range(1, len(lengths) + 1):
+        if i == len(lengths) or lengths[i] != lengths[start] or i - start == per_batch:
+            runs.append((start, i))
+            start = i
+    return runs
+
+
+def _chains(n_tokens: int, seq_len: int, stride: int, chain_len: int) -> List[Tuple[int, int, int]]:
+    """
+    ``(start, first_scored, end)`` token slices covering every target of the
+    stream once, each spanning at most ``chain_len`` inputs. Chains start on
+    the ``stride`` grid of the sliding windows, so a chain after the first
+    re-reads exactly the ``seq_len - stride`` context tokens its first
+    window would have.
+    """
+    steps = max(0, (chain_len + 1 - seq_len) // stride)
+    chains, owned, start = [], 1, 0
+    while owned < n_tokens:
+        end = min(n_tokens, start + seq_len + steps * stride)
+        chains.append((start, owned, end))
+        owned, start = end, end - seq_len + stride
+    return chains
+
+
+def _result(mode: str, nll: float, tokens: int, **extra) -> Dict[str, Any]:
+    ppl = math.exp(nll / tokens) if tokens else None
+    return {"mode": mode, "ppl": ppl, "nll": nll, "tokens": tokens, **extra}
+
+
+@torch.no_grad()
+def perplexity(
+    model,
+    input_ids: torch.Tensor,
+    seq_len: int = 2048,
+    stride: Optional[int] = None,
+    max_batch_tokens: int = 8192,
+    loss_chunk_tokens: int = 2048,
+    chain_len: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Perplexity of ``model`` on ``input_ids`` (a token stream ``[N]``/``[1, N]``,
+    or pre-cut windows ``[n, L]``; any integer dtype, e.g. a uint32
+    ``TokenCorpus`` view, which is only copied batch by batch).
+
+    ``stride=None`` scores non-overlapping windows (``blocks``); ``stride <
+    seq_len`` runs the KV-reusing sliding window (``strided``). ``limit`` caps
+    the number of windows in ``blocks`` mode. Windows (or chains) whose loss is
+    not finite are dropped and counted in ``skipped``.
+
+    Returns ``{"mode", "ppl", "nll", "tokens", "windows", "skipped",
+    "forward_tokens", "seconds"}``; ``tokens`` counts scored predictions and
+    ``forward_tokens`` the tokens actually fed through the model.
+    """
+    t0 = time.time()
+    device = _model_device(model)
+    if stride is not None and 0 < stride < seq_len:
+        return _strided(model, input_ids, seq_len, stride, max_batch_tokens, loss_chunk_tokens, chain_len, device, t0)
+
+    windows = _windows(input_ids, seq_len)[:limit]
+    per_batch = max(1, max_batch_tokens // max((w.numel() for w in windows), default=1))
+    nll, tokens, fed, skipped = 0.0, 0, 0, 0
+    for start, end in _batches([w.numel() for w in windows], per_batch):
+        batch = torch.stack(windows[start:end]).to(device, torch.long)
+        row_nll, counts, _ = score_tokens(model, batch[:, :-1], batch[:, 1:], loss_chunk_tokens=loss_chunk_tokens)
+        ok = torch.isfinite(row_nll)
+        nll += row_nll[ok].sum().item()
+        tokens += int(counts[ok.to(counts.device)].sum())
+        fed += batch[:, :-1].numel()
+        skipped += int((~ok).sum())
+    return _result("blocks", nll, tokens, seq_len=seq_len, windows=len(windows), skipped=skipped,
+                   forward_tokens=fed, seconds=time.time() - t0)
+
+
+def _strided(model, input_ids, seq_len, stride, max_batch_tokens, loss_chunk_tokens, chain_len, device, t0):
+    stream = input_ids.reshape(-1)
+    keep = seq_len - 1 - stride
+    if chain_len is None:
+        chain_len = getattr(getattr(model, "config", None), "max_position_embeddings", None) or 4 * seq_len
+    chain_len = max(chain_len, seq_len)
+    chains = _chains(stream.numel(), seq_len, stride, chain_len)
+    per_batch = max(1, max_batch_tokens // seq_len)
+
+    nll, tokens, fed, skipped = 0.0, 0, 0, 0
+    for first, last in _batches([end - start for start, _, end in chains], per_batch):
+        group = chains[first:last]
+        toks = torch.stack([stream[start:end] for start, _, end in group]).to(device, torch.long)
+        inputs, targets = toks[:, :-1], toks[:, 1:].clone()
+        for row, (start, owned, _) in enumerate(group):
+            targets[row, :owned - start - 1] = IGNORE_INDEX
+
+        # A window of seq_len tokens holds seq_len - 1 inputs: the first step
+        # feeds one window, every later step `stride` new inputs on top of the
+        # cached last `keep` ones
+        row_nll = torch.zeros(len(group), dtype=torch.float64, device=device)
+        counts = torch.zeros(len(group), dtype=torch.long, device=device)
+        past, a = None, 0
+        length = inputs.shape[1]
+        while a < length:
+            b = min(length, a + (seq_len - 1 if a == 0 else stride))
+            if past is not None:
+                past = _keep_last(past, keep) if keep else None
+            positions = torch.arange(a, b, device=device).expand(len(group), -1)
+            step_nll, step_counts, past = score_tokens(
+                model, inputs[:, a:b], targets[:, a:b], past, positions,
+                use_cache=True, loss_chunk_tokens=loss_chunk_tokens,
+            )
+            row_nll += step_nll.to(device)
+            counts += step_counts.to(device)
+            fed += inputs[:, a:b].numel()
+            a = b
+        del past
+
+        ok = torch.isfinite(row_nll)
+        nll += row_nll[ok].sum().item()
+        tokens += int(counts[ok].sum())
+        skipped += int((~ok).sum())
+    return _result("strided", nll, tokens, seq_len=seq_len, stride=stride, chain_len=chain_len,
+                   windows=len(chains), skipped=skipped, forward_tokens=fed, seconds=time.time() - t0)
@@ -0,0 +1,358 @@
+"""GAC rank allocation as a multiple-choice knapsack.
+
+Every projection picks one aligned rank from a few candidates near its ideal
+(pre-rounding) rank; the value of a choice is ``f_i * (r_i - r*_i)`` (round
+sensitive projections up, insensitive ones down) and its cost is the
+parameter count ``r_i * unit_cost_i``. ``solve_multichoice_knapsack`` is the
+exact-budget DP over integer budget units: each stage is one vectorized max
+over the candidate-shifted copies of the previous DP row, and the chosen
+candidate index is kept in compact ``uint8``/``int16`` rows for
+backtracking. Stages only span the budget band reachable so far. Because ``dp[b]`` is the best value at exactly ``b`` units,
+one solve answers every budget up to its capacity.
+"""
+import csv
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+def aligned_candidates(ideal: float, align: int, search_radius: int, max_rank: int) -> List[int]:
+    """Multiples of ``align`` within ``search_radius`` steps of ``ideal``, clipped to [align, max_rank]."""
+    ideal_aligned = round(ideal / align) * align
+    candidates = [
+        c for c in (ideal_aligned + offset * align for offset in range(-search_radius, search_radius + 1))
+        if align <= c <= max_rank
+    ]
+    return candidates or [max(align, min(max_rank, ideal_aligned))]
+
+
+def solve_multichoice_knapsack(
+    values: Sequence[np.ndarray],
+    costs: Sequence[np.ndarray],
+    capacity: int,
+    start: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Exact-budget multiple-choice knapsack.
+
+    ``values[i]`` / ``costs[i]`` (integer budget units) describe item ``i``'s
+    candidates; exactly one candidate is taken per item. Returns ``dp`` with
+    ``dp[b]`` the best total value using exactly ``b <= capacity`` units
+    (``-inf`` if unreachable), and per-item ``choice`` rows holding the
+    candidate index taken in that optimum. Ties keep the earliest candidate.
+
+    After ``i`` items only ``b`` in ``[sum of min costs, sum of max costs]`` is
+    reachable, so each stage (and its choice row, stored from ``offsets[i]``)
+    only spans that band (``lo``, ``band``) rather than the whole budget axis.
+    ``start`` (a previous result) continues that solve with more items.
+    """
+    max_candidates = max((len(v) for v in values), default=1)
+    index_dtype = np.uint8 if max_candidates <= 256 else np.int16
+    if start is None:
+        lo, dp, choice, offsets = 0, np.zeros(1), [], []
+    else:
+        lo, dp, choice, offsets = start["lo"], start["band"], list(start["choice"]), list(start["offsets"])
+    dp = dp[:max(capacity - lo + 1, 0)]
+    for v, c in zip(values, costs):
+        c_min = int(c.min())
+        new_lo = lo + c_min
+        width = min(capacity, lo + len(dp) - 1 + int(c.max())) - new_lo + 1
+        if width <= 0 or len(dp) == 0:
+            return {"dp": np.full(capacity + 1, -np.inf), "choice": choice, "offsets": offsets,
+                    "lo": new_lo, "band": np.empty(0)}
+        stage = np.full((len(v), width), -np.inf)
+        for j in range(len(v)):
+            # dp[lo + t] + candidate j lands on new_lo + shift + t
+            shift = int(c[j]) - c_min
+            n = min(len(dp), width - shift)
+            if n > 0:
+                np.add(dp[:n], v[j], out=stage[j, shift:shift + n])
+        best = np.argmax(stage, axis=0)
+        choice.append(best.astype(index_dtype))
+        offsets.append(new_lo)
+        dp = stage.max(axis=0)
+        lo = new_lo
+
+    full = np.full(capacity + 1, -np.inf)
+    if lo <= capacity:
+        full[lo:lo + len(dp)] = dp
+    return {"dp": full, "choice": choice, "offsets": offsets, "lo": lo, "band": dp}
+
+
+def backtrack(
+    choice: Sequence[np.ndarray], offsets: Sequence[int], costs: Sequence[np.ndarray], b: int
+) -> List[int]:
+    """Candidate index per item for the optimum ending at ``b`` units."""
+    picks = [0] * len(costs)
+    for i in range(len(costs) - 1, -1, -1):
+        j = int(choice[i][b - offsets[i]])
+        picks[i] = j
+        b -= int(costs[i][j])
+    return picks
+
+
+def best_budget_index(dp: np.ndarray, max_b: int) -> Optional[int]:
+    """The largest reachable ``b <= max_b`` (spend as much budget as possible), or ``None``."""
+    reachable = np.flatnonzero(dp[:max(min(max_b, len(dp) - 1), -1) + 1] > -np.inf)
+    return int(reachable[-1]) if len(reachable) else None
+
+
+def allocate_aligned_ranks(
+    ideal_ranks: Dict[Hashable, float],
+    fisher: Dict[Hashable, float],
+    unit_costs: Dict[Hashable, int],
+    max_ranks: Dict[Hashable, int],
+    budget: int,
+    align: int = 8,
+    search_radius: int = 3,
+    budget_unit: Optional[int] = None,
+    max_units: Optional[int] = None,
+    latency_fn: Optional[Callable[[Hashable, np.ndarray], np.ndarray]] = None,
+    latency_weight: float = 0.0,
+) -> Optional[Dict[Hashable, int]]:
+    """
+    GAC DP over all projections in ``ideal_ranks`` (in iteration order).
+
+    ``unit_costs[key]`` is the parameter cost of one rank of that projection
+    (``m + n`` for an ``m x n`` weight), so projections of different shapes
+    share one budget. Budgets are discretized in ``budget_unit`` parameters
+    (default ``align * min(unit_costs)``). Returns ``{key: rank}`` or ``None``
+    when no allocation fits or the DP would exceed ``max_units`` columns.
+
+    With ``latency_fn(key, ranks) -> predicted latency`` the objective becomes
+    the Lagrangian ``sum f_i (r_i - r*_i) - latency_weight * sum latency_i(r_i)``.
+    """
+    keys = list(ideal_ranks)
+    if budget_unit is None:
+        budget_unit = align * min(unit_costs[k] for k in keys)
+    max_b = budget // budget_unit
+    if max_units is not None and max_b > max_units:
+        return None
+
+    candidates, values, costs = [], [], []
+    for k in keys:
+        cands = np.array(aligned_candidates(ideal_ranks[k], align, search_radius, max_ranks[k]))
+        candidates.append(cands)
+        value = fisher.get(k, 1.0) * (cands - ideal_ranks[k])
+        if latency_fn is not None and latency_weight:
+            value = value - latency_weight * np.asarray(latency_fn(k, cands), dtype=np.float64)
+        values.append(value)
+        costs.append((cands * unit_costs[k]) // budget_unit)
+
+    solved = solve_multichoice_knapsack(values, costs, max_b)
+    best_b = best_budget_index(solved["dp"], max_b)
+    if best_b is None:
+        return None
+    picks = backtrack(solved["choice"], solved["offsets"], costs, best_b)
+    return {k: int(cands[j]) for k, cands, j in zip(keys, candidates, picks)}
+
+
+def sweep_aligned_ranks(
+    ideal_by_budget: Dict[int, Dict[Hashable, float]],
+    fisher: Dict[Hashable, float],
+    unit_costs: Dict[Hashable, int],
+    max_ranks: Dict[Hashable, int],
+    align: int = 8,
+    search_radius: int = 3,
+) -> Dict[int, Optional[Dict[Hashable, int]]]:
+    """
+    ``allocate_aligned_ranks`` for many budgets (``{budget: ideal_ranks}``),
+    sharing one DP across them.
+
+    Candidates are expressed as offsets ``o`` from each projection's aligned
+    ideal rank ``a_i``: rank ``a_i + o * align`` costs ``o * align * unit_cost_i``
+    on top of the base allocation and is worth ``f_i * o * align`` on top of a
+    budget-specific constant. Projections whose offset window is the same at
+    every budget (i.e. not clipped at ``align`` / ``max_rank`` differently)
+    form one knapsack shared by all budgets, solved once up to the largest
+    slack ``budget - base``; each budget then only continues that DP with its
+    clipped projections and reads off its own slack. Costs are exact (units
+    of ``align * gcd(unit_costs)``) rather than floored per candidate.
+    Returns ``{budget: {key: rank} or None}``.
+    """
+    budgets = list(ideal_by_budget)
+    keys = list(ideal_by_budget[budgets[0]])
+    unit = int(align * np.gcd.reduce([unit_costs[k] for k in keys]))
+    step_units = [align * unit_costs[k] // unit for k in keys]
+
+    bases, windows, slacks = {}, {}, {}
+    for budget in budgets:
+        ideal = ideal_by_budget[budget]
+        bases[budget] = [round(ideal[k] / align) * align for k in keys]
+        windows[budget] = [
+            np.array([(c - base) // align for c in aligned_candidates(ideal[k], align, search_radius, max_ranks[k])])
+            for k, base in zip(keys, bases[budget])
+        ]
+        floor_cost = sum(
+            (base + int(o.min()) * align) * unit_costs[k]
+            for k, base, o in zip(keys, bases[budget], windows[budget])
+        )
+        slacks[budget] = (budget - floor_cost) // unit
+
+    def item(i, o):
+        return fisher.get(keys[i], 1.0) * align * o, (o - o.min()) * step_units[i]
+
+    stable = [
+        i for i in range(len(keys))
+        if all(np.array_equal(windows[b][i], windows[budgets[0]][i]) for b in budgets)
+    ]
+    varying = [i for i in range(len(keys)) if i not in set(stable)]
+    capacity = max(slacks.values())
+    shared_items = [item(i, windows[budgets[0]][i]) for i in stable]
+    shared = solve_multichoice_knapsack(
+        [v for v, _ in shared_items], [c for _, c in shared_items], max(capacity, 0)
+    )
+
+    results: Dict[int, Optional[Dict[Hashable, int]]] = {}
+    for budget in budgets:
+        if slacks[budget] < 0:
+            results[budget] = None
+            continue
+        tail = [item(i, windows[budget][i]) for i in varying]
+        solved = solve_multichoice_knapsack(
+            [v for v, _ in tail], [c for _, c in tail], slacks[budget], start=shared
+        ) if varying else shared
+        best_b = best_budget_index(solved["dp"], slacks[budget])
+        if best_b is None:
+            results[budget] = None
+            continue
+        order = stable + varying
+        costs = [c for _, c in shared_items] + [c for _, c in tail]
+        picks = backtrack(solved["choice"], solved["offsets"], costs, best_b)
+        ranks = {}
+        for i, j in zip(order, picks):
+            ranks[keys[i]] = int(bases[budget][i] + windows[budget][i][j] * align)
+        results[budget] = {k: ranks[k] for k in keys}
+    return results
+
+
+def allocate_latency_budgeted(
+    ideal_ranks: Dict[Hashable, float],
+    fisher: Dict[Hashable, float],
+    unit_costs: Dict[Hashable, int],
+    max_ranks: Dict[Hashable, int],
+    budget: int,
+    latency_fn: Callable[[Hashable, np.ndarray], np.ndarray],
+    latency_budget: float,
+    iters: int = 30,
+    **kwargs,
+) -> Optional[Dict[Hashable, int]]:
+    """
+    ``allocate_aligned_ranks`` under both the parameter budget and
+    ``sum latency_i(r_i) <= latency_budget``.
+
+    The latency constraint is handled by its Lagrangian: ``latency_weight`` is
+    bisected (geometrically) to the smallest value whose allocation meets the
+    latency budget. Returns ``None`` if even the most latency-averse
+    allocation misses it.
+    """
+    def solve(weight):
+        ranks = allocate_aligned_ranks(
+            ideal_ranks, fisher, unit_costs, max_ranks, budget,
+            latency_fn=latency_fn, latency_weight=weight, **kwargs,
+        )
+        return ranks, (predicted_latency(ranks, latency_fn) if ranks is not None else np.inf)
+
+    ranks, latency = solve(0.0)
+    if latency <= latency_budget:
+        return ranks
+    # Bracket: grow the weight until the latency budget is met
+    lo, hi = 0.0, 1e-6
+    for _ in range(60):
+        ranks, latency = solve(hi)
+        if latency <= latency_budget:
+            break
+        lo, hi = hi, hi * 10
+    else:
+        return None
+    best = ranks
+    for _ in range(iters):
+        mid = np.sqrt(lo * hi) if lo > 0 else hi / 10
+        ranks, latency = solve(mid)
+        if latency <= latency_budget:
+            hi, best = mid, ranks
+        else:
+            lo = mid
+    return best
+
+
+def predicted_latency(ranks: Dict[Hashable, int], latency_fn: Callable[[Hashable, np.ndarray], np.ndarray]) -> float:
+    return float(sum(np.asarray(latency_fn(k, np.array([r]))).sum() for k, r in ranks.items()))
+
+
+def pareto_frontier(
+    points: List[Dict[str, Any]], maximize: Iterable[str] = (), minimize: Iterable[str] = ()
+) -> List[Dict[str, Any]]:
+    """Points not dominated on the given objectives (duplicates collapsed), in input order."""
+    signs = [(k, 1.0) for k in maximize] + [(k, -1.0) for k in minimize]
+    scores = np.array([[sign * p[k] for k, sign in signs] for p in points])
+    keep, seen = [], set()
+    for i, row in enumerate(scores):
+        key = tuple(row)
+        if key in seen:
+            continue
+        dominated = np.any(np.all(scores >= row, axis=1) & np.any(scores > row, axis=1))
+        if not dominated:
+            keep.append(points[i])
+            seen.add(key)
+    return keep
+
+
+class ProfileLatencyModel:
+    """
+    Predicted GEMM time as a function of one (rank) dimension, from the sweep
+    CSV written by ``scripts/profile_alignment.run_sweep``
+    (``dim_name, dim_value, time_us, tflops, kernel``).
+
+    Measured dims are returned as measured. Unmeasured dims are interpolated
+    within their alignment class (``dim % align_classes``), because kernel
+    selection (and hence the penalty) depends on the residue, not the
+    distance: time per unit dim is interpolated linearly between measured
+    dims of the same class and held constant beyond the measured range, so
+    time scales with FLOPs outside it.
+    """
+
+    def __init__(self, dims: Sequence[int], times_us: Sequence[float], ref_n: int = 2048, align_classes: int = 8):
+        self.dims = np.asarray(dims, dtype=np.int64)
+        self.times_us = np.asarray(times_us, dtype=np.float64)
+        order = np.argsort(self.dims)
+        self.dims, self.times_us = self.dims[order], self.times_us[order]
+        # The fixed N of the K sweep: projection shapes are scaled relative to it
+        self.ref_n = ref_n
+        self.align_classes = align_classes
+        per_unit = self.times_us / self.dims
+        self._classes = {}
+        for r in range(align_classes):
+            mask = self.dims % align_classes == r
+            self._classes[r] = (self.dims[mask], per_unit[mask]) if mask.any() else (self.dims, per_unit)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, dim_name: str = "K", **kwargs) -> "ProfileLatencyModel":
+        dims, times = [], []
+        with open(csv_path) as f:
+            for row in csv.DictReader(f):
+                if row["dim_name"] == dim_name:
+                    dims.append(int(row["dim_value"]))
+                    times.append(float(row["time_us"]))
+        if not dims:
+            raise ValueError(f"No '{dim_name}' rows in {csv_path}")
+        return cls(dims, times, **kwargs)
+
+    def predict(self, dims) -> np.ndarray:
+        """Predicted time (us) of the profiled GEMM with the swept dim set to ``dims``."""
+        dims = np.asarray(dims, dtype=np.int64)
+        out = np.empty(dims.shape, dtype=np.float64)
+        residues = dims % self.align_classes
+        for r, (xs, per_unit) in self._classes.items():
+            mask = residues == r
+            if mask.any():
+                out[mask] = dims[mask] * np.interp(dims[mask], xs, per_unit)
+        return out
+
+    def predict_projection(self, ranks, out_features: int, in_features: int) -> np.ndarray:
+        """
+        Predicted time of a rank-``r`` factorized ``out x in`` projection
+        (``in -> r -> out``): the profiled GEMM time at ``r``, scaled by the
+        FLOP ratio of the two low-rank GEMMs to the profiled shape.
+        """
+        return self.predict(ranks) * (out_features + in_features) / self.ref_n
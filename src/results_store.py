@@ -0,0 +1,215 @@
+"""Columnar results store with one file per run.
+
+Measurements are written as one Parquet file per run under
+``<root>/<experiment>/<run_id>.parquet``. Runs never touch each other's
+files; a run's own file (e.g. of a resumed run ID) is atomically replaced,
+so readers see either the old or the new measurements. Each measurement
+becomes one row: nested dicts are flattened into dotted columns
+(``shape.head_dim``, ``timing.mean``), raw samples (``timing_raw``,
+``times_ms``) are list columns, and the run's env/config are JSON strings in
+dictionary-encoded columns (stored once per file, not once per row).
+
+Queries read only the Parquet footers and the requested columns::
+
+    store = ResultsStore("results/store")
+    df = store.query(experiment="S1_sdpa_dense_sweep", dtype="float16",
+                     shape={"batch": 4}, columns=["shape.head_dim", "timing.mean"])
+"""
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Columns added by the store itself; measurement fields may not use these names
+RESERVED_COLUMNS = ("experiment", "run_id", "env", "config")
+
+
+def flatten_record(record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """
+    Flatten nested dicts into dotted keys.
+
+    Scalars and lists of numbers are kept as-is (the latter become list
+    columns); any other value (e.g. a list of dicts) is stored as JSON text.
+    """
+    flat = {}
+    for k, v in record.items():
+        name = f"{prefix}{k}"
+        if isinstance(v, dict):
+            flat.update(flatten_record(v, prefix=f"{name}."))
+        elif isinstance(v, (list, tuple)) and not all(
+            isinstance(x, (int, float)) and not isinstance(x, bool) for x in v
+        ):
+            flat[name] = json.dumps(v)
+        else:
+            flat[name] = v
+    return flat
+
+
+def unflatten_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of ``flatten_record``; null columns (fields the row never had) are dropped."""
+    record: Dict[str, Any] = {}
+    for name, v in row.items():
+        if v is None:
+            continue
+        *parents, leaf = name.split(".")
+        node = record
+        for p in parents:
+            node = node.setdefault(p, {})
+        node[leaf] = v
+    return record
+
+
+def _dictionary_column(value: Any, n: int) -> pa.Array:
+    """A column repeating one JSON document ``n`` times, dictionary-encoded."""
+    text = json.dumps(value, sort_keys=True, default=str)
+    return pa.DictionaryArray.from_arrays(pa.array([0] * n, type=pa.int32()), pa.array([text]))
+
+
+class ResultsStore:
+    """Parquet-backed store of benchmark measurements, partitioned by experiment."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def run_path(self, experiment: str, run_id: str) -> Path:
+        return self.root / experiment / f"{run_id}.parquet"
+
+    def append(
+        self,
+        experiment: str,
+        run_id: str,
+        measurements: List[Dict[str, Any]],
+        env: Optional[Dict[str, Any]] = None,
+        config: Optional[Dict[str, Any]] = None,
+    ) -> Path:
+        """
+        Write the measurements of one run and return the Parquet file path;
+        an existing file of the same run is atomically replaced.
+        """
+        rows = [flatten_record(m) for m in measurements]
+        n = len(rows)
+
+        # Column-wise construction so every field of every row gets a column
+        # (pa.Table.from_pylist would infer the schema from the first row only)
+        names: Dict[str, None] = {}
+        for row in rows:
+            for k in row:
+                if k in RESERVED_COLUMNS:
+                    raise ValueError(f"Measurement field '{k}' clashes with a store column")
+                names.setdefault(k)
+        columns = {
+            "experiment": pa.array([experiment] * n, type=pa.string()),
+            "run_id": pa.array([run_id] * n, type=pa.string()),
+            "env": _dictionary_column(env or {}, n),
+            "config": _dictionary_column(config or {}, n),
+        }
+        for k in names:
+            columns[k] = pa.array([row.get(k) for row in rows])
+        table = pa.table(columns)
+
+        path = self.run_path(experiment, run_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pq.write_table(table, tmp_path)
+        # Readers never see a half-written run
+        os.replace(tmp_path, path)
+        return path
+
+    def files(self, experiment: Optional[str] = None) -> List[Path]:
+        pattern = f"{experiment}/*.parquet" if experiment else "*/*.parquet"
+        return sorted(self.root.glob(pattern))
+
+    def experiments(self) -> List[str]:
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir()) if self.root.exists() else []
+
+    def scan(
+        self,
+        experiment: Optional[str] = None,
+        run_id: Optional[str] = None,
+        dtype: Optional[str] = None,
+        shape: Optional[Dict[str, Any]] = None,
+        columns: Optional[Iterable[str]] = None,
+        include_errors: bool = False,
+    ) -> pa.Table:
+        """
+        Filtered read as an Arrow table.
+
+        ``shape`` filters on ``shape.<key>`` columns. Rows with an ``error``
+        field are dropped unless ``include_errors`` is set.
+        """
+        files = self.files(experiment)
+        if run_id is not None:
+            files = [p for p in files if p.stem == run_id]
+        if not files:
+            return pa.table({})
+
+        # Runs of different experiments (or versions) have different fields;
+        # promote to one schema and let missing columns read as null
+        schema = pa.unify_schemas(
+            [pq.read_schema(p) for p in files], promote_options="permissive"
+        )
+        dataset = ds.dataset([str(p) for p in files], schema=schema, format="parquet")
+
+        wanted = (["dtype"] if dtype is not None else []) + [f"shape.{k}" for k in (shape or {})]
+        missing = [name for name in wanted if name not in schema.names]
+        if missing:
+            raise KeyError(f"Cannot filter on missing columns: {missing}")
+
+        filters = []
+        if run_id is not None:
+            filters.append(ds.field("run_id") == run_id)
+        if dtype is not None:
+            filters.append(ds.field("dtype") == dtype)
+        for k, v in (shape or {}).items():
+            filters.append(ds.field(f"shape.{k}") == v)
+        if not include_errors and "error" in schema.names:
+            filters.append(ds.field("error").is_null())
+
+        expr = None
+        for f in filters:
+            expr = f if expr is None else expr & f
+        if columns is not None:
+            columns = [c for c in columns if c in schema.names]
+        return dataset.to_table(columns=columns, filter=expr)
+
+    def query(self, **kwargs) -> "pd.DataFrame":
+        """Filtered read as a pandas DataFrame (list columns hold numpy arrays); see ``scan``."""
+        return self.scan(**kwargs).to_pandas()
+
+    def records(self, **kwargs) -> List[Dict[str, Any]]:
+        """Filtered read as nested measurement dicts in the layout the runners produced."""
+        table = self.scan(**kwargs)
+        drop = [c for c in RESERVED_COLUMNS if c in table.column_names]
+        return [unflatten_record(row) for row in table.drop_columns(drop).to_pylist()]
+
+    def run_metadata(self, experiment: str, run_id: str) -> Dict[str, Any]:
+        """The env and config stored with a run."""
+        table = pq.read_table(self.run_path(experiment, run_id), columns=["env", "config"])
+        if table.num_rows == 0:
+            return {"env": {}, "config": {}}
+        return {
+            "env": json.loads(table["env"][0].as_py()),
+            "config": json.loads(table["config"][0].as_py()),
+        }
+
+    def import_run_dir(self, run_dir: Path, experiment: Optional[str] = None) -> Path:
+        """Import a legacy run directory (``raw.json`` + ``env.json``) into the store."""
+        run_dir = Path(run_dir)
+        with open(run_dir / "raw.json") as f:
+            raw = json.load(f)
+        env = json.loads((run_dir / "env.json").read_text()) if (run_dir / "env.json").exists() else {}
+        return self.append(
+            experiment or raw["experiment"],
+            run_dir.name,
+            raw.get("measurements", []),
+            env=env,
+            config=raw.get("config", {}),
+        )
@@ -0,0 +1,400 @@
+"""Analytical roofline latency model for low-rank factorized layers.
+
+Timing every (projection, rank) pair on hardware (``bench_gemm_shapes``,
+``benchmark_svd_layer``) costs GPU time for each candidate allocation. This
+module predicts the same latencies from a small ``DeviceProfile``:
+
+    t = launch_us + scale * max(flops / peak_flops, bytes / bandwidth) * penalty
+
+``scale`` is the measured/roofline ratio of aligned shapes and ``penalty``
+the extra cost of a dimension's residue mod ``align`` (per GEMM dim for
+prefill-sized GEMMs, per GEMV dim for decode, per head_dim for SDPA), both
+fitted from the existing sweeps:
+
+- ``results/alignment_sweep.csv`` (``scripts/profile_alignment.py --sweep``),
+- ``results/gemv_fine_sweep.json`` (``scripts/gemv_fine_sweep.py``),
+- optionally an SDPA sweep from ``src/benchmark_sdpa.py``.
+
+GEMMs follow the ``(m, k) @ (k, n)`` convention of the alignment sweep; a
+factorized ``out x in`` linear at rank ``r`` over ``T`` tokens is
+``V: (T, in) @ (in, r)`` then ``U: (T, r) @ (r, out)``.
+"""
+import csv
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# Theoretical fp16 tensor-core peaks
+GPU_SPECS = {
+    "A100": {"peak_tflops": 312.0, "bandwidth_gbs": 2039.0},  # 80GB
+    "H100": {"peak_tflops": 989.0, "bandwidth_gbs": 3350.0},  # SXM5 (approx)
+}
+
+PENALTY_KEYS = ("gemm.M", "gemm.N", "gemm.K", "gemv.N", "gemv.K", "sdpa.head_dim")
+
+RECONSTRUCT_MODES = ("loop", "bmm", "block_diag")
+
+
+@dataclass
+class DeviceProfile:
+    """Roofline parameters of one GPU, plus the alignment penalties fitted on it."""
+    name: str = "A100"
+    peak_tflops: float = 312.0
+    bandwidth_gbs: float = 2039.0
+    dtype_bytes: int = 2
+    align: int = 8
+    # GEMMs with at most this many rows run as (memory-bound) GEMV kernels
+    decode_rows: int = 16
+    launch_us: float = 0.0
+    gemm_scale: float = 1.0
+    gemv_scale: float = 1.0
+    sdpa_scale: float = 1.0
+    # "<kernel>.<dim>" -> time multiplier per residue class (dim % align), 1.0 when aligned
+    penalties: Dict[str, List[float]] = field(default_factory=dict)
+    sources: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def for_gpu(cls, gpu_name: str) -> "DeviceProfile":
+        """Uncalibrated profile from the spec sheet (A100 when the GPU is unknown)."""
+        key = next((k for k in GPU_SPECS if k in gpu_name), "A100")
+        return cls(name=gpu_name, **GPU_SPECS[key])
+
+    def penalty(self, key: str, dims) -> np.ndarray:
+        dims = np.asarray(dims, dtype=np.int64)
+        curve = self.penalties.get(key)
+        if curve is None:
+            return np.ones(dims.shape, dtype=np.float64)
+        return np.asarray(curve, dtype=np.float64)[dims % self.align]
+
+    def to_dict(self):
+        return asdict(self)
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "DeviceProfile":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+# ---------------------------------------------------------------------------
+# Roofline terms (all times in microseconds)
+# ---------------------------------------------------------------------------
+
+def _compute_us(profile: DeviceProfile, flops) -> np.ndarray:
+    return np.asarray(flops, dtype=np.float64) / (profile.peak_tflops * 1e6)
+
+
+def _memory_us(profile: DeviceProfile, nbytes) -> np.ndarray:
+    return np.asarray(nbytes, dtype=np.float64) / (profile.bandwidth_gbs * 1e3)
+
+
+def gemm_roofline_us(profile: DeviceProfile, m, n, k) -> np.ndarray:
+    """Unscaled roofline time of ``(m, k) @ (k, n)``, before alignment penalties."""
+    m, n, k = (np.asarray(x, dtype=np.float64) for x in (m, n, k))
+    flops = 2 * m * n * k
+    nbytes = (m * k + k * n + m * n) * profile.dtype_bytes
+    return np.maximum(_compute_us(profile, flops), _memory_us(profile, nbytes))
+
+
+def gemm_us(profile: DeviceProfile, m, n, k) -> np.ndarray:
+    """Predicted time of ``(m, k) @ (k, n)``; broadcasts over array arguments."""
+    m, n, k = np.broadcast_arrays(*(np.asarray(x, dtype=np.int64) for x in (m, n, k)))
+    roof = gemm_roofline_us(profile, m, n, k)
+    gemm = profile.gemm_scale * profile.penalty("gemm.M", m) * profile.penalty("gemm.N", n) * profile.penalty("gemm.K", k)
+    gemv = profile.gemv_scale * profile.penalty("gemv.N", n) * profile.penalty("gemv.K", k)
+    return profile.launch_us + roof * np.where(m <= profile.decode_rows, gemv, gemm)
+
+
+def lowrank_linear_us(profile: DeviceProfile, tokens: int, out_features: int, in_features: int, rank) -> Dict[str, np.ndarray]:
+    """``V`` (``in -> rank``) then ``U`` (``rank -> out``) GEMMs of a factorized linear."""
+    v = gemm_us(profile, tokens, rank, in_features)
+    u = gemm_us(profile, tokens, out_features, rank)
+    return {"V_us": v, "U_us": u, "total_us": v + u}
+
+
+def headwise_lowrank_us(
+    profile: DeviceProfile,
+    tokens: int,
+    ranks: Sequence[int],
+    in_features: int,
+    out_features: int,
+    reconstruct_mode: str = "loop",
+) -> Dict[str, float]:
+    """
+    ``HeadwiseLowRankModule``: one ``VT`` GEMM to ``sum(ranks)`` then the
+    grouped reconstruct, costed per ``reconstruct_mode``:
+
+    - ``loop``: one ``(T, r_i) @ (r_i, group_dim)`` GEMM (and launch) per group,
+    - ``bmm``: one batched GEMM over ``max(ranks)``, plus scattering the latent
+      into the padded layout when ranks differ,
+    - ``block_diag``: one ``(T, sum r) @ (sum r, out)`` GEMM over the zero-filled
+      block-diagonal weight.
+    """
+    if reconstruct_mode not in RECONSTRUCT_MODES:
+        raise ValueError(f"Unknown reconstruct mode '{reconstruct_mode}', expected one of {RECONSTRUCT_MODES}")
+    groups = len(ranks)
+    group_dim = out_features // groups
+    total_rank = int(sum(ranks))
+    vt = float(gemm_us(profile, tokens, total_rank, in_features))
+
+    if reconstruct_mode == "loop":
+        recon = float(gemm_us(profile, tokens, group_dim, np.asarray(ranks)).sum())
+    elif reconstruct_mode == "bmm":
+        max_rank = max(ranks)
+        per_group = float(gemm_us(profile, tokens, group_dim, max_rank)) - profile.launch_us
+        recon = profile.launch_us + groups * per_group
+        if any(r != max_rank for r in ranks):
+            # zero-fill the padded latent, then scatter-copy the packed one into it
+            pad_bytes = tokens * (2 * groups * max_rank + 2 * total_rank) * profile.dtype_bytes
+            recon += 2 * profile.launch_us + float(_memory_us(profile, pad_bytes))
+    else:
+        recon = float(gemm_us(profile, tokens, out_features, total_rank))
+    return {"VT_us": vt, "reconstruct_us": recon, "total_us": vt + recon}
+
+
+def sdpa_us(
+    profile: DeviceProfile,
+    batch: int,
+    n_heads: int,
+    q_len: int,
+    kv_len: int,
+    head_dim: int,
+    causal: bool = False,
+) -> float:
+    """Fused attention: ``QK^T`` and ``PV`` FLOPs against one pass over Q, K, V and O."""
+    flops = 4 * batch * n_heads * q_len * kv_len * head_dim
+    if causal and q_len > 1:
+        flops /= 2
+    nbytes = batch * n_heads * (2 * q_len + 2 * kv_len) * head_dim * profile.dtype_bytes
+    roof = max(float(_compute_us(profile, flops)), float(_memory_us(profile, nbytes)))
+    return profile.launch_us + profile.sdpa_scale * roof * float(profile.penalty("sdpa.head_dim", head_dim))
+
+
+def phase_tokens(phase: str, batch: int, seq_len: int) -> int:
+    """Rows of every projection GEMM: the whole prompt for prefill, one token per sequence for decode."""
+    if phase == "prefill":
+        return batch * seq_len
+    if phase == "decode":
+        return batch
+    raise ValueError(f"Unknown phase '{phase}', expected 'prefill' or 'decode'")
+
+
+def predict_projections(
+    profile: DeviceProfile,
+    ranks: Dict[str, int],
+    proj_shapes: Dict[str, Sequence[int]],
+    tokens: int,
+) -> Dict[str, Dict[str, float]]:
+    """Per-projection ``{V_us, U_us, total_us}`` for ``{proj: rank}`` with ``proj_shapes[proj] = (out, in)``."""
+    out = {}
+    for proj, rank in ranks.items():
+        m, n = proj_shapes[proj]
+        out[proj] = {k: float(v) for k, v in lowrank_linear_us(profile, tokens, m, n, rank).items()}
+    return out
+
+
+def predict_attention(
+    profile: DeviceProfile,
+    phase: str,
+    batch: int,
+    seq_len: int,
+    n_heads: int,
+    head_dim: int,
+    causal: bool = True,
+) -> float:
+    """SDPA for one layer: ``seq_len`` queries over ``seq_len`` keys (prefill) or one query over a ``seq_len`` cache (decode)."""
+    q_len = seq_len if phase == "prefill" else 1
+    return sdpa_us(profile, batch, n_heads, q_len, seq_len, head_dim, causal=causal)
+
+
+class RooflineLatencyModel:
+    """
+    Drop-in for ``src.rank_allocation.ProfileLatencyModel``: ``predict`` and
+    ``predict_projection`` at a fixed token count, from a ``DeviceProfile``
+    instead of an interpolated sweep.
+    """
+
+    def __init__(self, profile: DeviceProfile, tokens: int = 2048, ref_n: int = 2048):
+        self.profile = profile
+        self.tokens = tokens
+        self.ref_n = ref_n
+
+    def predict(self, dims) -> np.ndarray:
+        """Predicted time (us) of ``(tokens, d) @ (d, ref_n)``, i.e. ``d`` as the reduction dim."""
+        return gemm_us(self.profile, self.tokens, self.ref_n, dims)
+
+    def predict_projection(self, ranks, out_features: int, in_features: int) -> np.ndarray:
+        return lowrank_linear_us(self.profile, self.tokens, out_features, in_features, ranks)["total_us"]
+
+
+# ---------------------------------------------------------------------------
+# Calibration
+# ---------------------------------------------------------------------------
+
+def load_alignment_sweep(csv_path: str, fixed_m: int = 2048, fixed_n: int = 2048, fixed_k: int = 128) -> List[Dict]:
+    """
+    Rows of ``profile_alignment.run_sweep`` as ``{m, n, k, time_us, swept}``
+    (the CSV does not record the fixed dims, so they must match the sweep's).
+    """
+    rows = []
+    with open(csv_path) as f:
+        for row in csv.DictReader(f):
+            shape = {"m": fixed_m, "n": fixed_n, "k": fixed_k}
+            shape[row["dim_name"].lower()] = int(row["dim_value"])
+            rows.append({**shape, "time_us": float(row["time_us"]), "swept": row["dim_name"]})
+    return rows
+
+
+def load_gemv_sweep(json_path: str, fixed: int = 4096) -> List[Dict]:
+    """``gemv_fine_sweep.json`` as ``{m=1, n, k, time_us, swept}`` rows (``y = A @ x`` with ``A: (N, K)``)."""
+    with open(json_path) as f:
+        data = json.load(f)
+    rows = []
+    for swept in ("N", "K"):
+        for point in data.get(f"{swept}_sweep", []):
+            shape = {"m": 1, "n": fixed, "k": fixed}
+            shape[swept.lower()] = int(point[swept])
+            rows.append({**shape, "time_us": float(point["mean_ms"]) * 1000, "swept": swept})
+    return rows
+
+
+def load_sdpa_sweep(json_path: str) -> List[Dict]:
+    """Successful experiments of a ``run_sdpa_benchmark`` results file (self-attention, non-causal)."""
+    with open(json_path) as f:
+        data = json.load(f)
+    return [
+        {
+            "batch": e["batch_size"], "n_heads": e["n_heads"], "seq_len": e["seq_len"],
+            "head_dim": e["head_dim"], "time_us": float(e["timing"]["mean"]) * 1000,
+        }
+        for e in data.get("experiments", []) if "timing" in e
+    ]
+
+
+def _residue_curve(dims: np.ndarray, ratios: np.ndarray, align: int) -> List[float]:
+    """Median ratio per residue class, normalized to the aligned class; 1.0 for unmeasured classes."""
+    curve = [float(np.median(ratios[dims % align == r])) if (dims % align == r).any() else 1.0 for r in range(align)]
+    base = curve[0] if (dims % align == 0).any() and curve[0] > 0 else 1.0
+    return [c / base for c in curve]
+
+
+def _fit_scale(profile: DeviceProfile, roof: np.ndarray, times: np.ndarray, aligned: np.ndarray) -> float:
+    sel = aligned if aligned.any() else np.ones_like(aligned)
+    return float(np.median((times[sel] - profile.launch_us) / roof[sel]))
+
+
+def fit_gemv(profile: DeviceProfile, rows: List[Dict]):
+    """
+    Launch overhead and bandwidth efficiency from aligned GEMV points
+    (``t = launch + scale * bytes / bandwidth``), then the N/K residue curves.
+    """
+    m, n, k, t = (np.array([r[c] for r in rows], dtype=np.float64) for c in ("m", "n", "k", "time_us"))
+    roof = gemm_roofline_us(profile, m, n, k)
+    aligned = (n % profile.align == 0) & (k % profile.align == 0)
+    sel = aligned if aligned.sum() >= 2 else np.ones_like(aligned)
+    scale, launch = np.polyfit(roof[sel], t[sel], 1) if np.ptp(roof[sel]) > 0 else (0.0, -1.0)
+    if scale <= 0 or launch < 0:
+        # The sweep spans too narrow a size range to separate the intercept
+        scale, launch = float(np.median(t[sel] / roof[sel])), 0.0
+    profile.launch_us, profile.gemv_scale = float(launch), float(scale)
+
+    ratio = (t - profile.launch_us) / (profile.gemv_scale * roof)
+    for dim in ("N", "K"):
+        swept = np.array([r["swept"] == dim for r in rows])
+        if swept.any():
+            profile.penalties[f"gemv.{dim}"] = _residue_curve(
+                np.array([r[dim.lower()] for r in rows])[swept].astype(np.int64), ratio[swept], profile.align
+            )
+
+
+def fit_gemm(profile: DeviceProfile, rows: List[Dict]):
+    """Efficiency of aligned GEMMs, then one residue curve per swept dim (M, N, K)."""
+    m, n, k, t = (np.array([r[c] for r in rows], dtype=np.float64) for c in ("m", "n", "k", "time_us"))
+    roof = gemm_roofline_us(profile, m, n, k)
+    a = profile.align
+    aligned = (m % a == 0) & (n % a == 0) & (k % a == 0)
+    profile.gemm_scale = _fit_scale(profile, roof, t, aligned)
+
+    ratio = (t - profile.launch_us) / (profile.gemm_scale * roof)
+    for dim in ("M", "N", "K"):
+        swept = np.array([r["swept"] == dim for r in rows])
+        if swept.any():
+            profile.penalties[f"gemm.{dim}"] = _residue_curve(
+                np.array([r[dim.lower()] for r in rows])[swept].astype(np.int64), ratio[swept], a
+            )
+
+
+def fit_sdpa(profile: DeviceProfile, rows: List[Dict]):
+    """Efficiency of SDPA at aligned head dims, then the head_dim residue curve."""
+    profile.sdpa_scale = 1.0
+    profile.penalties.pop("sdpa.head_dim", None)
+    base = np.array([
+        sdpa_us(profile, r["batch"], r["n_heads"], r["seq_len"], r["seq_len"], r["head_dim"]) - profile.launch_us
+        for r in rows
+    ])
+    t = np.array([r["time_us"] for r in rows])
+    head_dims = np.array([r["head_dim"] for r in rows], dtype=np.int64)
+    profile.sdpa_scale = _fit_scale(profile, base, t, head_dims % profile.align == 0)
+    ratio = (t - profile.launch_us) / (profile.sdpa_scale * base)
+    profile.penalties["sdpa.head_dim"] = _residue_curve(head_dims, ratio, profile.align)
+
+
+def calibrate_profile(
+    profile: DeviceProfile,
+    alignment_csv: Optional[str] = None,
+    gemv_json: Optional[str] = None,
+    sdpa_json: Optional[str] = None,
+    sweep_fixed=(2048, 2048, 128),
+    gemv_fixed: int = 4096,
+) -> DeviceProfile:
+    """
+    Fit ``profile`` in place from whichever sweep files are given. The GEMV
+    sweep goes first since it is the only one that pins down the launch
+    overhead, which the GEMM and SDPA fits then subtract.
+    """
+    if gemv_json:
+        fit_gemv(profile, load_gemv_sweep(gemv_json, gemv_fixed))
+        profile.sources["gemv"] = str(gemv_json)
+    if alignment_csv:
+        fit_gemm(profile, load_alignment_sweep(alignment_csv, *sweep_fixed))
+        profile.sources["gemm"] = str(alignment_csv)
+    if sdpa_json:
+        rows = load_sdpa_sweep(sdpa_json)
+        if rows:
+            fit_sdpa(profile, rows)
+            profile.sources["sdpa"] = str(sdpa_json)
+    return profile
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+def error_summary(predicted: Sequence[float], measured: Sequence[float]) -> Dict[str, float]:
+    """
+    Absolute percentage errors, plus the Spearman rank correlation: rank
+    allocation only needs candidates to be ordered correctly.
+    """
+    pred = np.asarray(predicted, dtype=np.float64)
+    meas = np.asarray(measured, dtype=np.float64)
+    ape = np.abs(pred - meas) / meas * 100
+    summary = {
+        "n": int(len(meas)),
+        "mape_pct": float(ape.mean()),
+        "median_ape_pct": float(np.median(ape)),
+        "max_ape_pct": float(ape.max()),
+    }
+    if len(meas) > 1:
+        rank_p = np.argsort(np.argsort(pred))
+        rank_m = np.argsort(np.argsort(meas))
+        summary["spearman"] = float(np.corrcoef(rank_p, rank_m)[0, 1])
+    return summary
@@ -0,0 +1,124 @@
+"""Timer backends for kernel benchmarking.
+
+Each backend takes a no-arg callable and returns per-iteration latencies in
+milliseconds. Backends are looked up by name in ``TIMER_BACKENDS`` so runners
+can select one from config:
+
+- ``cuda_event``: CUDA events recorded around each call (GPU only)
+- ``perf_counter``: ``time.perf_counter_ns`` with a device sync after each call
+- ``profiler``: ``torch.profiler`` ranges, one per iteration
+- ``auto``: ``cuda_event`` on CUDA devices, ``perf_counter`` otherwise
+
+This module has no package-relative imports so it can be used both as
+``src.timers`` and as a top-level ``timers`` module.
+"""
+import time
+from typing import Callable, Dict, List, Tuple
+
+import torch
+
+
+PROFILER_RANGE_NAME = "gcompress::benchmark_iter"
+
+
+def is_cuda_device(device) -> bool:
+    """Return True if ``device`` refers to a CUDA device."""
+    return torch.device(device).type == "cuda"
+
+
+def synchronize(device) -> None:
+    """Block until all queued work on ``device`` has finished (no-op on CPU)."""
+    if is_cuda_device(device):
+        torch.cuda.synchronize(device)
+
+
+def time_cuda_events(kernel_fn: Callable, iterations: int, device) -> List[float]:
+    """Time each call with a pair of CUDA events."""
+    events = []
+    for _ in range(iterations):
+        start_event = torch.cuda.Event(enable_timing=True)
+        end_event = torch.cuda.Event(enable_timing=True)
+
+        start_event.record()
+        kernel_fn()
+        end_event.record()
+
+        events.append((start_event, end_event))
+
+    torch.cuda.synchronize(device)
+    return [start_event.elapsed_time(end_event) for start_event, end_event in events]
+
+
+def time_perf_counter(kernel_fn: Callable, iterations: int, device) -> List[float]:
+    """Time each call with ``perf_counter_ns``, synchronizing around every iteration."""
+    times_ms = []
+    for _ in range(iterations):
+        synchronize(device)
+        start_ns = time.perf_counter_ns()
+        kernel_fn()
+        synchronize(device)
+        times_ms.append((time.perf_counter_ns() - start_ns) / 1e6)
+    return times_ms
+
+
+def time_profiler(kernel_fn: Callable, iterations: int, device) -> List[float]:
+    """Time each call as a ``torch.profiler`` range.
+
+    On CUDA devices the per-iteration time is the summed kernel time inside the
+    range (launch overhead excluded); on CPU it is the range's wall time.
+    """
+    from torch.profiler import ProfilerActivity, profile, record_function
+
+    use_cuda = is_cuda_device(device)
+    activities = [ProfilerActivity.CPU]
+    if use_cuda:
+        activities.append(ProfilerActivity.CUDA)
+
+    synchronize(device)
+    with profile(activities=activities) as prof:
+        for _ in range(iterations):
+            with record_function(PROFILER_RANGE_NAME):
+                kernel_fn()
+        synchronize(device)
+
+    times_ms = []
+    for evt in prof.events():
+        if evt.name != PROFILER_RANGE_NAME:
+            continue
+        if use_cuda:
+            # Renamed from cuda_time_total to device_time_total in PyTorch 2.4
+            elapsed_us = getattr(evt, "device_time_total", None)
+            if elapsed_us is None:
+                elapsed_us = evt.cuda_time_total
+        else:
+            elapsed_us = evt.cpu_time_total
+        times_ms.append(elapsed_us / 1000.0)
+    return times_ms
+
+
+TIMER_BACKENDS: Dict[str, Callable[[Callable, int, object], List[float]]] = {
+    "cuda_event": time_cuda_events,
+    "perf_counter": time_perf_counter,
+    "profiler": time_profiler,
+}
+
+
+def resolve_timer(timer: str, device) -> str:
+    """Resolve ``timer`` (possibly ``"auto"``) to a concrete backend name for ``device``."""
+    if timer == "auto":
+        return "cuda_event" if is_cuda_device(device) else "perf_counter"
+    if timer not in TIMER_BACKENDS:
+        raise ValueError(
+            f"Unknown timer backend: {timer}. Supported: {['auto'] + list(TIMER_BACKENDS)}"
+        )
+    if timer == "cuda_event" and not is_cuda_device(device):
+        raise ValueError(f"Timer 'cuda_event' requires a CUDA device, got {device}")
+    return timer
+
+
+def get_timer(timer: str, device) -> Tuple[str, Callable[[Callable, int, object], List[float]]]:
+    """Return ``(name, timing_fn)`` for the requested backend on ``device``."""
+    if is_cuda_device(device) and not torch.cuda.is_available():
+        raise RuntimeError("CUDA not available")
+    name = resolve_timer(timer, device)
+    return name, TIMER_BACKENDS[name]
@@ -0,0 +1,229 @@
+"""Memory-mapped cache of tokenized evaluation/calibration corpora.
+
+Every eval run used to ``load_dataset`` WikiText-2 (or C4/PTB), join the
+split into one string and tokenize it from scratch. Here each
+(corpus, split, tokenizer) is tokenized once and stored as a flat uint32
+``.npy``::
+
+    <root>/<corpus>__<split>__<tokenizer fingerprint>/
+        manifest.json
+        ids.npy
+
+``TokenCache.get`` returns a ``TokenCorpus`` whose ``ids``, ``blocks`` and
+``window`` are views into the memory map, so eval blocks and calibration
+samples cost no copy until a batch is moved to the device.
+
+Corpora are named entries of ``CORPORA``: the same split joined with
+``"\\n\\n"`` or ``"\\n"`` tokenizes differently, so each joining convention
+used by the scripts is its own corpus.
+"""
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import torch
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """How to build the text of a corpus split from a Hugging Face dataset (or a local file at ``path``)."""
+    path: str
+    config: Optional[str] = None
+    field: str = "text"
+    join: str = "\n\n"
+    drop_empty: bool = False
+    data_files: Optional[Dict[str, str]] = None   # split -> file (C4 shards)
+    revision: Optional[str] = None
+
+
+_C4_FILES = {
+    "train": "en/c4-train.00000-of-01024.json.gz",
+    "validation": "en/c4-validation.00000-of-00008.json.gz",
+}
+
+CORPORA = {
+    # SVD-LLM / ASVD / PaLU convention
+    "wikitext2": CorpusSpec("wikitext", "wikitext-2-raw-v1"),
+    # llm_eval / gac_recompress_eval convention
+    "wikitext2_lines": CorpusSpec("wikitext", "wikitext-2-raw-v1", join="\n"),
+    # svdllm_full_experiment convention
+    "wikitext2_nonempty": CorpusSpec("wikitext", "wikitext-2-raw-v1", join="\n", drop_empty=True),
+    "ptb": CorpusSpec("ptb_text_only", "penn_treebank", field="sentence"),
+    "c4": CorpusSpec("allenai/c4", data_files=_C4_FILES, revision="607bd4c8450a42878aa9ddc051a65a055450ef87"),
+}
+
+# Texts longer than this are tokenized piecewise, split at document boundaries
+TOKENIZE_CHUNK_CHARS = 32 * 1024 ** 2
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    Short hash identifying a tokenizer's output: the serialized fast
+    tokenizer (or the vocabulary), plus a probe encoding so special-token
+    settings such as ``add_bos_token`` are covered.
+    """
+    h = hashlib.sha256(type(tokenizer).__name__.encode())
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        h.update(backend.to_str().encode())
+    else:
+        h.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    h.update(json.dumps(tokenizer("Hello world\n\n = A =").input_ids).encode())
+    return h.hexdigest()[:16]
+
+
+def read_local_texts(path: Path, field: str = "text") -> Sequence[str]:
+    """Texts of a local corpus file: plain text (one document) or JSON lines (``.jsonl``/``.json``, optionally ``.gz``)."""
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        if ".json" in path.suffixes or ".jsonl" in path.suffixes:
+            return [json.loads(line)[field] for line in f if line.strip()]
+        return [f.read()]
+
+
+def load_corpus_texts(spec: CorpusSpec, split: str) -> Sequence[str]:
+    if Path(spec.path).is_file():
+        texts = read_local_texts(Path(spec.path), spec.field)
+        return [t for t in texts if t.strip()] if spec.drop_empty else texts
+
+    from datasets import load_dataset
+
+    if spec.data_files is not None:
+        data = load_dataset(spec.path, data_files={split: spec.data_files[split]},
+                            revision=spec.revision, split=split)
+    else:
+        data = load_dataset(spec.path, spec.config, split=split, revision=spec.revision)
+    texts = data[spec.field]
+    return [t for t in texts if t.strip()] if spec.drop_empty else texts
+
+
+def tokenize_texts(tokenizer, texts: Sequence[str], join: str) -> np.ndarray:
+    """
+    ``tokenizer(join.join(texts)).input_ids`` as uint32. Texts beyond
+    ``TOKENIZE_CHUNK_CHARS`` are tokenized in document-aligned pieces (without
+    re-adding special tokens), which only differs at piece boundaries.
+    """
+    text = join.join(texts)
+    if len(text) <= TOKENIZE_CHUNK_CHARS:
+        return np.asarray(tokenizer(text).input_ids, dtype=np.uint32)
+    prefix = tokenizer("").input_ids
+    parts, piece, size = [np.asarray(prefix, dtype=np.uint32)], [], 0
+    for i, t in enumerate(texts):
+        piece.append(t)
+        size += len(t) + len(join)
+        if size >= TOKENIZE_CHUNK_CHARS or i == len(texts) - 1:
+            # The separator after a piece belongs to it, so joins are never lost
+            chunk = join.join(piece) + (join if i < len(texts) - 1 else "")
+            parts.append(np.asarray(tokenizer(chunk, add_special_tokens=False).input_ids, dtype=np.uint32))
+            piece, size = [], 0
+    return np.concatenate(parts)
+
+
+class TokenCorpus:
+    """A tokenized corpus split backed by a read-only (copy-on-write) memory map."""
+
+    def __init__(self, path: Path, meta: Dict[str, Any]):
+        self.path = path
+        self.meta = meta
+        self.array = np.load(path, mmap_mode="c")
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    @property
+    def ids(self) -> torch.Tensor:
+        """All token ids, ``[N]`` uint32, sharing memory with the map."""
+        return torch.from_numpy(self.array)
+
+    def blocks(self, seq_len: int, limit: Optional[int] = None) -> torch.Tensor:
+        """
+        ``[n, seq_len]`` non-overlapping blocks (the tail shorter than
+        ``seq_len`` is dropped), as a view. Same layout as SVD-LLM's
+        ``get_test_data`` windows.
+        """
+        n = len(self) // seq_len
+        if limit is not None:
+            n = min(n, limit)
+        return self.ids[:n * seq_len].view(n, seq_len)
+
+    def window(self, start: int, length: int) -> torch.Tensor:
+        return self.ids[start:start + length]
+
+    def windows(self, starts: Sequence[int], length: int) -> torch.Tensor:
+        """``[len(starts), length]`` windows at arbitrary offsets (one gather, not a view)."""
+        index = np.asarray(starts, dtype=np.int64)[:, None] + np.arange(length)
+        return torch.from_numpy(self.array[index])
+
+
+class TokenCache:
+    """Directory of tokenized corpora, one entry per (corpus, split, tokenizer)."""
+
+    def __init__(self, root: Path = Path("cache") / "tokens"):
+        self.root = Path(root)
+
+    def entry(self, corpus: str, split: str, tokenizer) -> Path:
+        return self.root / f"{corpus}__{split}__{tokenizer_fingerprint(tokenizer)}"
+
+    def get(
+        self,
+        corpus: str,
+        split: str,
+        tokenizer,
+        texts: Optional[Sequence[str]] = None,
+        spec: Optional[CorpusSpec] = None,
+    ) -> TokenCorpus:
+        """
+        The tokenized ``split`` of ``corpus``, tokenizing (and caching) it on
+        first use. ``texts`` bypasses ``load_dataset`` (e.g. a local corpus
+        file); ``spec`` defaults to ``CORPORA[corpus]``.
+        """
+        spec = spec or CORPORA.get(corpus)
+        if spec is None:
+            raise KeyError(f"Unknown corpus '{corpus}', expected one of {sorted(CORPORA)} or an explicit spec")
+        entry = self.entry(corpus, split, tokenizer)
+        manifest = entry / "manifest.json"
+        if manifest.exists():
+            with open(manifest) as f:
+                meta = json.load(f)
+            if meta["spec"] == asdict(spec):
+                return TokenCorpus(entry / "ids.npy", meta)
+
+        if texts is None:
+            texts = load_corpus_texts(spec, split)
+        ids = tokenize_texts(tokenizer, texts, spec.join)
+        return self.put(corpus, split, tokenizer, ids, spec)
+
+    def put(self, corpus: str, split: str, tokenizer, ids: np.ndarray, spec: CorpusSpec) -> TokenCorpus:
+        """Write ``ids`` for (corpus, split, tokenizer) atomically and return the mapped corpus."""
+        entry = self.entry(corpus, split, tokenizer)
+        entry.mkdir(parents=True, exist_ok=True)
+        tmp = entry / "ids.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(ids, dtype=np.uint32))
+        os.replace(tmp, entry / "ids.npy")
+
+        meta = {
+            "corpus": corpus,
+            "split": split,
+            "tokenizer": getattr(tokenizer, "name_or_path", type(tokenizer).__name__),
+            "fingerprint": tokenizer_fingerprint(tokenizer),
+            "n_tokens": int(len(ids)),
+            "spec": asdict(spec),
+        }
+        tmp = entry / "manifest.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, entry / "manifest.json")
+        return TokenCorpus(entry / "ids.npy", meta)
+
+
+def corpus_ids(corpus: str, split: str, tokenizer, root: Optional[Path] = None) -> torch.Tensor:
+    """Shortcut: the cached ``[N]`` token ids of ``corpus``/``split``."""
+    cache = TokenCache(root) if root is not None else TokenCache()
+    return cache.get(corpus, split, tokenizer).ids
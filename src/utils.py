@@ -67,3 +67,70 @@ def compute_statistics(values: list) -> dict:
         "p99": float(np.percentile(arr, 99)),
         "count": len(values),
     }
+
+
+def median_confidence_interval(values: list, confidence: float = 0.95) -> dict:
+    """
+    Distribution-free confidence interval for the median.
+    
+    Uses the order-statistic bounds from the binomial(n, 0.5) normal
+    approximation, so no assumption is made about the latency distribution.
+    ``rel_half_width`` is the half-width of the interval relative to the median.
+    """
+    if not values:
+        return {}
+    
+    arr = np.sort(np.asarray(values, dtype=np.float64))
+    n = arr.size
+    median = float(np.median(arr))
+    # Two-sided z for common levels; fall back to 95% for anything else
+    z = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758}.get(round(confidence, 2), 1.9600)
+    half_rank = z * np.sqrt(n) / 2.0
+    lo_idx = max(int(np.floor(n / 2.0 - half_rank)), 0)
+    hi_idx = min(int(np.ceil(n / 2.0 + half_rank)), n - 1)
+    lo, hi = float(arr[lo_idx]), float(arr[hi_idx])
+    return {
+        "confidence": confidence,
+        "median": median,
+        "lo": lo,
+        "hi": hi,
+        "rel_half_width": (hi - lo) / (2.0 * median) if median > 0 else float("inf"),
+        "count": int(n),
+    }
+
+
+def detect_change_point(values: list, penalty_scale: float = 2.0) -> int:
+    """
+    Locate a single mean-shift change point (e.g. end of warmup) in a series.
+    
+    Picks the split minimising the two-segment squared error and accepts it only
+    if the gain beats a BIC-style penalty ``penalty_scale * sigma^2 * log(n)``,
+    with sigma estimated robustly from successive differences. Returns the index
+    of the first sample after the change, or 0 if no significant shift is found.
+    """
+    arr = np.asarray(values, dtype=np.float64)
+    n = arr.size
+    if n < 4:
+        return 0
+    
+    csum = np.cumsum(arr)
+    csum_sq = np.cumsum(arr ** 2)
+    total_sse = csum_sq[-1] - csum[-1] ** 2 / n
+    
+    # SSE of left segment [0, t) and right segment [t, n) for t in 1..n-1
+    t = np.arange(1, n)
+    left_sum, left_sq = csum[:-1], csum_sq[:-1]
+    right_sum, right_sq = csum[-1] - left_sum, csum_sq[-1] - left_sq
+    split_sse = (left_sq - left_sum ** 2 / t) + (right_sq - right_sum ** 2 / (n - t))
+    best = int(np.argmin(split_sse))
+    
+    # Robust noise estimate: MAD of first differences (insensitive to the shift itself)
+    diffs = np.diff(arr)
+    sigma = 1.4826 * np.median(np.abs(diffs - np.median(diffs))) / np.sqrt(2.0)
+    if sigma <= 0:
+        sigma = float(np.std(arr)) or 1e-12
+    
+    gain = total_sse - split_sse[best]
+    if gain <= penalty_scale * sigma ** 2 * np.log(n):
+        return 0
+    return best + 1
@@ -6,7 +6,20 @@ import random
 from loguru import logger
 
 
-def get_calib_data(name, tokenizer, model_id, nsamples, seqlen=2048, seed=3):
+def get_calib_data(name, tokenizer, model_id, nsamples, seqlen=2048, seed=3, sampler=None):
+    """
+        sampler: optional callable (nsamples, seqlen, seed) -> [nsamples, seqlen]
+        token tensor, e.g. src.calib_sampler.CalibSampler over a pre-tokenized
+        (possibly local) corpus. It replaces the per-sample tokenization and the
+        per-model cache file below; samples are returned as views of its output.
+    """
+    if sampler is not None:
+        input_ids = sampler(nsamples, seqlen, seed)
+        attention_mask = torch.ones(1, seqlen, dtype=input_ids.dtype)
+        return [
+            {"input_ids": input_ids[i:i + 1], "attention_mask": attention_mask}
+            for i in range(len(input_ids))
+        ]
     cache_file = (
         f"cache/{name}_{model_id.replace('/','_')}_{nsamples}_{seqlen}_{seed}.pt"
     )
@@ -17,8 +17,52 @@ def find_layers(module, layers=[nn.Conv2d, nn.Linear], name=''):
         ))
     return res
 
+def _whiten_scaling_matrix(raw_scaling_diag_matrix):
+    """Cholesky factor (float32) of a Gram matrix, regularized if it is not positive definite."""
+    try:
+        scaling_diag_matrix = torch.linalg.cholesky(raw_scaling_diag_matrix).float()
+    except Exception as e:
+        logger.warning("eigen scaling_diag_matrix is not positive!")
+        if torch.isnan(raw_scaling_diag_matrix).any():
+            logger.warning("raw scaling_diag_matrix contains NaN!")
+        elif torch.isinf(raw_scaling_diag_matrix).any():
+            logger.warning("raw scaling_diag_matrix contains Inf!")
+        if not torch.equal(raw_scaling_diag_matrix, raw_scaling_diag_matrix.T):
+            logger.warning("raw scaling_diag_matrix is not a symmetric matrix!")
+        eigenvalues = torch.linalg.eigvalsh(raw_scaling_diag_matrix)
+        raw_scaling_diag_matrix = raw_scaling_diag_matrix + (- eigenvalues[0] + 1e-3) * torch.eye(raw_scaling_diag_matrix.shape[0], dtype=raw_scaling_diag_matrix.dtype, device=raw_scaling_diag_matrix.device)
+        scaling_diag_matrix = torch.linalg.cholesky(raw_scaling_diag_matrix).float()
+        if torch.isnan(scaling_diag_matrix).any():
+            logger.warning("scaling_diag_matrix contains NaN!")
+        elif torch.isinf(scaling_diag_matrix).any():
+            logger.warning("scaling_diag_matrix contains Inf!")
+        del eigenvalues
+    try:
+        scaling_matrix_inv = torch.linalg.inv(scaling_diag_matrix)
+    except Exception as e:
+        logger.warning("scaling_diag_matrix is not full rank!")
+        reg_inv =  1e-3 * torch.eye(scaling_diag_matrix.shape[0], device=scaling_diag_matrix.device) 
+        scaling_diag_matrix += reg_inv
+        scaling_matrix_inv = torch.linalg.inv(scaling_diag_matrix)
+        del reg_inv
+
+    del scaling_matrix_inv
+    return scaling_diag_matrix
+
 @torch.no_grad()
-def get_whiten_scale_matrix(model, tokenizer, args, dev):
+def get_whiten_scale_matrix(model, tokenizer, args, dev, stats_cache=None, gram_engine=None, calib_sampler=None):
+    """
+        gram_engine: optional layer-wise Gram accumulator with the signature of
+        src.calib_engine.layerwise_grams(model, calib_loader, dev, on_layer,
+        layer_filter=...); it replaces the full-calibration inps/outs buffers
+        below with micro-batched, memory-capped accumulation.
+        stats_cache: optional per-layer store (e.g. src.calib_cache.CalibStatsCache
+        for wikitext2 / 256 samples / seqlen 2048) used instead of the monolithic
+        .pt file: layers are written as soon as they are done, and cached
+        matrices are attached memory-mapped, so no layer is read before it is
+        decomposed.
+        calib_sampler: optional calibration sampler passed to get_calib_data.
+    """
     model_id = model.config._name_or_path
     #NOTE (brian1009): Might need to check the random seed, currently we have < 0.1 perplexity difference at Llama2-7B
     calib_loader = get_calib_data(
@@ -26,7 +70,8 @@ def get_whiten_scale_matrix(model, tokenizer, args, dev):
         tokenizer, 
         model_id, 
         nsamples=256, 
-        seqlen=2048
+        seqlen=2048,
+        sampler=calib_sampler,
     )
     cache_file = f"cache/whiten/{model_id.replace('/','_')}_w2_scaling_matrices_fp16.pt"
     os.makedirs("cache/whiten", exist_ok=True)
@@ -46,8 +91,18 @@ def get_whiten_scale_matrix(model, tokenizer, args, dev):
     ]
     """
     logger.info(f"[whiten] Calibration dataset: {args.calib_dataset}", fg="yellow")
+    if stats_cache is not None and stats_cache.complete and args.use_cache:
+        logger.info(f"[whiten] Attach memory-mapped scaling matrices from: {stats_cache.path}", fg="yellow")
+        layers = model.model.layers
+        for i in range(len(layers)):
+            subset = find_layers(layers[i])
+            cached = stats_cache.layer(i, kind="chol")
+            for name in subset:
+                if name in cached:
+                    subset[name].scaling_diag_matrix = cached[name]
+        return
     logger.info(f"[whiten] Search cache_file={cache_file}", fg="yellow")
-    if os.path.exists(cache_file) and args.use_cache:
+    if stats_cache is None and os.path.exists(cache_file) and args.use_cache:
         logger.info(f"[whiten] File {cache_file} exist.", fg="green")
         logger.info(f"[whiten] Load scaling diag matrix from cache: {cache_file}", fg="yellow")
         scaling_matrics = torch.load(cache_file, map_location="cpu")
@@ -67,6 +122,29 @@ def get_whiten_scale_matrix(model, tokenizer, args, dev):
     logger.info(f"No cache_file={cache_file}", fg="red")
     logger.info(f"Create whiten scale matrix dict...", fg="yellow")
 
+    if gram_engine is not None:
+        scaling_matrices = []
+        def whiten_layer(i, layer, grams):
+            subset = find_layers(layer)
+            layer_scaling_matrices = {}
+            layer_stats = {}
+            for name, gram in grams.items():
+                subset[name].scaling_diag_matrix = _whiten_scaling_matrix(gram.double()).cpu()
+                layer_scaling_matrices[name] = subset[name].scaling_diag_matrix
+                layer_stats[name] = {"gram": gram, "chol": layer_scaling_matrices[name]}
+            if stats_cache is not None and args.use_cache:
+                stats_cache.put_layer(i, layer_stats)
+            else:
+                scaling_matrices.append(layer_scaling_matrices)
+            torch.cuda.empty_cache()
+        stats = gram_engine(
+            model, calib_loader, dev, whiten_layer,
+            layer_filter=lambda name: "k_proj" in name or "v_proj" in name,
+        )
+        logger.info(f"[whiten] Layer-wise calibration done, peak RSS {stats['peak_rss_gb']:.1f} GB")
+        _save_whiten_cache(args, stats_cache, scaling_matrices, cache_file)
+        return
+
     # Create Scaling Matrix with low-resource inference
     # Adapted from https://github.com/AIoT-MLSys-Lab/SVD-LLM/blob/main/SVDLLM.py
     # Here, inference are performed in an layer-wise manner.
@@ -156,56 +234,40 @@ def get_whiten_scale_matrix(model, tokenizer, args, dev):
             subset[name].scaling_diag_matrix = subset[name].scaling_diag_matrix.cpu()
         torch.cuda.empty_cache()
         layer_scaling_matrices = {}
+        layer_stats = {}
         for name in subset:
             if not ("k_proj" in name or "v_proj" in name):
                 continue
-            raw_scaling_diag_matrix = subset[name].scaling_diag_matrix.double().cuda()
-            try:
-                scaling_diag_matrix = torch.linalg.cholesky(raw_scaling_diag_matrix).float()
-                subset[name].scaling_diag_matrix = scaling_diag_matrix
-            except Exception as e:
-                logger.warning("eigen scaling_diag_matrix is not positive!")
-                if torch.isnan(raw_scaling_diag_matrix).any():
-                    logger.warning("raw scaling_diag_matrix contains NaN!")
-                elif torch.isinf(raw_scaling_diag_matrix).any():
-                    logger.warning("raw scaling_diag_matrix contains Inf!")
-                if not torch.equal(raw_scaling_diag_matrix, raw_scaling_diag_matrix.T):
-                    logger.warning("raw scaling_diag_matrix is not a symmetric matrix!")
-                eigenvalues = torch.linalg.eigvalsh(raw_scaling_diag_matrix)
-                raw_scaling_diag_matrix += (- eigenvalues[0] + 1e-3) * torch.eye(raw_scaling_diag_matrix.shape[0]).cuda()
-                scaling_diag_matrix = torch.linalg.cholesky(raw_scaling_diag_matrix).float()
-                if torch.isnan(scaling_diag_matrix).any():
-                    logger.warning("scaling_diag_matrix contains NaN!")
-                elif torch.isinf(scaling_diag_matrix).any():
-                    logger.warning("scaling_diag_matrix contains Inf!")
-                del eigenvalues
-                subset[name].scaling_diag_matrix = scaling_diag_matrix
-            try:
-                scaling_matrix_inv = torch.linalg.inv(scaling_diag_matrix)
-            except Exception as e:
-                logger.warning("scaling_diag_matrix is not full rank!")
-                reg_inv =  1e-3 * torch.eye(scaling_diag_matrix.shape[0]).cuda() 
-                scaling_diag_matrix += reg_inv
-                scaling_matrix_inv = torch.linalg.inv(scaling_diag_matrix)
-                del reg_inv
-            
-            del scaling_matrix_inv
+            layer_stats[name] = {"gram": subset[name].scaling_diag_matrix}
+            scaling_diag_matrix = _whiten_scaling_matrix(subset[name].scaling_diag_matrix.double().cuda())
+            subset[name].scaling_diag_matrix = scaling_diag_matrix
             layer_scaling_matrices[name] = scaling_diag_matrix.cpu()
+            layer_stats[name]["chol"] = layer_scaling_matrices[name]
             torch.cuda.empty_cache()
-        scaling_matrices.append(layer_scaling_matrices)
+        if stats_cache is not None and args.use_cache:
+            stats_cache.put_layer(i, layer_stats)
+        else:
+            scaling_matrices.append(layer_scaling_matrices)
+        del layer_stats
         layers[i] = layer.cpu()
         inps = outs
         torch.cuda.empty_cache()
         
     model.config.use_cache = use_cache
-    if args.use_cache:
+    _save_whiten_cache(args, stats_cache, scaling_matrices, cache_file)
+
+def _save_whiten_cache(args, stats_cache, scaling_matrices, cache_file):
+    if stats_cache is not None and args.use_cache:
+        stats_cache.finalize()
+        logger.info(f"Save the whiten scale matrices per layer to:  {stats_cache.path}")
+    elif args.use_cache:
         torch.save(scaling_matrices, cache_file)
         logger.info(f"Save the whiten scale matrix dict to:  {cache_file}")
 
-def compress_model_whiten(model, tokenizer, args, dev, selection_result):
+def compress_model_whiten(model, tokenizer, args, dev, selection_result, stats_cache=None, gram_engine=None, calib_sampler=None, factorize=None):
     logger.info("Compressing model with whiten decomposition...")
     # NOTE(brian1009): Prepare whiten scaling matrix
-    get_whiten_scale_matrix(model, tokenizer, args, dev)
+    get_whiten_scale_matrix(model, tokenizer, args, dev, stats_cache, gram_engine, calib_sampler)
     # Compress the model
     module_dict = {name: module for name, module in model.named_modules()}
     full_name_dict = {module: name for name, module in model.named_modules()}
@@ -233,11 +295,12 @@ def compress_model_whiten(model, tokenizer, args, dev, selection_result):
     
         head_wise_svd_linear = HeadwiseLowRankModule.from_linear_whiten(
             raw_linear,
-            selected_head_rank
+            selected_head_rank,
+            factorize=factorize,
         )
         setattr(info["father"], info["name"],  head_wise_svd_linear)
 
-def compress_model_svd(model, selection_result):
+def compress_model_svd(model, selection_result, factorize=None):
     logger.info("Compressing model with svd decomposition...")
     # Compress the model
     module_dict = {name: module for name, module in model.named_modules()}
@@ -266,15 +329,22 @@ def compress_model_svd(model, selection_result):
         print("head-wise svd", layername, raw_linear)
         head_wise_svd_linear = HeadwiseLowRankModule.from_linear(
             raw_linear,
-            selected_head_rank
+            selected_head_rank,
+            factorize=factorize,
         )
         setattr(info["father"], info["name"],  head_wise_svd_linear)
 
 # Wrapper for different decompose methods
-def compress_model(model, tokenizer, args, dev, selection_result):
+def compress_model(model, tokenizer, args, dev, selection_result, stats_cache=None, gram_engine=None, calib_sampler=None, factorize=None):
+    """
+        stats_cache, gram_engine, calib_sampler: see get_whiten_scale_matrix.
+        factorize: optional factorize(A, rank) -> (U, S, Vt) used instead of the
+        exact thin SVD of each layer's heads, e.g. a wrapper around
+        src.lowrank.low_rank_factorize with method="randomized" or "lanczos".
+    """
     if args.decompose_method == "whiten":
-        compress_model_whiten(model, tokenizer, args, dev, selection_result)
+        compress_model_whiten(model, tokenizer, args, dev, selection_result, stats_cache, gram_engine, calib_sampler, factorize)
     elif args.decompose_method == "svd":
-        compress_model_svd(model, selection_result)
+        compress_model_svd(model, selection_result, factorize)
     else:
         raise ValueError(f"Decomposition method {args.decompose_method} is not supported.")
\ No newline at end of file
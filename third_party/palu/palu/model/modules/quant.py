@@ -80,4 +80,141 @@ class Quantizer(nn.Module):
         
     def to(self, *args, **kwargs):
         super(Quantizer, self).to(*args, **kwargs)
-        return self
\ No newline at end of file
+        return self
+
+def segment_offsets(ranks, group_size) -> torch.Tensor:
+    """
+        Offsets table [S + 1] of the quantization segments over a packed latent
+        (r1 + r2 + ...): each group is split into chunks of group_size, or kept
+        whole when group_size <= 0, matching per-group Quantizer calls.
+    """
+    offsets = [0]
+    for r in ranks:
+        step = group_size if group_size > 0 else r
+        assert r % step == 0, "Group size should be divisible by (dim)."
+        start = offsets[-1]
+        offsets.extend(start + step * (j + 1) for j in range(r // step))
+    return torch.tensor(offsets, dtype=torch.long)
+
+
+def _segment_params(x: torch.Tensor, offsets: torch.Tensor, n_bits, sym, clip_ratio):
+    """
+        Per-segment scales/base for a 2D packed tensor x [T, R], gathered back to
+        a shape that broadcasts against x (or its [-1, size] view when all
+        segments have the same size). Returns (x_view, scales, base, seg_index).
+    """
+    sizes = offsets[1:] - offsets[:-1]
+    uniform = bool((sizes == sizes[0]).all())
+    if uniform:
+        x_view = x.reshape(-1, int(sizes[0]))
+        seg_index = None
+        if sym:
+            w_max = x_view.abs().amax(dim=-1, keepdim=True).clamp(min=1e-5)
+        else:
+            w_max = x_view.amax(dim=-1, keepdim=True)
+            w_min = x_view.amin(dim=-1, keepdim=True)
+    else:
+        # Ragged segments: reduce with scatter over a column -> segment index
+        x_view = x
+        seg_index = torch.repeat_interleave(torch.arange(len(sizes), device=x.device), sizes.to(x.device))
+        index = seg_index.expand_as(x)
+        w_max = x.new_empty(x.shape[0], len(sizes))
+        if sym:
+            w_max.scatter_reduce_(1, index, x.abs(), "amax", include_self=False).clamp_(min=1e-5)
+        else:
+            w_max.scatter_reduce_(1, index, x, "amax", include_self=False)
+            w_min = x.new_empty(x.shape[0], len(sizes)).scatter_reduce_(1, index, x, "amin", include_self=False)
+
+    if sym:
+        q_max = (2**(n_bits-1)-1)
+        if clip_ratio < 1.0:
+            w_max = w_max * clip_ratio
+        scales = w_max / q_max
+        base = None
+    else:
+        q_max = (2**(n_bits)-1)
+        if clip_ratio < 1.0:
+            w_max *= clip_ratio
+            w_min *= clip_ratio
+        scales = (w_max-w_min).clamp(min=1e-5) / q_max
+        base = torch.round(-w_min/scales).clamp_(min=0, max=q_max)
+    return x_view, scales, base, seg_index
+
+
+@torch.no_grad()
+def quantize_segments(x: torch.Tensor, offsets: torch.Tensor, n_bits, sym, clip_ratio=1.0, inplace=False):
+    """
+        Fake-quantize a packed latent [..., R] in one pass over the segments in
+        `offsets`. Gives the same result as quantize_tensor applied segment by
+        segment; with inplace=True x (which must be contiguous) is overwritten.
+    """
+    if n_bits >= 16:
+        return x
+    savedShape = x.shape
+    w = x if inplace else x.clone()
+    x_view, scales, base, seg_index = _segment_params(w.view(-1, savedShape[-1]), offsets, n_bits, sym, clip_ratio)
+    if seg_index is not None:
+        scales = scales.index_select(1, seg_index)
+        base = base.index_select(1, seg_index) if base is not None else None
+    q_min, q_max = (-2**(n_bits-1), 2**(n_bits-1)-1) if sym else (0, 2**n_bits-1)
+
+    x_view.div_(scales).round_()
+    if base is not None:
+        x_view.add_(base).clamp_(q_min, q_max).sub_(base)
+    else:
+        x_view.clamp_(q_min, q_max)
+    x_view.mul_(scales)
+    return w.view(savedShape)
+
+
+@torch.no_grad()
+def pack_segments(x: torch.Tensor, offsets: torch.Tensor, n_bits, sym, clip_ratio=1.0) -> dict:
+    """
+        Integer form of quantize_segments: uint8 codes (two per byte when
+        n_bits <= 4 and R is even), fp16 per-segment scales and, for asymmetric
+        quantization, uint8 per-segment zero points.
+    """
+    assert n_bits <= 8, "Packed latents hold at most 8-bit codes"
+    savedShape = x.shape
+    x_view, scales, base, seg_index = _segment_params(x.reshape(-1, savedShape[-1]), offsets, n_bits, sym, clip_ratio)
+    full_scales, full_base = scales, base
+    if seg_index is not None:
+        full_scales = scales.index_select(1, seg_index)
+        full_base = base.index_select(1, seg_index) if base is not None else None
+    if sym:
+        # Shift signed codes [-2^(n-1), 2^(n-1)-1] into [0, 2^n-1]
+        zero = 2**(n_bits-1)
+        codes = torch.clamp(torch.round(x_view / full_scales), -zero, zero-1).add_(zero)
+    else:
+        codes = torch.clamp(torch.round(x_view / full_scales) + full_base, 0, 2**n_bits-1)
+    codes = codes.to(torch.uint8).reshape(savedShape)
+
+    packed_pairs = n_bits <= 4 and savedShape[-1] % 2 == 0
+    if packed_pairs:
+        codes = codes[..., 0::2] | (codes[..., 1::2] << 4)
+    return {
+        "codes": codes,
+        "scales": scales.to(torch.float16).reshape(*savedShape[:-1], -1),
+        "zeros": base.to(torch.uint8).reshape(*savedShape[:-1], -1) if base is not None else None,
+        "n_bits": n_bits,
+        "sym": sym,
+        "packed_pairs": packed_pairs,
+        "offsets": offsets,
+    }
+
+
+def unpack_segments(packed: dict, dtype=torch.float16) -> torch.Tensor:
+    """ Dequantize the output of pack_segments back to a [..., R] tensor. """
+    codes = packed["codes"]
+    if packed["packed_pairs"]:
+        codes = torch.stack([codes & 0xF, codes >> 4], dim=-1).flatten(-2)
+    offsets = packed["offsets"].to(codes.device)
+    sizes = offsets[1:] - offsets[:-1]
+    n_bits = packed["n_bits"]
+    if packed["sym"]:
+        zeros = torch.full_like(packed["scales"], 2**(n_bits-1), dtype=dtype)
+    else:
+        zeros = packed["zeros"].to(dtype)
+    scales = packed["scales"].to(dtype).repeat_interleave(sizes, dim=-1)
+    zeros = zeros.repeat_interleave(sizes, dim=-1)
+    return (codes.to(dtype) - zeros) * scales
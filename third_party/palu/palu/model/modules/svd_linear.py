@@ -1,59 +1,60 @@
 import torch
 import torch.nn as nn
-from .quant import Quantizer
+import torch.nn.functional as F
+from .quant import Quantizer, segment_offsets, quantize_segments, pack_segments, unpack_segments
 from .hadamard_utils import apply_hadamard
 
-def _per_head_whiten_decomposition_from_weight(weight, scaling_diag_matrix, rank):
+def _batched_decomposition_from_weight(weight, ranks, scaling_diag_matrix=None, factorize=None):
+    """
+        Decompose all heads of a layer at once.
+        weight: (num_groups, group_dim, in_features); returns lists of
+        L_i (group_dim, rank_i) and R_i (rank_i, in_features) with
+        L_i @ R_i the rank_i truncated SVD of head i (of weight @ scaling, mapped
+        back through the scaling matrix, when whitening), using one batched SVD
+        per layer and (whiten) one triangular solve against the shared scaling
+        matrix instead of one inverse per head.
+        factorize(A, rank) -> (U, S, Vt) replaces the exact thin SVD, e.g. with
+        a randomized rank-`rank` factorization.
+    """
     original_dtype = weight.dtype
-    try:
-        scaling_diag_matrix = scaling_diag_matrix.to(weight.device)
-    except AttributeError:
-        raise FileExistsError("Cache may not be loaded correctly")
-    
-    # Get the inverse of scaling_diag_matrix
-    scaling_matrix_inv = torch.linalg.inv(scaling_diag_matrix.to(torch.float32))
-
-    # Multiply scaling_diag_matrix to weight matrix
-    W_scale = torch.matmul(weight.to(torch.float32), scaling_diag_matrix.to(torch.float32))
-    
-    U, S, Vt = torch.linalg.svd(W_scale, full_matrices=False)
-    
-    V = torch.matmul(Vt, scaling_matrix_inv)
-    
-    # Low rank approximation to the target rank
-    U = U[:, :rank]
-    S = S[:rank]
-    V = V[:rank, :]
-    
-    sqrtSigma = torch.sqrt(torch.diag(S))
+    weight = weight.to(torch.float32)
+    max_rank = max(ranks)
+    if scaling_diag_matrix is not None:
+        try:
+            scaling_diag_matrix = scaling_diag_matrix.to(weight.device).to(torch.float32)
+        except AttributeError:
+            raise FileExistsError("Cache may not be loaded correctly")
+        weight = torch.matmul(weight, scaling_diag_matrix)
 
-    # Fuse the SVD components
-    L = torch.matmul(U, sqrtSigma).to(original_dtype)
-    R = torch.matmul(sqrtSigma, V).to(original_dtype)
-    
-    return L, R
+    if factorize is None:
+        U, S, Vt = torch.linalg.svd(weight, full_matrices=False)
+    else:
+        U, S, Vt = factorize(weight, max_rank)
+    U, S, Vt = U[:, :, :max_rank], S[:, :max_rank], Vt[:, :max_rank, :]
 
-def _per_head_decomposition_from_weight(weight, rank):
-    original_dtype = weight.dtype
-    # Get weight matrix decomposed
-    U, S, Vt = torch.linalg.svd(weight.to(torch.float32), full_matrices=False)
+    if scaling_diag_matrix is not None:
+        # V = Vt @ inv(scaling): the whitening matrix is a Cholesky factor, so solve X @ scaling = Vt
+        if torch.equal(scaling_diag_matrix, scaling_diag_matrix.tril()):
+            Vt = torch.linalg.solve_triangular(scaling_diag_matrix, Vt, upper=False, left=False)
+        else:
+            Vt = torch.matmul(Vt, torch.linalg.inv(scaling_diag_matrix))
 
-    # Low rank approximation to the target rank
-    U = U[:, :rank]
-    S = S[:rank]
-    Vt = Vt[:rank, :]
+    sqrtSigma = torch.sqrt(S)
+    # Fuse the SVD components, then truncate to each head's rank
+    L = (U * sqrtSigma.unsqueeze(1)).to(original_dtype)
+    R = (sqrtSigma.unsqueeze(2) * Vt).to(original_dtype)
+    return [L[i, :, :r] for i, r in enumerate(ranks)], [R[i, :r, :] for i, r in enumerate(ranks)]
 
-    sqrtSigma = torch.sqrt(torch.diag(S))
-    # Fuse the SVD components
-    L = torch.matmul(U, sqrtSigma).to(original_dtype)
-    R = torch.matmul(sqrtSigma, Vt).to(original_dtype)
-    # assert torch.allclose(torch.matmul(L, R), weight, atol=1e-3), "SVD decomposition failed"
-    return L, R
+# Execution modes for HeadwiseLowRankModule.reconstruct:
+#   loop       - one nn.Linear per group + torch.cat (reference)
+#   bmm        - U stacked into [G, r_max, group_dim] (zero-padded for ragged ranks), one bmm
+#   block_diag - U packed into one block-diagonal [out_features, sum(ranks)] weight, one GEMM
+RECONSTRUCT_MODES = ("loop", "bmm", "block_diag")
 
 class HeadwiseLowRankModule(nn.Module):
     """ Headwise low rank module """
 
-    def __init__(self, ranks, in_features, out_features, bias):
+    def __init__(self, ranks, in_features, out_features, bias, reconstruct_mode="loop"):
         super().__init__()
 
 
@@ -81,11 +82,56 @@ class HeadwiseLowRankModule(nn.Module):
         self.quantized_latents = False
         self.latent_quantizer = None
         
+        self.set_reconstruct_mode(reconstruct_mode)
+        
+    def set_reconstruct_mode(self, mode: str):
+        """
+            Select how reconstruct() runs. The packed weights for "bmm"/"block_diag" are
+            derived from self.U (which stays the source of truth for state_dict/loading)
+            and rebuilt whenever a U weight/bias is replaced or moved. In-place edits
+            through `.data` are invisible to the cache: call this again afterwards.
+            All modes give the same outputs; the packed modes are meant for inference
+            (gradients do not flow to U).
+        """
+        if mode not in RECONSTRUCT_MODES:
+            raise ValueError(f"Unknown reconstruct mode '{mode}', expected one of {RECONSTRUCT_MODES}")
+        self.reconstruct_mode = mode
+        self._packed = None
+        self._packed_key = None
+    
+    def _packed_weights(self):
+        key = tuple((u.weight.data_ptr(), u.weight._version) for u in self.U)
+        if self.U[0].bias is not None:
+            key += tuple((u.bias.data_ptr(), u.bias._version) for u in self.U)
+        if self._packed is not None and self._packed_key == (self.reconstruct_mode, key):
+            return self._packed
+        
+        with torch.no_grad():
+            weights = [u.weight for u in self.U]
+            bias = torch.cat([u.bias for u in self.U]) if self.U[0].bias is not None else None
+            if self.reconstruct_mode == "bmm":
+                max_rank = max(self.ranks)
+                weight = weights[0].new_zeros(self.num_groups, max_rank, self.group_dim)
+                for i, w in enumerate(weights):
+                    weight[i, :self.ranks[i]] = w.t()
+                # Positions of the packed latent inside the [G * max_rank] padded latent
+                pad_index = None
+                if any(r != max_rank for r in self.ranks):
+                    pad_index = torch.cat([
+                        torch.arange(r, device=weight.device) + i * max_rank for i, r in enumerate(self.ranks)
+                    ])
+                self._packed = (weight, bias, pad_index)
+            else:
+                self._packed = (torch.block_diag(*weights), bias, None)
+        self._packed_key = (self.reconstruct_mode, key)
+        return self._packed
+    
     def forward(self, 
                 hidden_states: torch.Tensor):
         low_rank_latents = self.project_to_latent(hidden_states)
         if self.quantized_latents:
-            low_rank_latents = self.quantize_latent(low_rank_latents)
+            # The latent is a fresh VT output, so it can be overwritten when no graph is recorded
+            low_rank_latents = self.quantize_latent(low_rank_latents, inplace=not torch.is_grad_enabled())
         outputs = self.reconstruct(low_rank_latents)
         return outputs
     
@@ -108,6 +154,12 @@ class HeadwiseLowRankModule(nn.Module):
         """
             low_rank_latents: Tensor of shape (batch_size, seq_len, r1 + r2 + ... )
         """
+        if self.reconstruct_mode == "bmm":
+            return self._reconstruct_bmm(low_rank_latents)
+        if self.reconstruct_mode == "block_diag":
+            weight, bias, _ = self._packed_weights()
+            return F.linear(low_rank_latents, weight, bias)
+        
         outputs = []
         total_ranks = 0
         for i in range(self.num_groups):
@@ -120,25 +172,67 @@ class HeadwiseLowRankModule(nn.Module):
         """
         return torch.cat(outputs, dim=-1)
     
+    def _reconstruct_bmm(self, low_rank_latents: torch.Tensor):
+        weight, bias, pad_index = self._packed_weights()
+        *lead, total_rank = low_rank_latents.shape
+        latents = low_rank_latents.reshape(-1, total_rank)
+        num_tokens = latents.shape[0]
+        max_rank = weight.shape[1]
+        if pad_index is not None:
+            padded = latents.new_zeros(num_tokens, self.num_groups * max_rank)
+            padded[:, pad_index] = latents
+            latents = padded
+        
+        # (tokens, G, r) viewed as G batches of (tokens, r); output laid out as (tokens, G, group_dim)
+        batched_latents = latents.view(num_tokens, self.num_groups, max_rank).transpose(0, 1)
+        if torch.is_grad_enabled() and latents.requires_grad:
+            # out= is not differentiable
+            outputs = torch.bmm(batched_latents, weight).transpose(0, 1).reshape(*lead, self.out_features)
+        else:
+            outputs = latents.new_empty(num_tokens, self.num_groups, self.group_dim)
+            torch.bmm(batched_latents, weight, out=outputs.transpose(0, 1))
+            outputs = outputs.view(*lead, self.out_features)
+        if bias is not None:
+            outputs += bias
+        return outputs
+    
     
-    def quantize_latent(self, low_rank_latents: torch.Tensor):
+    def quantize_latent(self, low_rank_latents: torch.Tensor, inplace: bool = False):
         """
             low_rank_latents: Tensor of shape (batch_size, seq_len, r1 + r2 + ... )
+            Fake-quantizes every group (ragged ranks included) in one pass over the
+            packed latent; inplace=True overwrites low_rank_latents.
         """
         assert self.latent_quantizer is not None, "Latent quantizer is not initialized."
-        fake_quantized_low_rank_latents = []
-        total_ranks = 0
-        for i in range(self.num_groups):
-            low_rank_latent = low_rank_latents[:, :, total_ranks: total_ranks+self.ranks[i]]
-            fake_quantized_low_rank_latents.append(self.latent_quantizer(low_rank_latent))
-            total_ranks += self.ranks[i]
-
+        q = self.latent_quantizer
         """
             fake_quantized_low_rank_latents: Tensor of shape (batch_size, seq_len, r1 + r2 + ...)
         """
-        return torch.cat(fake_quantized_low_rank_latents, dim=-1)
+        return quantize_segments(low_rank_latents, self._latent_offsets, q.n_bits, q.sym, q.clip_ratio, inplace=inplace)
+    
+    def quantize_latent_packed(self, low_rank_latents: torch.Tensor):
+        """
+            Integer-packed latent: uint8 codes plus fp16 per-segment scales (and
+            zero points when asymmetric). See quant.pack_segments.
+        """
+        assert self.latent_quantizer is not None, "Latent quantizer is not initialized."
+        q = self.latent_quantizer
+        return pack_segments(low_rank_latents, self._latent_offsets, q.n_bits, q.sym, q.clip_ratio)
+    
+    def dequantize_latent(self, packed: dict, dtype=None):
+        """ Inverse of quantize_latent_packed, in the dtype of VT by default. """
+        return unpack_segments(packed, dtype=dtype or self.VT.weight.dtype)
     
     
+    @property
+    def _latent_offsets(self):
+        """ Segment offsets of the current ranks; rank repair may replace self.ranks after configuration. """
+        key = (tuple(self.ranks), self.latent_quantizer.group_size)
+        if getattr(self, "_latent_offsets_key", None) != key:
+            self._latent_offsets_table = segment_offsets(self.ranks, self.latent_quantizer.group_size)
+            self._latent_offsets_key = key
+        return self._latent_offsets_table
+    
     def configure_latent_quantizer(self, 
         n_bits: int, 
         group_size: int, 
@@ -171,20 +265,17 @@ class HeadwiseLowRankModule(nn.Module):
     def from_linear_whiten(
         old_module: nn.Linear,
         ranks: list,
+        reconstruct_mode: str = "loop",
+        factorize=None,
     ):   
-        new_module = HeadwiseLowRankModule(ranks, old_module.in_features, old_module.out_features, bias=old_module.bias is not None)
+        new_module = HeadwiseLowRankModule(ranks, old_module.in_features, old_module.out_features, bias=old_module.bias is not None, reconstruct_mode=reconstruct_mode)
         w = old_module.weight.data.reshape(len(ranks), -1, old_module.in_features)
         # Handle the cases where the bias is not None
         if old_module.bias is not None:
             b = old_module.bias.data.reshape(len(ranks), -1)
         
-        wl = []
-        wr = []
-        for i in range(len(ranks)):
-            l, r = _per_head_whiten_decomposition_from_weight(w[i], old_module.scaling_diag_matrix, ranks[i])
-            # l: (head_dim, rank), r: (rank, hidden_size)
-            wl.append(l)
-            wr.append(r)
+        # wl[i]: (head_dim, rank), wr[i]: (rank, hidden_size)
+        wl, wr = _batched_decomposition_from_weight(w, ranks, old_module.scaling_diag_matrix, factorize)
 
         # load to U
         for i in range(len(ranks)):
@@ -207,18 +298,15 @@ class HeadwiseLowRankModule(nn.Module):
     def from_linear(
         old_module: nn.Linear,
         ranks: list,
+        reconstruct_mode: str = "loop",
+        factorize=None,
     ):
-        new_module = HeadwiseLowRankModule(ranks, old_module.in_features, old_module.out_features, bias=old_module.bias is not None)
+        new_module = HeadwiseLowRankModule(ranks, old_module.in_features, old_module.out_features, bias=old_module.bias is not None, reconstruct_mode=reconstruct_mode)
         w = old_module.weight.data.reshape(len(ranks), -1, old_module.in_features)
         if old_module.bias is not None:
             b = old_module.bias.data.reshape(len(ranks), -1)
-        wl = []
-        wr = []
-        for i in range(len(ranks)):
-            l, r = _per_head_decomposition_from_weight(w[i], ranks[i])
-            # l: (head_dim, rank), r: (rank, hidden_size)
-            wl.append(l)
-            wr.append(r)
+        # wl[i]: (head_dim, rank), wr[i]: (rank, hidden_size)
+        wl, wr = _batched_decomposition_from_weight(w, ranks, factorize=factorize)
 
         # load to U
         for i in range(len(ranks)):
@@ -30,7 +30,7 @@ class PaluLlamaForCausalLM(LlamaForCausalLM):
         for name,module in self.named_modules():
             if name in self.head_wise_ranks:
                 info=linear_info[module]
-                new_layer=HeadwiseLowRankModule(self.head_wise_ranks[name],module.in_features,module.out_features,bias=module.bias is not None)
+                new_layer=HeadwiseLowRankModule(self.head_wise_ranks[name],module.in_features,module.out_features,bias=module.bias is not None,reconstruct_mode=getattr(config, "reconstruct_mode", "loop"))
                 setattr(info["father"], info["name"], new_layer)
     
     
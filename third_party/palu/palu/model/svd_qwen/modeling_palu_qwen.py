@@ -34,7 +34,8 @@ class PaluQwen2ForCausalLM(Qwen2ForCausalLM):
                     self.head_wise_ranks[name],
                     module.in_features,
                     module.out_features,
-                    bias=module.bias is not None
+                    bias=module.bias is not None,
+                    reconstruct_mode=getattr(config, "reconstruct_mode", "loop"),
                 )
                 setattr(info["father"], info["name"], new_layer)
     
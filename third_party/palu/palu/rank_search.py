@@ -33,10 +33,21 @@ def split_values(data, group_number):
     return result
 
 
-def calib_fisher_info(model, calib_loader, device, use_cache=True):
+def calib_fisher_info(model, calib_loader, device, use_cache=True, fisher_engine=None):
+    """
+        fisher_engine: optional Fisher accumulator with the signature of
+        src.fisher_engine.fisher_information(model, calib_loader, device,
+        module_filter=...); it reduces squared gradients to per-row sums
+        while backpropagating, which are attached as `module.fisher_rows`
+        and cached in a file of a few kilobytes instead of the elementwise
+        `module.fisher_info` tensors.
+    """
     model.half()
     model.to(device)
     model_id = model.config._name_or_path
+    if fisher_engine is not None:
+        _calib_fisher_rows(model, calib_loader, device, use_cache, fisher_engine)
+        return
     cache_file = f"cache/{model_id.replace('/','_')}_calib_fisher_info.pt"
 
     logger.info(f"[Fisher] Search cache_file={cache_file}", fg="yellow")
@@ -83,7 +94,44 @@ def calib_fisher_info(model, calib_loader, device, use_cache=True):
     logger.info(f"[Fisher] Save the fisher info list to:  {cache_file}", fg="yellow")
     torch.save(all_fisher_info, cache_file)
 
-def rank_search(model: nn.Module, tokenizer, args):
+def _calib_fisher_rows(model, calib_loader, device, use_cache, fisher_engine):
+    model_id = model.config._name_or_path
+    cache_file = f"cache/{model_id.replace('/','_')}_calib_fisher_rows.pt"
+    logger.info(f"[Fisher] Search cache_file={cache_file}", fg="yellow")
+    if os.path.exists(cache_file) and use_cache:
+        logger.info(f"[Fisher] Load cache_file={cache_file}", fg="yellow")
+        all_fisher_rows = torch.load(cache_file, map_location="cpu")
+    else:
+        model.eval()
+        logger.info(f"[Fisher] Accumulate per-row fisher info...", fg="yellow")
+        stats = fisher_engine(model, calib_loader, device, module_filter=lambda name: "attn" in name)
+        all_fisher_rows = {name: s["rows"] for name, s in stats.items()}
+        os.makedirs("cache", exist_ok=True)
+        logger.info(f"[Fisher] Save the fisher info rows to:  {cache_file}", fg="yellow")
+        torch.save(all_fisher_rows, cache_file)
+    for name, module in model.named_modules():
+        if name in all_fisher_rows:
+            module.fisher_rows = all_fisher_rows[name].to(module.weight.device)
+
+def group_fisher(module, num_groups):
+    """Fisher information of each of `num_groups` contiguous output-row groups of `module`."""
+    if getattr(module, "fisher_info", None) is None:
+        # Per-row sums of the mean squared gradient (fisher_engine): root mean square per group
+        rows = module.fisher_rows.float().reshape(num_groups, -1)
+        return (rows.sum(dim=1) / (rows.shape[1] * module.in_features)).sqrt().tolist()
+    fisher = module.fisher_info.reshape(num_groups, -1, module.in_features)
+    if not torch.isfinite(fisher).all():
+        logger.info(fisher)
+    return [torch.mean(fisher[i]).item() for i in range(num_groups)]
+
+def rank_search(model: nn.Module, tokenizer, args, calib_sampler=None, fisher_engine=None, importance=None):
+    """
+        calib_sampler / fisher_engine: see get_calib_data and calib_fisher_info.
+        importance: optional precomputed group scores, called as
+        importance(module_name, num_groups) -> list of floats, e.g.
+        functools.partial(src.importance.ImportanceScores(...).groups, "fisher");
+        the fisher search methods then use them instead of calibrating.
+    """
     logger.info(f"[Rank search] Do rank searching. Search method: {args.search_method}", fg="yellow")
     if args.search_method == "uniform":
         target_model_class = AVAILABLE_MODELS[model.config.model_type]["ModelForCausalLM"]
@@ -104,8 +152,9 @@ def rank_search(model: nn.Module, tokenizer, args):
         return select_result, rank_sum, total_rank    
     elif args.search_method == "fisher":
         # Prepare Fisher information
-        calib_loader = get_calib_data(args.calib_dataset, tokenizer, args.model_id, 32, seqlen=args.calib_seqlen)
-        calib_fisher_info(model, calib_loader, torch.device(args.device), args.use_cache)
+        if importance is None:
+            calib_loader = get_calib_data(args.calib_dataset, tokenizer, args.model_id, 32, seqlen=args.calib_seqlen, sampler=calib_sampler)
+            calib_fisher_info(model, calib_loader, torch.device(args.device), args.use_cache, fisher_engine)
         
         
         target_model_class = AVAILABLE_MODELS[model.config.model_type]["ModelForCausalLM"]
@@ -122,11 +171,10 @@ def rank_search(model: nn.Module, tokenizer, args):
                 
                 select_result.update({name: [info.lr_group_dims] * info.num_lr_groups})
                 
-                fisher = module.fisher_info.reshape(info.num_lr_groups, -1, module.in_features)
-                if not torch.isfinite(fisher).all():
-                    logger.info(fisher)
-                
-                fisher_list = [torch.mean(fisher[i]).item() for i in range(info.num_lr_groups)]
+                if importance is not None:
+                    fisher_list = importance(name, info.num_lr_groups)
+                else:
+                    fisher_list = group_fisher(module, info.num_lr_groups)
                 fisher_info_dict.update({name: fisher_list})
                 fisher_sum += sum(fisher_list)
 
@@ -168,8 +216,9 @@ def rank_search(model: nn.Module, tokenizer, args):
         return select_result, rank_sum, total_rank    
     elif args.search_method == "fisher_uniform":
         # Prepare Fisher information
-        calib_loader = get_calib_data(args.calib_dataset, tokenizer, args.model_id, 32, seqlen=args.calib_seqlen)
-        calib_fisher_info(model, calib_loader, torch.device(args.device), args.use_cache)
+        if importance is None:
+            calib_loader = get_calib_data(args.calib_dataset, tokenizer, args.model_id, 32, seqlen=args.calib_seqlen, sampler=calib_sampler)
+            calib_fisher_info(model, calib_loader, torch.device(args.device), args.use_cache, fisher_engine)
         
         target_model_class = AVAILABLE_MODELS[model.config.model_type]["ModelForCausalLM"]
             
@@ -186,9 +235,10 @@ def rank_search(model: nn.Module, tokenizer, args):
                 total_rank += module_rank
                 
                 select_result.update({name: [info.lr_group_dims] * info.num_lr_groups})
-                fisher = module.fisher_info.reshape(info.num_lr_groups, -1, module.in_features)
-                
-                fisher_list = [torch.mean(fisher[i]).item() for i in range(info.num_lr_groups)]
+                if importance is not None:
+                    fisher_list = importance(name, info.num_lr_groups)
+                else:
+                    fisher_list = group_fisher(module, info.num_lr_groups)
                 fisher_info_dict.update({name: fisher_list})
                 fisher_sum += sum(fisher_list)
 